@@ -4,7 +4,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from database import get_db
 from models import User
+from services import cache
+from typing import Optional
 import os
+import uuid
 import jwt
 import bcrypt
 
@@ -24,7 +27,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+class Principal:
+    """
+    The authenticated caller: identity and permissions only. It is not a
+    User row; load the User with db.get(User, principal.id) for anything else.
+    """
+    __slots__ = ("id", "email", "display_name", "role", "is_verified")
+
+    def __init__(self, id: uuid.UUID, email: str, display_name: Optional[str], role: str, is_verified: bool):
+        self.id = id
+        self.email = email
+        self.display_name = display_name
+        self.role = role
+        self.is_verified = is_verified
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
@@ -43,11 +61,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except jwt.PyJWTError:
         raise credentials_exception
     
-    # Get user from database
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalars().first()
-    
-    if user is None:
-        raise credentials_exception
-    
-    return user
+    async def load_principal():
+        result = await db.execute(
+            select(User.id, User.email, User.display_name, User.role, User.is_verified).where(User.email == email)
+        )
+        row = result.first()
+        if row is None:
+            # Raised rather than returned so unknown subjects aren't cached
+            raise credentials_exception
+        return {
+            "id": str(row.id),
+            "email": row.email,
+            "display_name": row.display_name,
+            "role": row.role,
+            "is_verified": row.is_verified,
+        }
+
+    # Only the identity and role are cached, and only with cross-worker invalidation (see services/cache.py)
+    principal = await cache.principals.get_or_load(email, load_principal)
+    return Principal(**{**principal, "id": uuid.UUID(principal["id"])})
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Admin user directory latency benchmark.
+
+Seeds --users synthetic users (skipped if they already exist), then times
+the /admin/users query shapes the admin panel uses: first pages in each
+sort order, a deep cursor page, prefix and substring search, and role and
+verification filters. Fails if any p95 exceeds --budget-ms.
+
+Usage (from backend/, against a scratch DATABASE_URL):
+    python -m benchmarks.admin_users --users 1000000 --budget-ms 50
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import sys
+import time
+import uuid
+
+from sqlalchemy import select, func, delete, insert, text
+
+from database import async_session, engine, Base
+from models import User
+from routers.admin import list_users
+
+SEED_DOMAIN = "bench.local"
+SEED_BATCH = 5000
+NAMES = ["shadow", "blade", "storm", "nova", "viper", "titan", "frost", "ember", "rogue", "zen"]
+
+
+async def seed(count: int):
+    async with async_session() as session:
+        existing = await session.scalar(
+            select(func.count()).select_from(User).where(User.email.like(f"%@{SEED_DOMAIN}"))
+        )
+    rng = random.Random(42)
+    start = datetime.datetime(2024, 1, 1)
+    for offset in range(existing, count, SEED_BATCH):
+        rows = []
+        for n in range(offset, min(offset + SEED_BATCH, count)):
+            name = f"{rng.choice(NAMES)}{rng.choice(NAMES)}{n}"
+            rows.append({
+                "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+                "email": f"{name}@{SEED_DOMAIN}",
+                "display_name": name.capitalize(),
+                "sp_points": int(rng.lognormvariate(3, 1.5)),
+                "ledger_tail": 0,
+                "role": "moderator" if rng.random() < 0.01 else "user",
+                "is_verified": rng.random() < 0.3,
+                "created_at": start + datetime.timedelta(seconds=n * 30),
+            })
+        async with async_session() as session:
+            await session.execute(insert(User), rows)
+            await session.commit()
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE users"))
+
+
+async def call(session, **params):
+    defaults = dict(limit=50, cursor=None, sort="created_at", order="desc", q=None, match="contains", role=None, is_verified=None)
+    return await list_users(**{**defaults, **params}, db=session, current_user=None)
+
+
+async def deep_cursor(session, pages: int):
+    cursor = None
+    for _ in range(pages):
+        cursor = (await call(session, cursor=cursor))["next_cursor"]
+    return cursor
+
+
+async def measure(session, params, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call(session, **params)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95)], 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--cleanup", action="store_true", help="Delete the seeded users afterwards")
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(args.users)
+
+    async with async_session() as session:
+        cursor = await deep_cursor(session, 20)
+        scenarios = {
+            "newest": {},
+            "richest": {"sort": "sp_points"},
+            "poorest": {"sort": "sp_points", "order": "asc"},
+            "page_21": {"cursor": cursor},
+            "prefix_search": {"q": "storm", "match": "prefix"},
+            "substring_search": {"q": "ember12", "match": "contains"},
+            "moderators": {"role": "moderator"},
+            "verified_richest": {"is_verified": True, "sort": "sp_points"},
+        }
+        results = {name: await measure(session, params, args.repeat) for name, params in scenarios.items()}
+
+    if args.cleanup:
+        async with async_session() as session:
+            await session.execute(delete(User).where(User.email.like(f"%@{SEED_DOMAIN}")))
+            await session.commit()
+    await engine.dispose()
+
+    print(json.dumps(results, indent=2))
+    over = [name for name, r in results.items() if r["p95_ms"] > args.budget_ms]
+    if over:
+        print(f"Over {args.budget_ms} ms budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
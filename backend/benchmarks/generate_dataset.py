@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Synthetic production-scale dataset for benchmarking.
+
+Generates users, ledger transactions, custom games and their players,
+tournaments with registrations and first-round matches, and store
+redemptions. At --scale 1 that is about 10M rows. Rows are streamed with
+COPY (asyncpg copy_records_to_table) from --workers processes, each with
+its own connection.
+
+Work is split into fixed-size shards, each with its own RNG seeded from
+(--seed, shard), and every id is derived from (seed, shard, row), so the
+same seed and scale produce the same rows whatever the worker count.
+
+Distributions aim at what the live tables look like:
+    - signups grow over time, so most users are recent
+    - activity follows a power law, so a few players join most games
+    - 80% of games are 1v1; wagers and deposits are skewed towards small amounts
+    - most games are completed, with a tail that is open, in progress or disputed
+
+Finally, sp_points is recomputed from the generated ledger, so the
+reconciliation job finds no drift, and the dashboard counters,
+leaderboards, player stats and champion matchups are rebuilt.
+
+Usage (from backend/, against an empty scratch DATABASE_URL):
+    python -m benchmarks.generate_dataset --scale 1 --workers 8 --seed 42
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import asyncpg
+
+from database import DATABASE_URL, async_session, engine, Base
+from models import GameStatus, GameType, RoleEnum, TransactionType
+from services import counters, leaderboard, player_stats, matchups
+
+USER_SHARD = 50_000
+GAME_SHARD = 20_000
+TOURNAMENT_SHARD = 200
+COPY_BATCH = 50_000
+
+USERS_PER_SCALE = 1_000_000
+GAMES_PER_SCALE = 300_000
+TOURNAMENTS_PER_SCALE = 2_000
+
+MODERATOR_SHARE = 0.001
+REDEMPTION_RATE = 0.05
+WAGERS = [5, 10, 25, 50, 100, 250]
+WAGER_WEIGHTS = [40, 30, 15, 9, 5, 1]
+BRACKET_SIZES = [8, 16, 32, 64, 128, 256]
+BRACKET_WEIGHTS = [20, 30, 25, 15, 7, 3]
+GAME_STATUSES = [GameStatus.COMPLETED, GameStatus.OPEN, GameStatus.IN_PROGRESS, GameStatus.DISPUTED]
+GAME_STATUS_WEIGHTS = [85, 6, 5, 4]
+CHAMPIONS = [
+    "Ahri", "Akali", "Darius", "Draven", "Ezreal", "Garen", "Jinx", "Kai'Sa", "Lee Sin", "Lux",
+    "Malphite", "Orianna", "Riven", "Sylas", "Thresh", "Vayne", "Viego", "Yasuo", "Yone", "Zed",
+]
+STORE_ITEMS = [
+    ("1380 RP", 10, "League of Legends 1380 RP Card"),
+    ("650 RP", 5, "League of Legends 650 RP Card"),
+    ("2800 RP", 20, "League of Legends 2800 RP Card"),
+]
+
+# Id namespaces, so rows of different tables never share an id
+KIND_USER, KIND_TRANSACTION, KIND_GAME, KIND_PLAYER, KIND_TOURNAMENT, KIND_REGISTRATION, KIND_MATCH, KIND_REDEMPTION, KIND_ITEM = range(1, 10)
+
+USER_COLUMNS = ["id", "email", "display_name", "hashed_password", "sp_points", "ledger_tail", "role", "is_verified", "created_at"]
+TRANSACTION_COLUMNS = ["id", "user_id", "amount", "type", "description", "created_at"]
+GAME_COLUMNS = ["id", "type", "wager_amount", "status", "creator_id", "winner_team", "created_at", "started_at", "completed_at"]
+PLAYER_COLUMNS = ["id", "game_id", "user_id", "team", "joined_at"]
+TOURNAMENT_COLUMNS = ["id", "name", "role", "max_players", "registration_open", "created_by", "created_at"]
+REGISTRATION_COLUMNS = ["id", "tournament_id", "user_id", "champion", "created_at"]
+MATCH_COLUMNS = ["id", "tournament_id", "round", "player1_registration_id", "player2_registration_id", "winner_registration_id", "riot_match_id", "verified", "verified_at", "created_at"]
+REDEMPTION_COLUMNS = ["id", "user_id", "item_id", "email_sent", "fulfilled", "created_at"]
+
+
+def make_id(seed: int, kind: int, shard: int, row: int) -> uuid.UUID:
+    return uuid.UUID(int=(seed & 0xFFFF) << 112 | kind << 104 | shard << 64 | row, version=4)
+
+
+class Shard:
+    """Deterministic generator state for one shard of one table group."""
+
+    def __init__(self, seed: int, kind: int, index: int, sizes: Dict):
+        self.seed = seed
+        self.kind = kind
+        self.index = index
+        self.sizes = sizes
+        self.rng = random.Random(f"{seed}:{kind}:{index}")
+        self.rows = 0
+        self.now = datetime.datetime.fromisoformat(sizes["now"])
+        self.start = self.now - datetime.timedelta(days=sizes["days"])
+
+    def id(self, kind: int) -> uuid.UUID:
+        self.rows += 1
+        return make_id(self.seed, kind, self.kind << 24 | self.index, self.rows)
+
+    def user_id(self, n: int) -> uuid.UUID:
+        return make_id(self.seed, KIND_USER, n // USER_SHARD, n % USER_SHARD)
+
+    def active_user(self) -> int:
+        # Power law over user numbers: low numbers are the regulars
+        return int(self.sizes["users"] * self.rng.random() ** 3)
+
+    def moderator(self) -> uuid.UUID:
+        return self.user_id(self.rng.randrange(self.sizes["moderators"]))
+
+    def moment(self, skew: float = 1.0) -> datetime.datetime:
+        # skew < 1 pushes moments towards now, like a growing user base
+        return self.start + (self.now - self.start) * self.rng.random() ** skew
+
+    def after(self, moment: datetime.datetime, max_hours: float) -> datetime.datetime:
+        return min(self.now, moment + datetime.timedelta(hours=self.rng.uniform(0, max_hours)))
+
+
+def user_rows(shard: Shard) -> Tuple[List, List, List]:
+    """Users in the shard with their deposits and redemptions."""
+    users, transactions, redemptions = [], [], []
+    rng = shard.rng
+    first = shard.index * USER_SHARD
+    last = min(first + USER_SHARD, shard.sizes["users"])
+    for n in range(first, last):
+        user_id = shard.user_id(n)
+        created_at = shard.moment(skew=0.6)
+        role = "moderator" if n < shard.sizes["moderators"] else "user"
+        users.append((user_id, f"player{n}@dataset.local", f"Player{n}", None, 0, 0, role, rng.random() < 0.3, created_at))
+
+        transactions.append((shard.id(KIND_TRANSACTION), user_id, 1, TransactionType.DEPOSIT.name, "Opening balance", created_at))
+        balance = 1
+        moment = created_at
+        for _ in range(int(rng.expovariate(1 / 4))):
+            amount = max(1, int(rng.lognormvariate(3, 1.2)))
+            moment = shard.after(moment, 24 * 14)
+            transactions.append((shard.id(KIND_TRANSACTION), user_id, amount, TransactionType.DEPOSIT.name, f"Purchased {amount} SP", moment))
+            balance += amount
+
+        if rng.random() < REDEMPTION_RATE:
+            item_id, name, cost = rng.choice(shard.sizes["items"])
+            if balance >= cost:
+                moment = shard.after(moment, 24 * 7)
+                transactions.append((shard.id(KIND_TRANSACTION), user_id, -cost, TransactionType.PURCHASE.name, f"Redeemed {name}", moment))
+                fulfilled = moment < shard.now - datetime.timedelta(days=3) or rng.random() < 0.5
+                redemptions.append((shard.id(KIND_REDEMPTION), user_id, uuid.UUID(item_id), fulfilled or rng.random() < 0.3, fulfilled, moment))
+    return users, transactions, redemptions
+
+
+def game_rows(shard: Shard) -> Tuple[List, List, List]:
+    """Custom games with their players and wager ledger entries."""
+    games, players, transactions = [], [], []
+    rng = shard.rng
+    first = shard.index * GAME_SHARD
+    last = min(first + GAME_SHARD, shard.sizes["games"])
+    for _ in range(first, last):
+        game_id = shard.id(KIND_GAME)
+        game_type = GameType.ONE_VS_ONE if rng.random() < 0.8 else GameType.FIVE_VS_FIVE
+        wager = rng.choices(WAGERS, WAGER_WEIGHTS)[0]
+        status = rng.choices(GAME_STATUSES, GAME_STATUS_WEIGHTS)[0]
+        created_at = shard.moment(skew=0.7)
+        per_team = 1 if game_type == GameType.ONE_VS_ONE else 5
+        seats = 2 * per_team
+        if status == GameStatus.OPEN:
+            seats = rng.randrange(seats)
+
+        joined = set()
+        roster = []
+        while len(roster) < seats:
+            n = shard.active_user()
+            if n not in joined:
+                joined.add(n)
+                roster.append((shard.user_id(n), len(roster) % 2 + 1, shard.after(created_at, 1)))
+
+        winner_team = started_at = completed_at = None
+        if status != GameStatus.OPEN:
+            started_at = max(joined_at for _, _, joined_at in roster)
+        if status == GameStatus.COMPLETED:
+            winner_team = rng.randint(1, 2)
+            completed_at = shard.after(started_at, 2)
+
+        games.append((game_id, game_type.name, wager, status.name, shard.moderator(), winner_team, created_at, started_at, completed_at))
+        for user_id, team, joined_at in roster:
+            players.append((shard.id(KIND_PLAYER), game_id, user_id, team, joined_at))
+            transactions.append((shard.id(KIND_TRANSACTION), user_id, -wager, TransactionType.WAGER_LOSS.name, f"Wager for game {game_id}", joined_at))
+            if team == winner_team:
+                transactions.append((shard.id(KIND_TRANSACTION), user_id, wager * 2, TransactionType.WAGER_WIN.name, f"Won game {game_id}", completed_at))
+    return games, players, transactions
+
+
+def tournament_rows(shard: Shard) -> Tuple[List, List, List]:
+    """Tournaments with registrations and, once registration closed, round one."""
+    tournaments, registrations, matches = [], [], []
+    rng = shard.rng
+    first = shard.index * TOURNAMENT_SHARD
+    last = min(first + TOURNAMENT_SHARD, shard.sizes["tournaments"])
+    for n in range(first, last):
+        tournament_id = shard.id(KIND_TOURNAMENT)
+        size = rng.choices(BRACKET_SIZES, BRACKET_WEIGHTS)[0]
+        created_at = shard.moment(skew=0.7)
+        closed = rng.random() < 0.8
+        entrants = size if closed else rng.randrange(size)
+        tournaments.append((tournament_id, f"Tournament {n}", rng.choice(list(RoleEnum)).name, size, not closed, shard.moderator(), created_at))
+
+        entries = []
+        for user_n in rng.sample(range(shard.sizes["users"]), entrants):
+            registration_id = shard.id(KIND_REGISTRATION)
+            entries.append(registration_id)
+            registrations.append((registration_id, tournament_id, shard.user_id(user_n), rng.choice(CHAMPIONS), shard.after(created_at, 72)))
+        if not closed:
+            continue
+
+        rng.shuffle(entries)
+        bracket_at = shard.after(created_at, 96)
+        for p1, p2 in zip(entries[::2], entries[1::2]):
+            verified = rng.random() < 0.9
+            winner = rng.choice((p1, p2)) if verified else None
+            riot_match_id = f"NA1_{rng.randrange(10**9, 10**10)}" if verified else None
+            verified_at = bracket_at + datetime.timedelta(hours=1) if verified else None
+            matches.append((shard.id(KIND_MATCH), tournament_id, 1, p1, p2, winner, riot_match_id, verified, verified_at, bracket_at))
+    return tournaments, registrations, matches
+
+
+async def copy(connection, table: str, columns: List[str], rows: List) -> int:
+    for offset in range(0, len(rows), COPY_BATCH):
+        await connection.copy_records_to_table(table, records=rows[offset:offset + COPY_BATCH], columns=columns)
+    return len(rows)
+
+
+async def load_shard(dsn: str, seed: int, group: str, index: int, sizes: Dict) -> Dict[str, int]:
+    connection = await asyncpg.connect(dsn)
+    try:
+        async with connection.transaction():
+            if group == "users":
+                users, transactions, redemptions = user_rows(Shard(seed, KIND_USER, index, sizes))
+                return {
+                    "users": await copy(connection, "users", USER_COLUMNS, users),
+                    "transactions": await copy(connection, "transactions", TRANSACTION_COLUMNS, transactions),
+                    "redemptions": await copy(connection, "redemptions", REDEMPTION_COLUMNS, redemptions),
+                }
+            if group == "games":
+                games, players, transactions = game_rows(Shard(seed, KIND_GAME, index, sizes))
+                return {
+                    "custom_games": await copy(connection, "custom_games", GAME_COLUMNS, games),
+                    "game_players": await copy(connection, "game_players", PLAYER_COLUMNS, players),
+                    "transactions": await copy(connection, "transactions", TRANSACTION_COLUMNS, transactions),
+                }
+            tournaments, registrations, matches = tournament_rows(Shard(seed, KIND_TOURNAMENT, index, sizes))
+            return {
+                "tournaments": await copy(connection, "tournaments", TOURNAMENT_COLUMNS, tournaments),
+                "registrations": await copy(connection, "registrations", REGISTRATION_COLUMNS, registrations),
+                "matches": await copy(connection, "matches", MATCH_COLUMNS, matches),
+            }
+    finally:
+        await connection.close()
+
+
+def run_shard(task) -> Dict[str, int]:
+    """Process pool entry point: one shard on its own connection."""
+    return asyncio.run(load_shard(*task))
+
+
+async def store_items(dsn: str, seed: int) -> List[Tuple[str, str, int]]:
+    """The standard store items, created with fixed ids if the store is empty."""
+    connection = await asyncpg.connect(dsn)
+    try:
+        rows = await connection.fetch("SELECT id, name, sp_cost FROM store_items ORDER BY sp_cost")
+        if not rows:
+            await connection.copy_records_to_table("store_items", columns=["id", "name", "sp_cost", "description", "item_type", "created_at"], records=[
+                (make_id(seed, KIND_ITEM, 0, n), name, cost, description, "rp_card", datetime.datetime.utcnow())
+                for n, (name, cost, description) in enumerate(STORE_ITEMS)
+            ])
+            rows = await connection.fetch("SELECT id, name, sp_cost FROM store_items ORDER BY sp_cost")
+        return [(str(row["id"]), row["name"], row["sp_cost"]) for row in rows]
+    finally:
+        await connection.close()
+
+
+async def finalize(dsn: str):
+    """Settle balances from the ledger and rebuild the counters, leaderboards, player stats and matchups."""
+    connection = await asyncpg.connect(dsn)
+    try:
+        # Heavy losers may have wagered past zero; top them up so every balance is valid
+        await connection.execute("""
+            INSERT INTO transactions (id, user_id, amount, type, description, created_at)
+            SELECT md5('top-up' || user_id::text)::uuid, user_id, -sum(amount), 'ADJUSTMENT', 'Dataset top-up', now() AT TIME ZONE 'utc'
+            FROM transactions
+            WHERE user_id IN (SELECT id FROM users WHERE email LIKE '%@dataset.local')
+            GROUP BY user_id
+            HAVING sum(amount) < 0
+        """)
+        await connection.execute("""
+            UPDATE users SET sp_points = ledger.total, ledger_tail = ledger.entries
+            FROM (SELECT user_id, sum(amount) AS total, count(*) AS entries FROM transactions GROUP BY user_id) AS ledger
+            WHERE users.id = ledger.user_id AND users.email LIKE '%@dataset.local'
+        """)
+        await connection.execute("ANALYZE")
+    finally:
+        await connection.close()
+
+    async with async_session() as session:
+        await counters.reconcile(session)
+        await leaderboard.rebuild(session)
+        await player_stats.rebuild(session)
+        await session.commit()
+    await matchups.rebuild()
+
+
+def run_phase(pool: ProcessPoolExecutor, tasks: List, totals: Dict[str, int]):
+    for result in pool.map(run_shard, tasks):
+        for table, rows in result.items():
+            totals[table] = totals.get(table, 0) + rows
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="1.0 is about 1M users and 10M rows in total")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=8, help="Parallel processes, each with its own connection")
+    parser.add_argument("--days", type=int, default=365, help="History covered by created_at")
+    parser.add_argument("--now", type=datetime.datetime.fromisoformat, default=datetime.datetime(2026, 1, 1), help="End of the generated history")
+    args = parser.parse_args()
+
+    dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    users = max(1, int(USERS_PER_SCALE * args.scale))
+    sizes = {
+        "users": users,
+        "moderators": max(1, int(users * MODERATOR_SHARE)),
+        "games": int(GAMES_PER_SCALE * args.scale),
+        "tournaments": int(TOURNAMENTS_PER_SCALE * args.scale),
+        "days": args.days,
+        "now": args.now.isoformat(),
+        "items": await store_items(dsn, args.seed),
+    }
+
+    started = time.monotonic()
+    totals: Dict[str, int] = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Users first: every other table references them
+        run_phase(pool, [(dsn, args.seed, "users", i, sizes) for i in range(-(-users // USER_SHARD))], totals)
+        print(f"users loaded in {time.monotonic() - started:.1f}s", file=sys.stderr)
+        run_phase(pool, [
+            *((dsn, args.seed, "games", i, sizes) for i in range(-(-sizes["games"] // GAME_SHARD))),
+            *((dsn, args.seed, "tournaments", i, sizes) for i in range(-(-sizes["tournaments"] // TOURNAMENT_SHARD))),
+        ], totals)
+    loaded = time.monotonic() - started
+
+    await finalize(dsn)
+    await engine.dispose()
+
+    total = sum(totals.values())
+    for table, rows in sorted(totals.items()):
+        print(f"{table:>14}: {rows:,}", file=sys.stderr)
+    print(f"{total:,} rows loaded in {loaded:.1f}s ({total / loaded:,.0f} rows/s), "
+          f"finalized in {time.monotonic() - started - loaded:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
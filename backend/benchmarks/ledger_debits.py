@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Concurrent SP debit throughput benchmark.
+
+Creates throwaway users, then hammers ledger.debit from many concurrent
+sessions, once spread over all users and once contended on a single user,
+and checks that no balance went negative and the ledger matches sp_points.
+
+Usage (from backend/, against a scratch DATABASE_URL):
+    python -m benchmarks.ledger_debits --users 100 --concurrency 32 --debits 5000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from sqlalchemy import select, delete, func
+
+from database import async_session, engine, Base
+from models import User, Transaction, TransactionType, BalanceSnapshot
+from services import ledger
+
+
+async def create_users(count: int, balance: int):
+    async with async_session() as session:
+        users = [
+            User(email=f"bench-{uuid.uuid4().hex}@bench.local", display_name="bench", sp_points=balance)
+            for _ in range(count)
+        ]
+        session.add_all(users)
+        for user in users:
+            await ledger.open_account(session, user)
+        await session.commit()
+        return [user.id for user in users]
+
+
+async def run(user_ids, debits: int, concurrency: int, amount: int):
+    queue = asyncio.Queue()
+    for _ in range(debits):
+        queue.put_nowait(random.choice(user_ids))
+
+    ok = rejected = 0
+    latencies = []
+
+    async def worker():
+        nonlocal ok, rejected
+        async with async_session() as session:
+            while not queue.empty():
+                user_id = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    await ledger.debit(session, user_id, amount, TransactionType.WAGER_LOSS, "benchmark")
+                    await session.commit()
+                    ok += 1
+                except ledger.InsufficientFunds:
+                    await session.rollback()
+                    rejected += 1
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "debits": ok,
+        "rejected": rejected,
+        "seconds": round(elapsed, 3),
+        "debits_per_second": round((ok + rejected) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+async def check(user_ids):
+    """Every benchmark user must be non-negative and match its ledger."""
+    async with async_session() as session:
+        negative = await session.scalar(
+            select(func.count()).select_from(User).where(User.id.in_(user_ids), User.sp_points < 0)
+        )
+        mismatched = 0
+        for user_id in user_ids:
+            projected = await session.scalar(select(User.sp_points).where(User.id == user_id))
+            if projected != await ledger.get_balance(session, user_id):
+                mismatched += 1
+        return {"negative_balances": negative, "ledger_mismatches": mismatched}
+
+
+async def cleanup(user_ids):
+    async with async_session() as session:
+        await session.execute(delete(Transaction).where(Transaction.user_id.in_(user_ids)))
+        await session.execute(delete(BalanceSnapshot).where(BalanceSnapshot.user_id.in_(user_ids)))
+        await session.execute(delete(User).where(User.id.in_(user_ids)))
+        await session.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--debits", type=int, default=5000)
+    parser.add_argument("--amount", type=int, default=1)
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # Spread: enough balance for every debit to succeed
+    spread_users = await create_users(args.users, args.debits * args.amount)
+    # Contended: one user who can afford only half of the debits
+    hot_user = await create_users(1, args.debits * args.amount // 2)
+
+    try:
+        results = {
+            "spread": await run(spread_users, args.debits, args.concurrency, args.amount),
+            "contended": await run(hot_user, args.debits, args.concurrency, args.amount),
+            "consistency": await check(spread_users + hot_user),
+        }
+    finally:
+        await cleanup(spread_users + hot_user)
+        await engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
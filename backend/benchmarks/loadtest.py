@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the API, in-process through httpx's ASGI transport.
+
+Runs the app's startup against DATABASE_URL, seeds load-test users, then
+drives realistic traffic and records per-request latency:
+
+    login_storm      concurrent password logins
+    lobby_polling    clients repeatedly polling the open games list
+    join_rush        more players than slots racing to join 5v5 games
+    bracket_256      bracket generation for 256-player tournaments
+    match_burst      both players of every bracket match submitting at once
+    admin_stats      the admin dashboard's stats call under concurrency
+
+Each scenario reports throughput, p50/p95/p99 latency and error rate
+(responses outside the statuses the scenario expects). Results are saved
+as JSON; --compare checks them against an earlier run and exits 1 on a
+regression beyond --tolerance.
+
+Usage (from backend/, against a scratch DATABASE_URL):
+    python -m benchmarks.loadtest --output baseline.json
+    python -m benchmarks.loadtest --scenarios lobby_polling join_rush --compare baseline.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import select, insert
+
+from database import async_session, engine
+from models import User, Tournament, Registration, RoleEnum
+from auth import get_password_hash
+from routers.auth import create_access_token
+from services import ledger
+from main import app
+
+LOAD_DOMAIN = "load.local"
+PASSWORD = "LoadTest123!"
+ADMIN_EMAIL = "admin@cashclash.com"
+CHAMPIONS = ["Ahri", "Zed", "Yasuo", "Lux", "Garen", "Darius", "Jinx", "Thresh", "Lee Sin", "Orianna"]
+
+
+class Recorder:
+    """Latencies and status codes for one request label."""
+
+    def __init__(self, expected=(200,)):
+        self.expected = set(expected)
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception as e:
+            self.statuses[type(e).__name__] += 1
+            return None
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+        self.statuses[response.status_code] += 1
+        return response
+
+    def summary(self) -> Dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        errors = sum(n for status, n in self.statuses.items() if status not in self.expected)
+
+        def percentile(p):
+            return round(latencies[min(count - 1, int(count * p))] * 1000, 2) if count else None
+
+        return {
+            "requests": count,
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(count / elapsed, 1) if elapsed else None,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "statuses": {str(status): n for status, n in self.statuses.items()},
+        }
+
+
+async def bounded(concurrency: int, jobs):
+    """Run coroutines with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await job
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+
+def bearer(user) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {create_access_token(str(user.id), user.email)}"}
+
+
+async def seed_users(count: int, balance: int) -> List[User]:
+    """Load-test users with a known password and plenty of SP; reused across runs."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(User).where(User.email.like(f"%@{LOAD_DOMAIN}")).order_by(User.email).limit(count)
+        )
+        users = list(result.scalars())
+        if len(users) < count:
+            # One bcrypt hash for everyone, hashing per user would dominate seeding
+            hashed = get_password_hash(PASSWORD)
+            taken = {user.email for user in users}
+            for n in range(count * 2):
+                if len(users) == count:
+                    break
+                email = f"player{n:06d}@{LOAD_DOMAIN}"
+                if email in taken:
+                    continue
+                user = User(email=email, display_name=f"Player{n}", hashed_password=hashed, sp_points=balance, is_verified=True)
+                session.add(user)
+                await ledger.open_account(session, user)
+                users.append(user)
+            await session.commit()
+        return users
+
+
+async def admin_user() -> User:
+    async with async_session() as session:
+        result = await session.execute(select(User).where(User.email == ADMIN_EMAIL))
+        return result.scalars().one()
+
+
+# ============= SCENARIOS =============
+
+async def login_storm(client, ctx, args) -> Dict[str, Recorder]:
+    recorder = Recorder(expected=(200,))
+    users = ctx["users"]
+    await bounded(args.concurrency, (
+        recorder.request(client, "POST", "/auth/login", json={"email": users[n % len(users)].email, "password": PASSWORD})
+        for n in range(args.logins)
+    ))
+    recorder.finished = time.perf_counter()
+    return {"login": recorder}
+
+
+async def create_games(client, ctx, count: int, type: str) -> List[str]:
+    responses = await bounded(8, (
+        client.post("/games/create", json={"type": type, "wager_amount": 10}, headers=ctx["admin_headers"])
+        for _ in range(count)
+    ))
+    return [r.json()["id"] for r in responses if r.status_code == 200]
+
+
+async def lobby_polling(client, ctx, args) -> Dict[str, Recorder]:
+    await create_games(client, ctx, args.lobby_games, "1v1")
+    recorder = Recorder(expected=(200,))
+    await bounded(args.concurrency, (
+        recorder.request(client, "GET", "/games/")
+        for _ in range(args.polls)
+    ))
+    recorder.finished = time.perf_counter()
+    return {"list_games": recorder}
+
+
+async def join_rush(client, ctx, args) -> Dict[str, Recorder]:
+    # Full teams and lost races answer 400, which is the expected outcome for the losers
+    users = ctx["users"]
+    games = await create_games(client, ctx, args.rush_games, "5v5")
+    recorder = Recorder(expected=(200, 400))
+    jobs = []
+    for index, game_id in enumerate(games):
+        contenders = [users[(index * args.rush_players + n) % len(users)] for n in range(args.rush_players)]
+        jobs.extend(
+            recorder.request(client, "POST", f"/games/{game_id}/join", params={"team": n % 2 + 1}, headers=bearer(user))
+            for n, user in enumerate(contenders)
+        )
+    await bounded(args.concurrency, jobs)
+    recorder.finished = time.perf_counter()
+    return {"join_game": recorder}
+
+
+async def bracket_256(client, ctx, args) -> Dict[str, Recorder]:
+    users = ctx["users"][:args.bracket_players]
+    tournaments = []
+    # Registrations are seeded directly, the scenario measures bracket generation itself
+    async with async_session() as session:
+        for _ in range(args.brackets):
+            tournament = Tournament(
+                name=f"Load test {uuid.uuid4().hex[:8]}", role=RoleEnum.mid,
+                max_players=len(users), created_by=ctx["admin"].id
+            )
+            session.add(tournament)
+            await session.flush()
+            registrations = [
+                {"id": uuid.uuid4(), "tournament_id": tournament.id, "user_id": user.id, "champion": CHAMPIONS[n % len(CHAMPIONS)]}
+                for n, user in enumerate(users)
+            ]
+            await session.execute(insert(Registration), registrations)
+            tournaments.append((str(tournament.id), {str(r["id"]): user for r, user in zip(registrations, users)}))
+        await session.commit()
+
+    recorder = Recorder(expected=(200,))
+    for tournament_id, _ in tournaments:
+        await recorder.request(client, "POST", f"/tournaments/{tournament_id}/generate-bracket", headers=ctx["admin_headers"])
+    recorder.finished = time.perf_counter()
+    ctx["brackets"] = tournaments
+    return {"generate_bracket": recorder}
+
+
+async def match_burst(client, ctx, args) -> Dict[str, Recorder]:
+    if "brackets" not in ctx:
+        await bracket_256(client, ctx, args)
+    # Both players submit; whoever is second finds the match already verified
+    recorder = Recorder(expected=(200, 400))
+    jobs = []
+    for tournament_id, owners in ctx["brackets"]:
+        matches = (await client.get(f"/tournaments/{tournament_id}/matches")).json()
+        for match in matches:
+            if match["verified"] or not match["player2_registration_id"]:
+                continue
+            riot_match_id = f"WIN_{match['id'][:8]}"
+            for registration_id in (match["player1_registration_id"], match["player2_registration_id"]):
+                jobs.append(recorder.request(
+                    client, "POST", f"/matches/{match['id']}/submit",
+                    json={"riot_match_id": riot_match_id}, headers=bearer(owners[registration_id])
+                ))
+    recorder.started = time.perf_counter()
+    await bounded(args.concurrency, jobs)
+    recorder.finished = time.perf_counter()
+    return {"submit_match": recorder}
+
+
+async def admin_stats(client, ctx, args) -> Dict[str, Recorder]:
+    recorder = Recorder(expected=(200,))
+    await bounded(args.concurrency, (
+        recorder.request(client, "GET", "/admin/stats", headers=ctx["admin_headers"])
+        for _ in range(args.stats_requests)
+    ))
+    recorder.finished = time.perf_counter()
+    return {"admin_stats": recorder}
+
+
+SCENARIOS = {
+    "login_storm": login_storm,
+    "lobby_polling": lobby_polling,
+    "join_rush": join_rush,
+    "bracket_256": bracket_256,
+    "match_burst": match_burst,
+    "admin_stats": admin_stats,
+}
+
+
+# ============= BASELINES =============
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Human-readable regressions of results against baseline."""
+    regressions = []
+    for scenario, labels in results["scenarios"].items():
+        for label, current in labels.items():
+            before = baseline.get("scenarios", {}).get(scenario, {}).get(label)
+            if not before or not current["requests"]:
+                continue
+            name = f"{scenario}/{label}"
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if before[key] and current[key] > before[key] * (1 + tolerance):
+                    regressions.append(f"{name}: {key} {before[key]} -> {current[key]}")
+            if before["throughput_rps"] and current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} rps")
+            if current["error_rate"] > before["error_rate"] + 0.01:
+                regressions.append(f"{name}: error rate {before['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--lobby-games", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=2000)
+    parser.add_argument("--rush-games", type=int, default=20)
+    parser.add_argument("--rush-players", type=int, default=16, help="Players racing for the 10 slots of each game")
+    parser.add_argument("--brackets", type=int, default=5)
+    parser.add_argument("--bracket-players", type=int, default=256)
+    parser.add_argument("--stats-requests", type=int, default=2000)
+    parser.add_argument("--output", help="Where to save results (default: loadtest-<revision>.json)")
+    parser.add_argument("--compare", help="Baseline JSON to check results against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before it counts as a regression")
+    args = parser.parse_args()
+    args.users = max(args.users, args.bracket_players)
+
+    await app.router.startup()
+    try:
+        ctx = {"users": await seed_users(args.users, balance=1_000_000), "admin": await admin_user()}
+        ctx["admin_headers"] = bearer(ctx["admin"])
+
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        results = {
+            "revision": git_revision(),
+            "started_at": datetime.datetime.utcnow().isoformat(),
+            "parameters": vars(args),
+            "scenarios": {},
+        }
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            for name in args.scenarios:
+                recorders = await SCENARIOS[name](client, ctx, args)
+                results["scenarios"][name] = {label: recorder.summary() for label, recorder in recorders.items()}
+                print(f"{name}: " + ", ".join(
+                    f"{label} {s['throughput_rps']} rps p95 {s['p95_ms']} ms errors {s['error_rate']:.2%}"
+                    for label, s in results["scenarios"][name].items()
+                ), file=sys.stderr)
+    finally:
+        await app.router.shutdown()
+        await engine.dispose()
+
+    output = args.output or f"loadtest-{results['revision'] or 'local'}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results: {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.compare} ({baseline.get('revision')}):", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
+        print(f"No regressions against {args.compare}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
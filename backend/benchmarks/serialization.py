@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+CPU cost of serializing the large list responses.
+
+Builds in-memory lobbies, brackets and admin game lists, then times the
+old path (response_model validation, jsonable_encoder, stdlib json)
+against serializers.py plus orjson. Both outputs are decoded and compared,
+so the fast path can't drift from the schemas unnoticed. No database needed.
+
+Usage (from backend/):
+    python -m benchmarks.serialization --games 500 --matches 128 --repeat 50
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+import uuid
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import serializers
+from models import User, CustomGame, GamePlayer, GameType, GameStatus, Registration, Match
+from schemas import CustomGame as CustomGameSchema, Match as MatchSchema
+
+
+def make_user(rng: random.Random) -> User:
+    n = rng.randrange(10**6)
+    return User(
+        id=uuid.uuid4(), email=f"player{n}@bench.local", display_name=f"Player{n}", sp_points=rng.randrange(5000),
+        role="user", is_verified=rng.random() < 0.3, riot_summoner_name=None,
+        created_at=datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=rng.randrange(10**7)),
+    )
+
+
+def make_games(count: int, rng: random.Random) -> List[CustomGame]:
+    games = []
+    for _ in range(count):
+        game_type = rng.choice(list(GameType))
+        game = CustomGame(
+            id=uuid.uuid4(), type=game_type, wager_amount=rng.choice([5, 10, 25]), status=GameStatus.OPEN,
+            creator_id=uuid.uuid4(), winner_team=None, created_at=datetime.datetime.utcnow(),
+        )
+        seats = 2 if game_type == GameType.ONE_VS_ONE else 10
+        game.players = [
+            GamePlayer(id=uuid.uuid4(), game_id=game.id, user_id=user.id, team=n % 2 + 1, joined_at=datetime.datetime.utcnow(), user=user)
+            for n, user in enumerate(make_user(rng) for _ in range(rng.randrange(seats)))
+        ]
+        games.append(game)
+    return games
+
+
+def make_matches(count: int, rng: random.Random) -> List[Match]:
+    tournament_id = uuid.uuid4()
+
+    def registration():
+        user = make_user(rng)
+        return Registration(id=uuid.uuid4(), tournament_id=tournament_id, user_id=user.id, champion="Ahri", created_at=datetime.datetime.utcnow(), user=user)
+
+    matches = []
+    for _ in range(count):
+        p1, p2 = registration(), registration()
+        winner = rng.choice((p1, p2, None))
+        matches.append(Match(
+            id=uuid.uuid4(), tournament_id=tournament_id, round=1,
+            player1_registration_id=p1.id, player2_registration_id=p2.id,
+            winner_registration_id=winner.id if winner else None, riot_match_id=None,
+            verified=winner is not None, created_at=datetime.datetime.utcnow(),
+            player1=p1, player2=p2, winner=winner,
+        ))
+    return matches
+
+
+def validated_path(adapter: TypeAdapter):
+    """What FastAPI did per response: validate the response_model, encode, json.dumps."""
+    def render(rows):
+        return json.dumps(jsonable_encoder(adapter.validate_python(rows, from_attributes=True))).encode()
+    return render
+
+
+def legacy_admin_games(games):
+    return json.dumps(jsonable_encoder([{
+        "id": str(game.id),
+        "type": game.type,
+        "wager_amount": game.wager_amount,
+        "status": game.status,
+        "winner_team": game.winner_team,
+        "created_at": game.created_at.isoformat(),
+        "players": [{
+            "user_id": str(p.user_id),
+            "team": p.team,
+            "user": {"id": str(p.user.id), "display_name": p.user.display_name, "email": p.user.email} if p.user else None
+        } for p in game.players]
+    } for game in games])).encode()
+
+
+def measure(render, rows, repeat: int) -> float:
+    """CPU milliseconds per response."""
+    start = time.process_time()
+    for _ in range(repeat):
+        render(rows)
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--matches", type=int, default=128)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = make_games(args.games, rng)
+    matches = make_matches(args.matches, rng)
+
+    cases = {
+        "games": (games, validated_path(TypeAdapter(List[CustomGameSchema])), lambda rows: orjson.dumps(serializers.custom_games(rows))),
+        "tournament_matches": (matches, validated_path(TypeAdapter(List[MatchSchema])), lambda rows: orjson.dumps(serializers.matches(rows))),
+        "admin_games": (games, legacy_admin_games, lambda rows: orjson.dumps(serializers.admin_games(rows))),
+    }
+
+    results = {}
+    mismatched = []
+    for name, (rows, legacy, fast) in cases.items():
+        if json.loads(legacy(rows)) != orjson.loads(fast(rows)):
+            mismatched.append(name)
+        legacy_ms = measure(legacy, rows, args.repeat)
+        fast_ms = measure(fast, rows, args.repeat)
+        results[name] = {
+            "rows": len(rows),
+            "legacy_cpu_ms": round(legacy_ms, 3),
+            "fast_cpu_ms": round(fast_ms, 3),
+            "speedup": round(legacy_ms / fast_ms, 1) if fast_ms else None,
+        }
+
+    print(json.dumps(results, indent=2))
+    if mismatched:
+        print(f"Fast path output differs from the schemas for: {', '.join(mismatched)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from sqlalchemy import select
 from database import async_session, engine, Base
 from models import User
 from auth import get_password_hash
+from services import ledger, counters
 
 async def init_admin():
     """Create default admin user if not exists"""
@@ -33,6 +34,8 @@ async def init_admin():
                 sp_points=10000
             )
             session.add(admin)
+            await ledger.open_account(session, admin)
+            await counters.increment(session, counters.USERS)
             await session.commit()
             print("✅ Default admin user created!")
             print("   Email: admin@cashclash.com")
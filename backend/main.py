@@ -1,9 +1,47 @@
+import logging
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, tournaments, matches, store, games, admin
+from services import structured_logging
+# Before the other imports, so their import-time log lines go through the queue too
+structured_logging.setup_logging()
+
+from routers import auth, tournaments, matches, store, games, admin, leaderboard, users, champions
 from database import engine, Base
+from serializers import ORJSONResponse
 from auth import get_password_hash
-app = FastAPI(title="CashClash API")
+from services.idempotency import IdempotentReplay, replay_handler
+from services import metrics, cache
+from services.compression import CompressionMiddleware
+from services.query_budget import QueryBudgetMiddleware, query_budget
+from services.riot_api import riot_client
+from services.email_service import email_queue
+from services.scheduler import scheduler
+from services import reaper, rollups, matchups, idempotency
+from services.leaderboard import leaderboards
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="CashClash API", default_response_class=ORJSONResponse)
+
+# Per-route latency, DB statement counts and pool usage, scraped from /metrics
+metrics.install_db_hooks(engine)
+metrics.register_collector(metrics.stats_collector("riot", riot_client.metrics))
+metrics.register_collector(metrics.stats_collector("email", email_queue.metrics))
+metrics.register_collector(metrics.labeled_stats_collector("cache", "namespace", cache.cache.metrics))
+metrics.register_collector(metrics.stats_collector("scheduler", scheduler.metrics))
+metrics.register_collector(metrics.labeled_stats_collector("scheduler_job", "job", lambda: scheduler.metrics()["jobs"]))
+metrics.register_collector(metrics.stats_collector("logging", structured_logging.metrics))
+metrics.register_collector(metrics.labeled_stats_collector("leaderboard_size", "season", leaderboards.metrics))
+
+# Periodic jobs, run by whichever worker holds the scheduler's leader lock
+scheduler.every("rollups", rollups.ROLLUP_INTERVAL, rollups.refresh_all)
+scheduler.every("reap_stale_games", reaper.REAPER_INTERVAL, reaper.reap)
+scheduler.every("champion_matchups", matchups.MATCHUP_INTERVAL, matchups.refresh)
+scheduler.every("idempotency_prune", idempotency.IDEMPOTENCY_PRUNE_INTERVAL, idempotency.prune)
+
+# Answer duplicate Idempotency-Key requests with the stored response
+app.add_exception_handler(IdempotentReplay, replay_handler)
 
 # CORS
 origin_regex = r"^(http://localhost(:\d+)?|https://.*\.onrender\.com)$"
@@ -14,7 +52,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Idempotent-Replayed", "ETag", "X-Request-ID"],
 )
+# Statement budgets per endpoint (QUERY_BUDGET_MODE=warn|raise); must sit inside MetricsMiddleware
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+# gzip, or brotli when installed, for bodies over COMPRESSION_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
+# Outermost, so every log line written for a request carries its X-Request-ID
+app.add_middleware(structured_logging.RequestIdMiddleware)
 
 # Include routers
 app.include_router(auth.router)
@@ -23,19 +69,96 @@ app.include_router(matches.router)
 app.include_router(store.router)
 app.include_router(games.router)
 app.include_router(admin.router)
+app.include_router(leaderboard.router)
+app.include_router(users.router)
+app.include_router(champions.router)
 
 @app.on_event("startup")
 async def startup():
-    print("🚀 Starting CashClash Backend...")
-    from sqlalchemy import select
-    from models import User
+    logger.info("Starting CashClash Backend")
+    from sqlalchemy import select, text
+    from models import User, LeaderboardEntry
     from auth import get_password_hash
     from database import async_session
+    from services import ledger, counters
+    from services.leaderboard import rebuild as rebuild_leaderboards
+    
+    # Start outbound email workers
+    email_queue.start()
+    
+    # Listen for cache invalidations from other workers
+    await cache.cache.start()
     
     # Create tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     
+    # create_all doesn't alter tables or enum types that already exist. New enum
+    # values have to be committed before anything can use them
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TYPE transactiontype ADD VALUE IF NOT EXISTS 'ADJUSTMENT'"))
+        await conn.execute(text("ALTER TYPE transactiontype ADD VALUE IF NOT EXISTS 'REFUND'"))
+        await conn.execute(text("ALTER TYPE gamestatus ADD VALUE IF NOT EXISTS 'EXPIRED'"))
+    
+    async with engine.begin() as conn:
+        # Databases from before the SP ledger: number the existing entries, then open every account
+        has_ledger = await conn.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'transactions' AND column_name = 'seq')"
+        ))
+        if not has_ledger:
+            await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS ledger_tail INTEGER NOT NULL DEFAULT 0"))
+            await conn.execute(text("ALTER TABLE transactions ADD COLUMN IF NOT EXISTS seq BIGINT GENERATED BY DEFAULT AS IDENTITY UNIQUE"))
+            await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_user_seq ON transactions (user_id, seq)"))
+            opened = await ledger.backfill_opening_balances(conn)
+            logger.info("Upgraded transactions to the SP ledger, posted %d opening balances", opened)
+        
+        # Games completed before completed_at existed: their creation time is the best estimate the rollups can get
+        has_completed_at = await conn.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'custom_games' AND column_name = 'completed_at')"
+        ))
+        if not has_completed_at:
+            await conn.execute(text("ALTER TABLE custom_games ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP WITHOUT TIME ZONE"))
+            await conn.execute(text("UPDATE custom_games SET completed_at = created_at WHERE status = 'COMPLETED'"))
+        await conn.execute(text("ALTER TABLE matches ADD COLUMN IF NOT EXISTS verified_at TIMESTAMP WITHOUT TIME ZONE"))
+        await conn.execute(text("ALTER TABLE redemptions ADD COLUMN IF NOT EXISTS email_queued_at TIMESTAMP WITHOUT TIME ZONE"))
+        
+        # Games already running before started_at existed: the last join is when they started
+        has_started_at = await conn.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'custom_games' AND column_name = 'started_at')"
+        ))
+        if not has_started_at:
+            await conn.execute(text("ALTER TABLE custom_games ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITHOUT TIME ZONE"))
+            await conn.execute(text(
+                "UPDATE custom_games g SET started_at = COALESCE("
+                "(SELECT max(p.joined_at) FROM game_players p WHERE p.game_id = g.id), g.created_at"
+                ") WHERE g.status <> 'OPEN'"
+            ))
+        
+        # Indexes added to tables that already existed: statements, admin directory, redemptions, rollups, player_stats
+        for ddl in (
+            "CREATE INDEX IF NOT EXISTS ix_transactions_user_created_id ON transactions (user_id, created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_users_sp_points_id ON users (sp_points, id)",
+            "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS ix_users_display_name_trgm ON users USING gin (display_name gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS ix_users_role ON users (role)",
+            "CREATE INDEX IF NOT EXISTS ix_redemptions_created_id ON redemptions (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_redemptions_pending_created_id ON redemptions (created_at, id) WHERE NOT fulfilled",
+            "CREATE INDEX IF NOT EXISTS ix_custom_games_created_at ON custom_games (created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_custom_games_completed_at ON custom_games (completed_at)",
+            "CREATE INDEX IF NOT EXISTS ix_custom_games_status_created_at ON custom_games (status, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_custom_games_status_started_at ON custom_games (status, started_at)",
+            "CREATE INDEX IF NOT EXISTS ix_matches_verified_at ON matches (verified_at)",
+            "CREATE INDEX IF NOT EXISTS ix_matches_player1_registration_id ON matches (player1_registration_id)",
+            "CREATE INDEX IF NOT EXISTS ix_matches_player2_registration_id ON matches (player2_registration_id)",
+            "CREATE INDEX IF NOT EXISTS ix_registrations_user_id ON registrations (user_id)",
+            "CREATE INDEX IF NOT EXISTS ix_game_players_user_id ON game_players (user_id)",
+        ):
+            await conn.execute(text(ddl))
+    
+    # Rollups and the stale-game reaper
+    scheduler.start()
+    
     # Create default admin if not exists
     async with async_session() as session:
         result = await session.execute(
@@ -53,11 +176,40 @@ async def startup():
                 sp_points=10000
             )
             session.add(admin)
+            await ledger.open_account(session, admin)
+            await counters.increment(session, counters.USERS)
             await session.commit()
-            print("✅ Default admin user created!")
+            logger.info("Default admin user created")
         else:
-            print("ℹ️  Admin user already exists")
+            logger.info("Admin user already exists")
+        
+        # Seed the dashboard counters on first run of a database that predates them
+        if not await counters.read_all(session):
+            await counters.reconcile(session)
+            await session.commit()
+        
+        # Likewise the leaderboards
+        if await session.scalar(select(LeaderboardEntry.user_id).limit(1)) is None:
+            await rebuild_leaderboards(session)
+            await session.commit()
+    
+    await leaderboards.warm()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await scheduler.stop()
+    await email_queue.stop()
+    await cache.cache.stop()
+    await riot_client.close()
+    structured_logging.shutdown_logging()
 
 @app.get("/")
+@query_budget(0)
 async def root():
     return {"message": "Welcome to the LoL Tournament Platform API"}
+
+
+@app.get("/metrics", include_in_schema=False)
+@query_budget(0)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
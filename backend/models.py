@@ -1,11 +1,14 @@
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Enum
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, ForeignKey, DateTime, Enum, Identity, Index, LargeBinary, DDL, event, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 import uuid
 import datetime
 from database import Base
 import enum
 
+# Trigram indexes on users need pg_trgm
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 class RoleEnum(str, enum.Enum):
     mid = "mid"
     top = "top"
@@ -15,13 +18,22 @@ class RoleEnum(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Admin directory: keyset pagination and trigram prefix/substring search
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_sp_points_id", "sp_points", "id"),
+        Index("ix_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        Index("ix_users_display_name_trgm", "display_name", postgresql_using="gin", postgresql_ops={"display_name": "gin_trgm_ops"}),
+        Index("ix_users_role", "role"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     google_id = Column(String, unique=True, nullable=True, index=True)
     email = Column(String, unique=True, index=True)
     display_name = Column(String)
     hashed_password = Column(String, nullable=True)
-    sp_points = Column(Integer, default=1)
-    role = Column(String, default='user')  # 'admin', 'moderator', 'user'
+    sp_points = Column(Integer, default=1)  # Projection of the ledger, see services/ledger.py
+    ledger_tail = Column(Integer, default=0, server_default="0", nullable=False)  # Ledger entries since last balance snapshot
+    role = Column(String, default='user')  # 'admin', 'moderator', 'user', or 'deleted' for a closed, anonymized account
     riot_summoner_name = Column(String, nullable=True)
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -45,6 +57,10 @@ class Tournament(Base):
 
 class Registration(Base):
     __tablename__ = "registrations"
+    __table_args__ = (
+        # Per-player lookups, e.g. the player_stats rebuild
+        Index("ix_registrations_user_id", "user_id"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tournament_id = Column(UUID(as_uuid=True), ForeignKey("tournaments.id"))
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
@@ -56,6 +72,11 @@ class Registration(Base):
 
 class Match(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        Index("ix_matches_verified_at", "verified_at"),
+        Index("ix_matches_player1_registration_id", "player1_registration_id"),
+        Index("ix_matches_player2_registration_id", "player2_registration_id"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tournament_id = Column(UUID(as_uuid=True), ForeignKey("tournaments.id"))
     round = Column(Integer)
@@ -64,6 +85,7 @@ class Match(Base):
     winner_registration_id = Column(UUID(as_uuid=True), ForeignKey("registrations.id"), nullable=True)
     riot_match_id = Column(String, nullable=True)
     verified = Column(Boolean, default=False)
+    verified_at = Column(DateTime, nullable=True)  # Watermark column of the champion matchup matrix
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     tournament = relationship("Tournament", back_populates="matches")
@@ -77,6 +99,8 @@ class TransactionType(str, enum.Enum):
     WAGER_WIN = "WAGER_WIN"
     WAGER_LOSS = "WAGER_LOSS"
     PURCHASE = "PURCHASE"
+    ADJUSTMENT = "ADJUSTMENT"
+    REFUND = "REFUND"
 
 class GameType(str, enum.Enum):
     ONE_VS_ONE = "1v1"
@@ -87,10 +111,17 @@ class GameStatus(str, enum.Enum):
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETED = "COMPLETED"
     DISPUTED = "DISPUTED"
+    EXPIRED = "EXPIRED"  # Never filled or never verified; wagers refunded
 
 class Transaction(Base):
+    """Append-only SP ledger entry. Rows are never updated or deleted."""
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_seq", "user_id", "seq"),
+        Index("ix_transactions_user_created_id", "user_id", "created_at", "id"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    seq = Column(BigInteger, Identity(), nullable=False, unique=True)  # Global append order
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     amount = Column(Integer)
     type = Column(Enum(TransactionType))
@@ -99,8 +130,23 @@ class Transaction(Base):
     
     user = relationship("User", back_populates="transactions")
 
+class BalanceSnapshot(Base):
+    """Ledger balance of a user as of ledger entry last_seq."""
+    __tablename__ = "balance_snapshots"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    balance = Column(BigInteger, nullable=False)
+    last_seq = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class CustomGame(Base):
     __tablename__ = "custom_games"
+    __table_args__ = (
+        Index("ix_custom_games_created_at", "created_at"),
+        Index("ix_custom_games_completed_at", "completed_at"),
+        # Lobby listing and the stale-game reaper
+        Index("ix_custom_games_status_created_at", "status", "created_at"),
+        Index("ix_custom_games_status_started_at", "status", "started_at"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     type = Column(Enum(GameType))
     wager_amount = Column(Integer)
@@ -108,12 +154,18 @@ class CustomGame(Base):
     creator_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     winner_team = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Set when the last seat fills and the game goes IN_PROGRESS
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
 
     creator = relationship("User", back_populates="games_created")
     players = relationship("GamePlayer", back_populates="game")
 
 class GamePlayer(Base):
     __tablename__ = "game_players"
+    __table_args__ = (
+        Index("ix_game_players_user_id", "user_id"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     game_id = Column(UUID(as_uuid=True), ForeignKey("custom_games.id"))
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
@@ -134,9 +186,113 @@ class StoreItem(Base):
 
 class Redemption(Base):
     __tablename__ = "redemptions"
+    __table_args__ = (
+        Index("ix_redemptions_created_id", "created_at", "id"),
+        Index("ix_redemptions_pending_created_id", "created_at", "id", postgresql_where=text("NOT fulfilled")),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'))
     item_id = Column(UUID(as_uuid=True), ForeignKey('store_items.id'))
     email_sent = Column(Boolean, default=False)
+    # Set when a bulk send queues the email, so repeated sends don't queue it again before it's delivered
+    email_queued_at = Column(DateTime, nullable=True)
     fulfilled = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class PlatformCounter(Base):
+    """Platform-wide counter, split into shards so hot counters don't serialize writers."""
+    __tablename__ = "platform_counters"
+    name = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+class ResourceVersion(Base):
+    """Change counter per cacheable resource, sharded like PlatformCounter. Backs the ETags."""
+    __tablename__ = "resource_versions"
+    name = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class IdempotencyRecord(Base):
+    """
+    Response to a request made with an Idempotency-Key, written in the same
+    transaction as the request's effects. See services/idempotency.py.
+    """
+    __tablename__ = "idempotency_records"
+    __table_args__ = (
+        Index("ix_idempotency_records_created_at", "created_at"),
+    )
+    key = Column(String, primary_key=True)  # "<subject>:<Idempotency-Key>"
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False, default=200)
+    body = Column(JSONB)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class LeaderboardEntry(Base):
+    """
+    Persisted leaderboard scores per season ('YYYY-MM', or 'all' for all time).
+    sp_points is only kept on the 'all' row. Workers rebuild their in-memory
+    boards from this table and follow it by updated_at.
+    """
+    __tablename__ = "leaderboard_entries"
+    __table_args__ = (
+        Index("ix_leaderboard_entries_season_updated_at", "season", "updated_at"),
+    )
+    season = Column(String, primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    sp_points = Column(Integer, nullable=True)
+    wins = Column(Integer, nullable=False, default=0)
+    games = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class PlayerStats(Base):
+    """
+    Per-user profile aggregate, updated when games and tournament matches
+    are settled so a profile read is one primary-key lookup. See services/player_stats.py.
+    """
+    __tablename__ = "player_stats"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    games = Column(JSONB, nullable=False, default=dict)  # GameType value -> {"played", "wins", "losses"}
+    tournaments = Column(JSONB, nullable=False, default=dict)  # entered, matches_won, matches_lost, best_round
+    champions = Column(JSONB, nullable=False, default=dict)  # champion -> {"picks", "wins"}
+    net_sp_won = Column(BigInteger, nullable=False, default=0)  # Winnings minus wagers over settled games
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class ChampionMatchupMatrix(Base):
+    """
+    Champion x champion results of verified matches, stored densely: wins is
+    an array('I') of len(champions)**2 counts, row-major, where cell [i][j]
+    counts wins of champions[i] over champions[j]. See services/matchups.py.
+    """
+    __tablename__ = "champion_matchup_matrices"
+    name = Column(String, primary_key=True)
+    champions = Column(JSONB, nullable=False, default=list)
+    wins = Column(LargeBinary, nullable=False, default=b"")
+    matches = Column(BigInteger, nullable=False, default=0)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class SpFlowRollup(Base):
+    """SP moved per time bucket and flow (deposited, wagered, paid_out, redeemed, adjusted, refunded)."""
+    __tablename__ = "sp_flow_rollups"
+    granularity = Column(String, primary_key=True)  # 'hour' or 'day'
+    bucket = Column(DateTime, primary_key=True)
+    metric = Column(String, primary_key=True)
+    amount = Column(BigInteger, nullable=False, default=0)
+    entries = Column(BigInteger, nullable=False, default=0)
+
+class GameActivityRollup(Base):
+    """Custom games created and completed per time bucket and game type."""
+    __tablename__ = "game_activity_rollups"
+    granularity = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    game_type = Column(Enum(GameType), primary_key=True)
+    created = Column(BigInteger, nullable=False, default=0)
+    completed = Column(BigInteger, nullable=False, default=0)
+
+class RollupWatermark(Base):
+    """How far a rollup has consumed its source table."""
+    __tablename__ = "rollup_watermarks"
+    name = Column(String, primary_key=True)
+    position = Column(BigInteger, nullable=True)  # Last ledger seq consumed
+    timestamp = Column(DateTime, nullable=True)  # Last created_at/completed_at consumed
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Recompute every player's profile statistics (player_stats) from the games,
+ledger, registrations and matches tables, e.g. to backfill a database that
+predates them or after fixing historical results.
+
+    python rebuild_player_stats.py --chunk-size 5000
+"""
+import argparse
+import asyncio
+import json
+
+from database import async_session, engine
+from services.player_stats import rebuild, REBUILD_CHUNK_SIZE
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE, help="Users recomputed and committed per batch")
+    args = parser.parse_args()
+
+    try:
+        async with async_session() as session:
+            # Commits after every chunk
+            players = await rebuild(session, args.chunk_size)
+    finally:
+        await engine.dispose()
+    print(json.dumps({"players": players}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Compare every user's sp_points with the sum of their ledger entries and
+write the users that drift to a JSON-lines report.
+
+    python reconcile_balances.py --report drift.jsonl --chunk-size 10000 --concurrency 4
+"""
+import argparse
+import asyncio
+import datetime
+import json
+
+from database import engine
+from services.reconciliation import reconcile, RECONCILE_CHUNK_SIZE, RECONCILE_CONCURRENCY
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--report", default=f"drift-{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.jsonl")
+    parser.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK_SIZE)
+    parser.add_argument("--concurrency", type=int, default=RECONCILE_CONCURRENCY)
+    args = parser.parse_args()
+
+    try:
+        summary = await reconcile(args.report, args.chunk_size, args.concurrency)
+    finally:
+        await engine.dispose()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,21 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update
-from database import get_db
-from models import User, CustomGame, GamePlayer, Redemption, StoreItem, Transaction
+from sqlalchemy import select, delete, update, and_, or_, tuple_
+from database import get_db, async_session
+from models import User, CustomGame, GamePlayer, GameStatus, GameType, Redemption, StoreItem, TransactionType, SpFlowRollup, GameActivityRollup
 from routers.auth import get_current_user
-from pydantic import BaseModel
+from auth import Principal
+from services.riot_api import riot_client
+from services import ledger, counters, rollups, versions, cache, reaper, leaderboard, player_stats, matchups
+from services.scheduler import scheduler
+from services.pagination import encode_cursor, decode_cursor
+from services.query_budget import query_budget
+import serializers
+from serializers import ORJSONResponse
+from services import export
+from services.email_service import email_queue, OutboundEmail
+from pydantic import BaseModel, Field
 from typing import Optional, List
+from datetime import datetime, timedelta
+import os
 import uuid
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 # Pydantic models
+# Max ids bound into a single IN (...) list
+BULK_CHUNK_SIZE = 1000
+# Chunks one bulk user request may touch, which is what its query budget allows for
+BULK_MAX_CHUNKS = 10
+
 class UserUpdate(BaseModel):
     role: Optional[str] = None
     sp_points: Optional[int] = None
     is_verified: Optional[bool] = None
 
+class UserFilter(BaseModel):
+    role: Optional[str] = None
+    is_verified: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class BulkUserRequest(BaseModel):
+    user_ids: Optional[List[uuid.UUID]] = Field(None, max_length=BULK_MAX_CHUNKS * BULK_CHUNK_SIZE)
+    filter: Optional[UserFilter] = None
+    action: str  # 'sp_delta', 'role' or 'verify'
+    sp_delta: Optional[int] = None
+    role: Optional[str] = None
+    is_verified: bool = True
+    description: Optional[str] = None
+
 class GameCreate(BaseModel):
     type: str  # '1v1' or '5v5'
     wager_amount: int
@@ -27,51 +60,154 @@ class EmailRequest(BaseModel):
     redemption_id: str
     message: Optional[str] = None
 
+class RedemptionFilter(BaseModel):
+    fulfilled: Optional[bool] = None
+    email_sent: Optional[bool] = None
+    item_id: Optional[uuid.UUID] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class BulkRedemptionRequest(BaseModel):
+    ids: Optional[List[uuid.UUID]] = None
+    filter: Optional[RedemptionFilter] = None
+    limit: int = Field(BULK_MAX_CHUNKS * BULK_CHUNK_SIZE, ge=1, le=BULK_MAX_CHUNKS * BULK_CHUNK_SIZE)
+    message: Optional[str] = None
+
+def redemption_email_content(display_name: str, item_name: str, message: Optional[str]):
+    """Subject and body of the email sent for a redeemed store item"""
+    body = f"Hi {display_name},\n\nYour redemption of {item_name} has been processed."
+    if message:
+        body += f"\n\n{message}"
+    body += "\n\nThanks for playing CashClash!"
+    return f"Your {item_name} redemption", body
+
+REDEMPTION_EMAIL = "redemption"
+# A bulk-queued email that still isn't marked sent after this (worker restart, dead letter) may be queued again
+REDEMPTION_EMAIL_REQUEUE_AFTER = timedelta(seconds=float(os.getenv("REDEMPTION_EMAIL_REQUEUE_AFTER", "3600")))
+
+def redemption_email(redemption_id: uuid.UUID, email: str, display_name: str, item_name: str, message: Optional[str]) -> OutboundEmail:
+    return OutboundEmail(email, *redemption_email_content(display_name, item_name, message), kind=REDEMPTION_EMAIL, key=str(redemption_id))
+
+async def mark_redemption_emails_sent(redemption_ids: List[str]):
+    """Email queue hook: flag the redemptions whose email the SMTP server accepted"""
+    async with async_session() as session:
+        await session.execute(
+            update(Redemption)
+            .where(Redemption.id.in_([uuid.UUID(redemption_id) for redemption_id in redemption_ids]))
+            .values(email_sent=True)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+email_queue.on_delivered(REDEMPTION_EMAIL, mark_redemption_emails_sent)
+
 # Dependency to check if user is admin
-async def require_admin(current_user: User = Depends(get_current_user)):
+async def require_admin(current_user: Principal = Depends(get_current_user)):
     if current_user.role != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
 # Dependency to check if user is admin or moderator
-async def require_moderator(current_user: User = Depends(get_current_user)):
+async def require_moderator(current_user: Principal = Depends(get_current_user)):
     if current_user.role not in ['admin', 'moderator']:
         raise HTTPException(status_code=403, detail="Moderator or Admin access required")
     return current_user
 
+def _chunks(items: list, size: int = BULK_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 # ============= USER MANAGEMENT =============
 
+USER_SORT_COLUMNS = {
+    "created_at": User.created_at,
+    "sp_points": User.sp_points,
+}
+
+USER_DIRECTORY_COLUMNS = (
+    User.id, User.email, User.display_name, User.sp_points, User.role,
+    User.riot_summoner_name, User.is_verified, User.created_at
+)
+
 @router.get("/users")
+@query_budget(2)
 async def list_users(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: str = Query("created_at", pattern="^(created_at|sp_points)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    q: Optional[str] = None,
+    match: str = Query("contains", pattern="^(prefix|contains)$"),
+    role: Optional[str] = None,
+    is_verified: Optional[bool] = None,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
-    """List all users with their details"""
-    result = await db.execute(select(User))
-    users = result.scalars().all()
-    return [{
-        "id": str(user.id),
-        "email": user.email,
-        "display_name": user.display_name,
-        "sp_points": user.sp_points,
-        "role": user.role,
-        "riot_summoner_name": user.riot_summoner_name,
-        "is_verified": user.is_verified,
-        "created_at": user.created_at.isoformat()
-    } for user in users]
+    """Search and page through users, keyset-paginated on (sort column, id)"""
+    sort_column = USER_SORT_COLUMNS[sort]
+    query = select(*USER_DIRECTORY_COLUMNS)
+    
+    if q:
+        # Served by the trigram indexes for both prefix and substring matches
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"{escaped}%" if match == "prefix" else f"%{escaped}%"
+        query = query.where(or_(User.email.ilike(pattern, escape="\\"), User.display_name.ilike(pattern, escape="\\")))
+    # Closed accounts only show up when asked for with role=deleted
+    query = query.where(User.role == role) if role is not None else query.where(User.role != 'deleted')
+    if is_verified is not None:
+        query = query.where(User.is_verified == is_verified)
+    
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, 2)
+        try:
+            key = (datetime.fromisoformat(last_value) if sort == "created_at" else int(last_value), uuid.UUID(last_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        position = tuple_(sort_column, User.id)
+        query = query.where(position < tuple_(*key) if order == "desc" else position > tuple_(*key))
+    
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), User.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), User.id.asc())
+    
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        last_value = last.created_at.isoformat() if sort == "created_at" else last.sp_points
+        next_cursor = encode_cursor(last_value, last.id)
+    
+    return {
+        "items": [{
+            "id": str(row.id),
+            "email": row.email,
+            "display_name": row.display_name,
+            "sp_points": row.sp_points,
+            "role": row.role,
+            "riot_summoner_name": row.riot_summoner_name,
+            "is_verified": row.is_verified,
+            "created_at": row.created_at.isoformat()
+        } for row in rows],
+        "next_cursor": next_cursor
+    }
 
 @router.patch("/users/{user_id}")
+@query_budget(14)
 async def update_user(
     user_id: str,
     updates: UserUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
     """Update user details (promote to moderator, adjust SP, verify account)"""
     result = await db.execute(select(User).where(User.id == uuid.UUID(user_id)))
     user = result.scalars().first()
     
-    if not user:
+    if not user or user.role == 'deleted':
         raise HTTPException(status_code=404, detail="User not found")
     
     if updates.role is not None:
@@ -80,12 +216,23 @@ async def update_user(
         user.role = updates.role
     
     if updates.sp_points is not None:
-        user.sp_points = updates.sp_points
+        if updates.sp_points < 0:
+            raise HTTPException(status_code=400, detail="SP points cannot be negative")
+        delta = updates.sp_points - user.sp_points
+        if delta:
+            try:
+                await ledger.adjust(db, user.id, delta, f"Balance set to {updates.sp_points} by {current_user.email}")
+            except ledger.InsufficientFunds:
+                raise HTTPException(status_code=409, detail="Balance changed concurrently, retry")
     
     if updates.is_verified is not None:
         user.is_verified = updates.is_verified
     
+    if updates.role is not None or updates.is_verified is not None:
+        await versions.bump(db, versions.USERS)
     await db.commit()
+    if updates.role is not None or updates.is_verified is not None:
+        await cache.principals.invalidate(user.email)
     await db.refresh(user)
     
     return {
@@ -97,24 +244,144 @@ async def update_user(
         "is_verified": user.is_verified
     }
 
+async def _user_selections(db: AsyncSession, request: BulkUserRequest):
+    """
+    WHERE clauses selecting the target users, one per chunk of at most
+    BULK_CHUNK_SIZE ids. A filter is paged by id; one matching more than
+    BULK_MAX_CHUNKS chunks is refused rather than run over budget.
+    """
+    if (request.user_ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of user_ids or filter")
+    if request.user_ids is not None:
+        for chunk in _chunks(list(dict.fromkeys(request.user_ids))):
+            yield and_(User.id.in_(chunk), User.role != 'deleted')
+        return
+    # Closed accounts are never bulk-updated
+    criteria = [User.role != 'deleted']
+    if request.filter.role is not None:
+        criteria.append(User.role == request.filter.role)
+    if request.filter.is_verified is not None:
+        criteria.append(User.is_verified == request.filter.is_verified)
+    if request.filter.created_after is not None:
+        criteria.append(User.created_at >= request.filter.created_after)
+    if request.filter.created_before is not None:
+        criteria.append(User.created_at < request.filter.created_before)
+    
+    after = None
+    for _ in range(BULK_MAX_CHUNKS):
+        page = select(User.id).where(*criteria).order_by(User.id).limit(BULK_CHUNK_SIZE)
+        if after is not None:
+            page = page.where(User.id > after)
+        ids = list((await db.execute(page)).scalars())
+        if not ids:
+            return
+        # The filter again, for rows changed since the page was read
+        yield and_(User.id.in_(ids), *criteria)
+        if len(ids) < BULK_CHUNK_SIZE:
+            return
+        after = ids[-1]
+    more = await db.scalar(select(User.id).where(*criteria, User.id > after).limit(1))
+    if more is not None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Filter matches more than {BULK_MAX_CHUNKS * BULK_CHUNK_SIZE} users, narrow it down",
+        )
+
+# Up to six statements per chunk of BULK_CHUNK_SIZE ids (a page of a filter, then the update), BULK_MAX_CHUNKS chunks
+@router.post("/users/bulk")
+@query_budget(64, repeats=BULK_MAX_CHUNKS + 1)
+async def bulk_update_users(
+    request: BulkUserRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_admin)
+):
+    """Apply one action (SP delta, role or verification) to many users in a single transaction"""
+    selections = _user_selections(db, request)
+    updated = 0
+    
+    if request.action == "sp_delta":
+        if not request.sp_delta:
+            raise HTTPException(status_code=400, detail="sp_delta must be a non-zero integer")
+        description = request.description or f"Bulk adjustment of {request.sp_delta} SP by {current_user.email}"
+        async for criteria in selections:
+            moved = await ledger.bulk_adjust(db, criteria, request.sp_delta, TransactionType.ADJUSTMENT, description)
+            updated += len(moved)
+    
+    elif request.action in ("role", "verify"):
+        if request.action == "role":
+            if request.role not in ['admin', 'moderator', 'user']:
+                raise HTTPException(status_code=400, detail="Invalid role")
+            values = {"role": request.role}
+        else:
+            values = {"is_verified": request.is_verified}
+        async for criteria in selections:
+            result = await db.execute(
+                update(User).where(criteria).values(**values)
+                .returning(User.id)
+                .execution_options(synchronize_session=False)
+            )
+            updated += len(result.all())
+        await versions.bump(db, versions.USERS)
+    
+    else:
+        raise HTTPException(status_code=400, detail="Unknown action, expected sp_delta, role or verify")
+    
+    await db.commit()
+    if request.action in ("role", "verify"):
+        # Cheaper than collecting every email, and principals reload in one query
+        await cache.principals.invalidate()
+    
+    summary = {"action": request.action, "updated": updated}
+    if request.user_ids is not None:
+        summary["requested"] = len(set(request.user_ids))
+        summary["skipped"] = summary["requested"] - updated
+    if request.action == "sp_delta":
+        summary["total_sp_delta"] = request.sp_delta * updated
+    return summary
+
 @router.delete("/users/{user_id}")
+@query_budget(14)
 async def delete_user(
     user_id: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
-    """Delete a user account"""
-    await db.execute(delete(User).where(User.id == uuid.UUID(user_id)))
+    """
+    Close a user account. The ledger, games and redemptions keep referencing
+    the row, so it is anonymized rather than deleted, and any SP left is
+    written off with a closing ledger entry.
+    """
+    result = await db.execute(select(User).where(User.id == uuid.UUID(user_id)).with_for_update())
+    user = result.scalars().first()
+    
+    if not user or user.role == 'deleted':
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    email = user.email
+    if user.sp_points:
+        await ledger.adjust(db, user.id, -user.sp_points, f"Account closed by {current_user.email}")
+    
+    user.email = f"deleted-{user.id}@deleted.invalid"
+    user.display_name = "Deleted user"
+    user.hashed_password = None
+    user.google_id = None
+    user.riot_summoner_name = None
+    user.is_verified = False
+    user.role = 'deleted'
+    await counters.increment(db, counters.USERS, -1)
+    await versions.bump(db, versions.USERS)
     await db.commit()
+    await cache.principals.invalidate(email)
     return {"message": "User deleted successfully"}
 
 # ============= GAME MANAGEMENT =============
 
 @router.post("/games")
+@query_budget(5)
 async def create_game(
     game_data: GameCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_moderator)
+    current_user: Principal = Depends(require_moderator)
 ):
     """Create a custom game (moderator/admin only)"""
     new_game = CustomGame(
@@ -124,6 +391,8 @@ async def create_game(
         status='OPEN'
     )
     db.add(new_game)
+    await counters.increment(db, counters.GAMES)
+    await versions.bump(db, versions.GAMES)
     await db.commit()
     await db.refresh(new_game)
     
@@ -135,9 +404,10 @@ async def create_game(
     }
 
 @router.get("/games")
+@query_budget(4)
 async def list_all_games(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_moderator)
+    current_user: Principal = Depends(require_moderator)
 ):
     """List all games (all statuses)"""
     from sqlalchemy.orm import selectinload
@@ -147,54 +417,47 @@ async def list_all_games(
             selectinload(CustomGame.players).selectinload(GamePlayer.user)
         )
     )
-    games = result.scalars().all()
-    
-    games_list = []
-    for game in games:
-        games_list.append({
-            "id": str(game.id),
-            "type": game.type,
-            "wager_amount": game.wager_amount,
-            "status": game.status,
-            "winner_team": game.winner_team,
-            "created_at": game.created_at.isoformat(),
-            "players": [{
-                "user_id": str(p.user_id),
-                "team": p.team,
-                "user": {
-                    "id": str(p.user.id),
-                    "display_name": p.user.display_name,
-                    "email": p.user.email
-                } if p.user else None
-            } for p in game.players]
-        })
-    
-    return games_list
+    return ORJSONResponse(serializers.admin_games(result.scalars()))
 
+# Refunding escrowed wagers is one set-based ledger post (up to 5 statements)
 @router.delete("/games/{game_id}")
+@query_budget(11)
 async def delete_game(
     game_id: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
-    """Delete a game"""
-    # Delete associated players first
-    await db.execute(delete(GamePlayer).where(GamePlayer.game_id == uuid.UUID(game_id)))
-    # Delete the game
-    await db.execute(delete(CustomGame).where(CustomGame.id == uuid.UUID(game_id)))
+    """Delete a game, refunding the players' wagers if it still holds them"""
+    # Locked so a concurrent join, verify or reaper run can't move its wagers meanwhile
+    result = await db.execute(
+        select(CustomGame.status, CustomGame.wager_amount).where(CustomGame.id == uuid.UUID(game_id)).with_for_update()
+    )
+    game = result.first()
+    if game is not None:
+        if game.status in reaper.ESCROW_STATUSES:
+            await reaper.refund_wagers(db, {uuid.UUID(game_id): game.wager_amount}, "Refund for deleted game")
+        # Delete associated players first
+        await db.execute(delete(GamePlayer).where(GamePlayer.game_id == uuid.UUID(game_id)))
+        await db.execute(delete(CustomGame).where(CustomGame.id == uuid.UUID(game_id)))
+        await counters.increment(db, counters.GAMES, -1)
+        if game.status == GameStatus.COMPLETED:
+            await counters.increment(db, counters.COMPLETED_GAMES, -1)
+        await versions.bump(db, versions.GAMES)
     await db.commit()
     return {"message": "Game deleted successfully"}
 
+# Winners are credited with one set-based ledger post (up to 5 statements with snapshots), 1v1 or 5v5
 @router.post("/games/{game_id}/verify")
+@query_budget(15)
 async def verify_game_winner(
     game_id: str,
     verify_data: GameVerify,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_moderator)
+    current_user: Principal = Depends(require_moderator)
 ):
     """Verify game winner and distribute SP (moderator/admin only)"""
-    # Get the game
-    result = await db.execute(select(CustomGame).where(CustomGame.id == uuid.UUID(game_id)))
+    # Get the game, locked so it can only be settled once
+    result = await db.execute(select(CustomGame).where(CustomGame.id == uuid.UUID(game_id)).with_for_update())
     game = result.scalars().first()
     
     if not game:
@@ -203,6 +466,9 @@ async def verify_game_winner(
     if game.status == 'COMPLETED':
         raise HTTPException(status_code=400, detail="Game already completed")
     
+    if game.status == GameStatus.EXPIRED:
+        raise HTTPException(status_code=400, detail="Game expired and wagers were refunded")
+    
     # Get all players
     players_result = await db.execute(
         select(GamePlayer).where(GamePlayer.game_id == game.id)
@@ -217,26 +483,23 @@ async def verify_game_winner(
     total_pot = game.wager_amount * len(players)
     winnings_per_winner = total_pot // len(winners) if winners else 0
     
-    # Distribute SP to winners
-    for winner in winners:
-        user_result = await db.execute(select(User).where(User.id == winner.user_id))
-        user = user_result.scalars().first()
-        if user:
-            user.sp_points += winnings_per_winner
-            
-            # Record transaction
-            transaction = Transaction(
-                user_id=user.id,
-                amount=winnings_per_winner,
-                type='WAGER_WIN',
-                description=f"Won game {game_id}"
-            )
-            db.add(transaction)
+    # Distribute SP to winners; accounts that no longer exist are skipped
+    await ledger.bulk_credit(db, [
+        (winner.user_id, winnings_per_winner, f"Won game {game_id}") for winner in winners
+    ], TransactionType.WAGER_WIN)
     
     # Update game status
     game.status = 'COMPLETED'
     game.winner_team = winner_team
-    
+    game.completed_at = datetime.utcnow()
+    
+    await leaderboard.record_results(db, [(p.user_id, p.team == winner_team) for p in players], game.completed_at)
+    await player_stats.record_game(db, game.type, [
+        (p.user_id, p.team == winner_team, winnings_per_winner - game.wager_amount if p.team == winner_team else -game.wager_amount)
+        for p in players
+    ])
+    await counters.increment(db, counters.COMPLETED_GAMES)
+    await versions.bump(db, versions.GAMES)
     await db.commit()
     
     return {
@@ -248,75 +511,226 @@ async def verify_game_winner(
 # ============= REDEMPTION MANAGEMENT =============
 
 @router.get("/redemptions")
+@query_budget(2)
 async def list_redemptions(
     pending_only: bool = False,
+    status: str = Query("all", pattern="^(all|pending|fulfilled|email_pending)$"),
+    sort: str = Query("oldest", pattern="^(oldest|newest)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
-    """List all redemptions"""
-    query = select(Redemption)
-    if pending_only:
-        query = query.where(Redemption.fulfilled == False)
+    """List redemptions with their user and item in one joined, column-only query"""
+    query = (
+        select(
+            Redemption.id, Redemption.email_sent, Redemption.fulfilled, Redemption.created_at,
+            User.id.label("user_id"), User.email, User.display_name,
+            StoreItem.id.label("item_id"), StoreItem.name.label("item_name"), StoreItem.description.label("item_description")
+        )
+        .outerjoin(User, User.id == Redemption.user_id)
+        .outerjoin(StoreItem, StoreItem.id == Redemption.item_id)
+    )
     
-    result = await db.execute(query)
-    redemptions = result.scalars().all()
+    if pending_only or status == "pending":
+        query = query.where(Redemption.fulfilled == False)
+    elif status == "fulfilled":
+        query = query.where(Redemption.fulfilled == True)
+    elif status == "email_pending":
+        query = query.where(Redemption.email_sent == False, Redemption.fulfilled == False)
+    
+    position = tuple_(Redemption.created_at, Redemption.id)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        try:
+            key = tuple_(datetime.fromisoformat(created_at), uuid.UUID(last_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(position > key if sort == "oldest" else position < key)
+    
+    if sort == "oldest":
+        query = query.order_by(Redemption.created_at.asc(), Redemption.id.asc())
+    else:
+        query = query.order_by(Redemption.created_at.desc(), Redemption.id.desc())
+    
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at.isoformat(), rows[-1].id)
     
-    redemption_list = []
-    for redemption in redemptions:
-        # Get user details
-        user_result = await db.execute(select(User).where(User.id == redemption.user_id))
-        user = user_result.scalars().first()
-        
-        # Get item details
-        item_result = await db.execute(select(StoreItem).where(StoreItem.id == redemption.item_id))
-        item = item_result.scalars().first()
-        
-        redemption_list.append({
-            "id": str(redemption.id),
+    return {
+        "items": [{
+            "id": str(row.id),
             "user": {
-                "id": str(user.id),
-                "email": user.email,
-                "display_name": user.display_name
-            } if user else None,
+                "id": str(row.user_id),
+                "email": row.email,
+                "display_name": row.display_name
+            } if row.user_id else None,
             "item": {
-                "id": str(item.id),
-                "name": item.name,
-                "description": item.description
-            } if item else None,
-            "email_sent": redemption.email_sent,
-            "fulfilled": redemption.fulfilled,
-            "created_at": redemption.created_at.isoformat()
-        })
-    
-    return redemption_list
-
-@router.post("/redemptions/{redemption_id}/send-email")
+                "id": str(row.item_id),
+                "name": row.item_name,
+                "description": row.item_description
+            } if row.item_id else None,
+            "email_sent": row.email_sent,
+            "fulfilled": row.fulfilled,
+            "created_at": row.created_at.isoformat()
+        } for row in rows],
+        "next_cursor": next_cursor
+    }
+
+# Declared before the per-redemption routes, which would otherwise match /redemptions/bulk/...
+def _filter_redemptions(query, filters: RedemptionFilter):
+    if filters.fulfilled is not None:
+        query = query.where(Redemption.fulfilled == filters.fulfilled)
+    if filters.email_sent is not None:
+        query = query.where(Redemption.email_sent == filters.email_sent)
+    if filters.item_id is not None:
+        query = query.where(Redemption.item_id == filters.item_id)
+    if filters.created_after is not None:
+        query = query.where(Redemption.created_at >= filters.created_after)
+    if filters.created_before is not None:
+        query = query.where(Redemption.created_at < filters.created_before)
+    return query
+
+def _bulk_selection(request: BulkRedemptionRequest):
+    """Redemption ids to act on, as explicit id chunks or one filtered subquery"""
+    if (request.ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of ids or filter")
+    if request.ids is not None:
+        ids = list(dict.fromkeys(request.ids))
+        if len(ids) > request.limit:
+            raise HTTPException(status_code=400, detail=f"At most {request.limit} ids per request")
+        return [Redemption.id.in_(chunk) for chunk in _chunks(ids)]
+    matching = _filter_redemptions(select(Redemption.id), request.filter).order_by(Redemption.created_at).limit(request.limit)
+    return [Redemption.id.in_(matching.scalar_subquery())]
+
+def _bulk_report(requested: Optional[List[uuid.UUID]], outcomes: dict):
+    """Per-item outcomes plus counts; requested ids with no outcome were not found"""
+    if requested is not None:
+        for redemption_id in requested:
+            outcomes.setdefault(redemption_id, {"status": "not_found"})
+    summary = {}
+    for outcome in outcomes.values():
+        summary[outcome["status"]] = summary.get(outcome["status"], 0) + 1
+    return {
+        "summary": summary,
+        "results": [{"id": str(redemption_id), **outcome} for redemption_id, outcome in outcomes.items()]
+    }
+
+# Two statements per chunk of BULK_CHUNK_SIZE ids, ten chunks at the default limit
+@router.post("/redemptions/bulk/fulfill")
+@query_budget(22, repeats=10)
+async def bulk_fulfill_redemptions(
+    request: BulkRedemptionRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_admin)
+):
+    """Mark many redemptions as fulfilled with set-based updates"""
+    outcomes = {}
+    for selection in _bulk_selection(request):
+        result = await db.execute(
+            update(Redemption)
+            .where(selection, Redemption.fulfilled == False)
+            .values(fulfilled=True)
+            .returning(Redemption.id)
+            .execution_options(synchronize_session=False)
+        )
+        for redemption_id in result.scalars():
+            outcomes[redemption_id] = {"status": "fulfilled"}
+        
+        if request.ids is not None:
+            result = await db.execute(select(Redemption.id).where(selection, Redemption.fulfilled == True))
+            for redemption_id in result.scalars():
+                outcomes.setdefault(redemption_id, {"status": "already_fulfilled"})
+    
+    fulfilled = sum(1 for outcome in outcomes.values() if outcome["status"] == "fulfilled")
+    await counters.increment(db, counters.PENDING_REDEMPTIONS, -fulfilled)
+    await db.commit()
+    return _bulk_report(request.ids, outcomes)
+
+# Two statements per chunk of BULK_CHUNK_SIZE ids, ten chunks at most
+@router.post("/redemptions/bulk/send-email", status_code=202)
+@query_budget(21, repeats=10)
+async def bulk_send_redemption_emails(
+    request: BulkRedemptionRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_admin)
+):
+    """Queue redemption emails; the mail queue marks each one as sent once the SMTP server accepts it"""
+    now = datetime.utcnow()
+    rows = []
+    outcomes = {}
+    for selection in _bulk_selection(request):
+        # Claim the unsent emails that aren't already queued, so a repeated call can't queue them twice
+        result = await db.execute(
+            update(Redemption)
+            .where(
+                selection,
+                Redemption.user_id == User.id,
+                Redemption.item_id == StoreItem.id,
+                Redemption.email_sent == False,
+                or_(Redemption.email_queued_at.is_(None), Redemption.email_queued_at < now - REDEMPTION_EMAIL_REQUEUE_AFTER),
+            )
+            .values(email_queued_at=now)
+            .returning(Redemption.id, User.email, User.display_name, StoreItem.name)
+            .execution_options(synchronize_session=False)
+        )
+        rows.extend(result.all())
+        
+        result = await db.execute(select(Redemption.id, Redemption.email_sent).where(selection))
+        for redemption_id, email_sent in result.all():
+            outcomes[redemption_id] = {"status": "already_sent" if email_sent else "already_queued"}
+    
+    # Commit the claims before queueing; the connection is released before the response is sent
+    await db.commit()
+    
+    for redemption_id, email, display_name, item_name in rows:
+        email_queue.enqueue(redemption_email(redemption_id, email, display_name, item_name, request.message))
+        outcomes[redemption_id] = {"status": "queued"}
+    
+    return _bulk_report(request.ids, outcomes)
+
+@router.post("/redemptions/{redemption_id}/send-email", status_code=202)
+@query_budget(2)
 async def send_redemption_email(
     redemption_id: str,
     email_data: EmailRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
-    """Mark redemption email as sent (in production, this would actually send an email)"""
-    result = await db.execute(select(Redemption).where(Redemption.id == uuid.UUID(redemption_id)))
-    redemption = result.scalars().first()
+    """Queue the redemption email; the mail queue marks it as sent once the SMTP server accepts it"""
+    result = await db.execute(
+        select(Redemption.id, User.email, User.display_name, StoreItem.name)
+        .join(User, User.id == Redemption.user_id)
+        .join(StoreItem, StoreItem.id == Redemption.item_id)
+        .where(Redemption.id == uuid.UUID(redemption_id))
+    )
+    row = result.first()
     
-    if not redemption:
+    if not row:
         raise HTTPException(status_code=404, detail="Redemption not found")
     
-    redemption.email_sent = True
-    await db.commit()
-    
-    # TODO: Integrate with actual email service (SendGrid, AWS SES, etc.)
-    # For now, just mark as sent
+    # End the read transaction now rather than holding the connection until the response is sent
+    await db.rollback()
+    email_queue.enqueue(redemption_email(*row, email_data.message))
     
-    return {"message": "Email marked as sent", "redemption_id": redemption_id}
+    return {"message": "Email queued", "redemption_id": redemption_id}
+
+@router.get("/email/dead-letters")
+@query_budget(1)
+async def list_email_dead_letters(current_user: Principal = Depends(require_admin)):
+    """Emails that could not be delivered after all retries"""
+    return {"metrics": email_queue.metrics(), "dead_letters": list(email_queue.dead_letters)}
 
 @router.patch("/redemptions/{redemption_id}/fulfill")
+@query_budget(4)
 async def fulfill_redemption(
     redemption_id: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
     """Mark redemption as fulfilled"""
     result = await db.execute(select(Redemption).where(Redemption.id == uuid.UUID(redemption_id)))
@@ -325,7 +739,9 @@ async def fulfill_redemption(
     if not redemption:
         raise HTTPException(status_code=404, detail="Redemption not found")
     
-    redemption.fulfilled = True
+    if not redemption.fulfilled:
+        redemption.fulfilled = True
+        await counters.increment(db, counters.PENDING_REDEMPTIONS, -1)
     await db.commit()
     
     return {"message": "Redemption marked as fulfilled"}
@@ -333,33 +749,146 @@ async def fulfill_redemption(
 # ============= STATISTICS =============
 
 @router.get("/stats")
+@query_budget(7)
 async def get_admin_stats(
+    reconcile: bool = False,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
-    """Get platform statistics"""
-    # Total users
-    users_result = await db.execute(select(User))
-    total_users = len(users_result.scalars().all())
-    
-    # Total games
-    games_result = await db.execute(select(CustomGame))
-    total_games = len(games_result.scalars().all())
-    
-    # Pending redemptions
-    redemptions_result = await db.execute(
-        select(Redemption).where(Redemption.fulfilled == False)
-    )
-    pending_redemptions = len(redemptions_result.scalars().all())
-    
-    # Total SP in circulation
-    users_result = await db.execute(select(User))
-    users = users_result.scalars().all()
-    total_sp = sum(user.sp_points for user in users)
+    """Get platform statistics from the maintained counters (reconcile=true recomputes them)"""
+    if reconcile:
+        values = await counters.reconcile(db)
+        await db.commit()
+    else:
+        values = await counters.read_all(db)
     
     return {
-        "total_users": total_users,
-        "total_games": total_games,
-        "pending_redemptions": pending_redemptions,
-        "total_sp_in_circulation": total_sp
+        "total_users": values.get(counters.USERS, 0),
+        "total_games": values.get(counters.GAMES, 0),
+        "completed_games": values.get(counters.COMPLETED_GAMES, 0),
+        "pending_redemptions": values.get(counters.PENDING_REDEMPTIONS, 0),
+        "total_sp_in_circulation": values.get(counters.SP_IN_CIRCULATION, 0)
     }
+
+# ============= ROLLUPS =============
+
+@router.get("/rollups/sp-flow")
+@query_budget(2)
+async def get_sp_flow_rollups(
+    start: datetime,
+    end: datetime,
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    metric: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_admin)
+):
+    """SP deposited, wagered, paid out and redeemed per hour or day in [start, end)"""
+    query = select(SpFlowRollup).where(
+        SpFlowRollup.granularity == granularity,
+        SpFlowRollup.bucket >= start,
+        SpFlowRollup.bucket < end
+    )
+    if metric is not None:
+        query = query.where(SpFlowRollup.metric == metric)
+    result = await db.execute(query.order_by(SpFlowRollup.bucket, SpFlowRollup.metric))
+    return [{
+        "bucket": row.bucket.isoformat(),
+        "metric": row.metric,
+        "amount": row.amount,
+        "entries": row.entries
+    } for row in result.scalars()]
+
+@router.get("/rollups/games")
+@query_budget(2)
+async def get_game_activity_rollups(
+    start: datetime,
+    end: datetime,
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    game_type: Optional[GameType] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_admin)
+):
+    """Games created and completed per hour or day and game type in [start, end)"""
+    query = select(GameActivityRollup).where(
+        GameActivityRollup.granularity == granularity,
+        GameActivityRollup.bucket >= start,
+        GameActivityRollup.bucket < end
+    )
+    if game_type is not None:
+        query = query.where(GameActivityRollup.game_type == game_type)
+    result = await db.execute(query.order_by(GameActivityRollup.bucket, GameActivityRollup.game_type))
+    return [{
+        "bucket": row.bucket.isoformat(),
+        "game_type": row.game_type,
+        "created": row.created,
+        "completed": row.completed
+    } for row in result.scalars()]
+
+# One batch of ledger entries; each further ROLLUP_BATCH_SIZE batch adds five
+@router.post("/rollups/refresh")
+@query_budget(13, repeats=3)
+async def refresh_rollups(current_user: Principal = Depends(require_admin)):
+    """Catch the rollups up now instead of waiting for the next periodic run"""
+    return {"consumed": await rollups.refresh_all()}
+
+@router.post("/matchups/rebuild")
+@query_budget(8)
+async def rebuild_matchups(current_user: Principal = Depends(require_admin)):
+    """Rebuild the champion matchup matrix from every verified match"""
+    return {"matches": await matchups.rebuild()}
+
+# One batch of stale games; each further REAPER_BATCH_SIZE batch adds eight
+@router.post("/games/expire")
+@query_budget(9, repeats=5)
+async def expire_stale_games(current_user: Principal = Depends(require_admin)):
+    """Expire stale games and refund their wagers now instead of waiting for the scheduler"""
+    return await reaper.reap()
+
+@router.get("/scheduler")
+@query_budget(1)
+async def get_scheduler_status(current_user: Principal = Depends(require_admin)):
+    """Whether this worker leads the scheduler, and each job's last run"""
+    return scheduler.metrics()
+
+# ============= EXPORTS =============
+
+@router.get("/export/{table}")
+@query_budget(3)
+async def export_table(
+    table: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|columnar|parquet)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: Principal = Depends(require_admin)
+):
+    """Stream a whole table (or the rows since a watermark) through a server-side cursor"""
+    if table not in export.EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table, expected one of {', '.join(export.EXPORT_TABLES)}")
+    if format == "parquet" and export.pyarrow is None:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+    
+    # Fixed upper bound, held back by the settle lag and returned so the next incremental export can start from it
+    until = export.settled_until(until)
+    query, columns = export.table_export(table, since, until)
+    
+    extension = "ndjson" if format == "columnar" else format
+    return StreamingResponse(
+        export.encode_export(export.stream_rows(query), columns, format),
+        media_type=export.EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{table}.{extension}"',
+            "X-Export-Watermark": until.isoformat()
+        }
+    )
+
+@router.get("/riot/metrics")
+@query_budget(1)
+async def get_riot_metrics(current_user: Principal = Depends(require_admin)):
+    """Riot API client cache hit rate and rate-limit wait times"""
+    return riot_client.metrics()
+
+@router.get("/cache/metrics")
+@query_budget(1)
+async def get_cache_metrics(current_user: Principal = Depends(require_admin)):
+    """Hit rate and invalidations per shared cache namespace, for this worker"""
+    return cache.cache.metrics()
@@ -4,7 +4,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from database import get_db
 from models import User
-from auth import get_current_user, get_password_hash, verify_password
+from auth import Principal, get_current_user, get_password_hash, verify_password
+from services import ledger, counters
+from services.query_budget import query_budget
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from passlib.context import CryptContext
@@ -44,6 +46,7 @@ class LoginRequest(BaseModel):
     password: str
 
 @router.post("/google-login")
+@query_budget(7)
 async def google_login(request: GoogleLoginRequest, db: AsyncSession = Depends(get_db)):
     try:
         # Verify the token with Google
@@ -61,6 +64,8 @@ async def google_login(request: GoogleLoginRequest, db: AsyncSession = Depends(g
             # Create new user
             user = User(google_id=google_id, email=email, display_name=name)
             db.add(user)
+            await ledger.open_account(db, user)
+            await counters.increment(db, counters.USERS)
             await db.commit()
             await db.refresh(user)
         
@@ -73,6 +78,7 @@ async def google_login(request: GoogleLoginRequest, db: AsyncSession = Depends(g
         raise HTTPException(status_code=400, detail=f"Invalid token: {str(e)}")
 
 @router.post("/register")
+@query_budget(7)
 async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db)):
     # Check if user already exists
     result = await db.execute(select(User).where(User.email == request.email))
@@ -89,6 +95,8 @@ async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db))
         hashed_password=hashed_password
     )
     db.add(user)
+    await ledger.open_account(db, user)
+    await counters.increment(db, counters.USERS)
     await db.commit()
     await db.refresh(user)
     
@@ -108,6 +116,7 @@ async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db))
     }
 
 @router.post("/login")
+@query_budget(1)
 async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     # Find user by email
     result = await db.execute(select(User).where(User.email == request.email))
@@ -136,5 +145,7 @@ async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     }
 
 @router.get("/me")
-async def read_users_me(current_user: User = Depends(get_current_user)):
-    return current_user
+@query_budget(2)
+async def read_users_me(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # The cached principal has no balance or profile fields, so read the full row
+    return await db.get(User, current_user.id)
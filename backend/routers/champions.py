@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from services import matchups
+from services.query_budget import query_budget
+
+router = APIRouter(
+    prefix="/champions",
+    tags=["champions"]
+)
+
+@router.get("/matchups")
+@query_budget(1)
+async def get_matchup_matrix(db: AsyncSession = Depends(get_db)):
+    """Win counts of every champion against every other: wins[i][j] is champions[i] beating champions[j]"""
+    row, matrix = await matchups.read(db)
+    return {
+        "champions": matrix.champions,
+        "wins": matrix.grid(),
+        "matches": row.matches if row else 0,
+        "updated_at": row.updated_at if row else None,
+    }
+
+@router.get("/{champion}/matchups")
+@query_budget(1)
+async def get_champion_matchups(champion: str, db: AsyncSession = Depends(get_db)):
+    """One champion's wins, losses and win rate against each opponent it has faced"""
+    row, matrix = await matchups.read(db)
+    if champion not in matrix.index:
+        raise HTTPException(status_code=404, detail="No verified matches for this champion")
+    opponents = matrix.row(champion)
+    wins = sum(o["wins"] for o in opponents)
+    losses = sum(o["losses"] for o in opponents)
+    return {
+        "champion": champion,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": wins / (wins + losses) if wins + losses else None,
+        "opponents": opponents,
+        "updated_at": row.updated_at,
+    }
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from database import get_db
-from models import User, CustomGame, GamePlayer, GameType, GameStatus, Transaction, TransactionType
+from models import User, CustomGame, GamePlayer, GameType, GameStatus, TransactionType
 from schemas import CustomGame as CustomGameSchema, CustomGameCreate
-from auth import get_current_user
+from auth import Principal, get_current_user
+from services import ledger, counters, versions, cache, leaderboard, player_stats
+from services.idempotency import idempotency_slot, save_response
+from services.query_budget import query_budget
+import serializers
+from serializers import ORJSONResponse
 from typing import List
+from datetime import datetime
 import uuid
 
 router = APIRouter(
@@ -15,7 +21,8 @@ router = APIRouter(
 )
 
 @router.post("/create", response_model=CustomGameSchema)
-async def create_game(game_data: CustomGameCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+@query_budget(8)
+async def create_game(game_data: CustomGameCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Only moderators and admins can create games
     if current_user.role not in ['admin', 'moderator']:
         raise HTTPException(status_code=403, detail="Only moderators and admins can create games")
@@ -29,6 +36,8 @@ async def create_game(game_data: CustomGameCreate, current_user: User = Depends(
         status=GameStatus.OPEN
     )
     db.add(game)
+    await counters.increment(db, counters.GAMES)
+    await versions.bump(db, versions.GAMES)
     await db.commit()
     await db.refresh(game)
     
@@ -41,21 +50,34 @@ async def create_game(game_data: CustomGameCreate, current_user: User = Depends(
     return result.scalars().first()
 
 @router.get("/", response_model=List[CustomGameSchema])
-async def list_games(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(CustomGame)
-        .options(selectinload(CustomGame.players).selectinload(GamePlayer.user))
-        .where(CustomGame.status == GameStatus.OPEN)
-    )
-    return result.scalars().all()
+@query_budget(4)
+async def list_games(request: Request, db: AsyncSession = Depends(get_db)):
+    # Lobby pollers revalidate with If-None-Match; players' public profiles are part of the body
+    etag = await versions.etag(db, versions.GAMES, versions.USERS)
+    if versions.is_fresh(request, etag):
+        return versions.not_modified(etag)
+    
+    async def load():
+        result = await db.execute(
+            select(CustomGame)
+            .options(selectinload(CustomGame.players).selectinload(GamePlayer.user))
+            .where(CustomGame.status == GameStatus.OPEN)
+        )
+        # Serialized directly, skipping per-object response_model validation
+        return serializers.custom_games(result.scalars())
+    
+    # Keyed by version, so a write anywhere moves every worker to a fresh entry
+    return versions.tag(ORJSONResponse(await cache.lobby.get_or_load(etag, load)), etag)
 
 @router.post("/{game_id}/join", response_model=CustomGameSchema)
-async def join_game(game_id: uuid.UUID, team: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    # Get game
+@query_budget(20)
+async def join_game(game_id: uuid.UUID, team: int, idempotency=Depends(idempotency_slot), current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Get game, locked so concurrent joins are applied one at a time
     result = await db.execute(
         select(CustomGame)
         .options(selectinload(CustomGame.players))
         .where(CustomGame.id == game_id)
+        .with_for_update()
     )
     game = result.scalars().first()
     
@@ -77,8 +99,10 @@ async def join_game(game_id: uuid.UUID, team: int, current_user: User = Depends(
     if len(team_players) >= max_per_team:
         raise HTTPException(status_code=400, detail="Team is full")
         
-    # Check funds
-    if current_user.sp_points < game.wager_amount:
+    # Deduct wager, only if the balance covers it
+    try:
+        await ledger.debit(db, current_user.id, game.wager_amount, TransactionType.WAGER_LOSS, f"Wager for game {game.id}")
+    except ledger.InsufficientFunds:
         raise HTTPException(status_code=400, detail="Insufficient SP points")
         
     # Add player
@@ -89,35 +113,33 @@ async def join_game(game_id: uuid.UUID, team: int, current_user: User = Depends(
     )
     db.add(player)
     
-    # Deduct wager
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=-game.wager_amount,
-        type=TransactionType.WAGER_LOSS,
-        description=f"Wager for game {game.id}"
-    )
-    current_user.sp_points -= game.wager_amount
-    db.add(transaction)
-    
     # Check if game is full to start
     total_players = len(game.players) + 1
     required_players = 2 if game.type == GameType.ONE_VS_ONE else 10
     
     if total_players == required_players:
         game.status = GameStatus.IN_PROGRESS
-        
-    await db.commit()
+        game.started_at = datetime.utcnow()
     
-    # Reload game
+    await versions.bump(db, versions.GAMES)
+    await db.flush()
+    
+    # Reload game with its new player, before committing so the stored response commits with the wager
     result = await db.execute(
         select(CustomGame)
         .options(selectinload(CustomGame.players).selectinload(GamePlayer.user))
         .where(CustomGame.id == game.id)
+        .execution_options(populate_existing=True)
     )
-    return result.scalars().first()
+    game = result.scalars().first()
+    await save_response(db, idempotency, CustomGameSchema, game)
+    await db.commit()
+    return game
 
+# Winners are credited with one set-based ledger post (up to 5 statements with snapshots), 1v1 or 5v5
 @router.post("/{game_id}/verify", response_model=CustomGameSchema)
-async def verify_game(game_id: uuid.UUID, winner_team: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+@query_budget(19)
+async def verify_game(game_id: uuid.UUID, winner_team: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Only moderators and admins can verify games
     if current_user.role not in ['admin', 'moderator']:
         raise HTTPException(status_code=403, detail="Only moderators and admins can verify games")
@@ -126,6 +148,7 @@ async def verify_game(game_id: uuid.UUID, winner_team: int, current_user: User =
         select(CustomGame)
         .options(selectinload(CustomGame.players))
         .where(CustomGame.id == game_id)
+        .with_for_update()
     )
     game = result.scalars().first()
     
@@ -134,9 +157,13 @@ async def verify_game(game_id: uuid.UUID, winner_team: int, current_user: User =
         
     if game.status == GameStatus.COMPLETED:
         raise HTTPException(status_code=400, detail="Game already completed")
+    
+    if game.status == GameStatus.EXPIRED:
+        raise HTTPException(status_code=400, detail="Game expired and wagers were refunded")
         
     game.status = GameStatus.COMPLETED
     game.winner_team = winner_team
+    game.completed_at = datetime.utcnow()
     
     # Distribute winnings
     # Total pot = wager * total players
@@ -145,23 +172,18 @@ async def verify_game(game_id: uuid.UUID, winner_team: int, current_user: User =
     
     winning_players = [p for p in game.players if p.team == winner_team]
     
-    for player in winning_players:
-        # Get user to update balance
-        user_result = await db.execute(select(User).where(User.id == player.user_id))
-        user = user_result.scalars().first()
-        
-        winnings = game.wager_amount * 2
-        
-        transaction = Transaction(
-            user_id=user.id,
-            amount=winnings,
-            type=TransactionType.WAGER_WIN,
-            description=f"Won game {game.id}"
-        )
-        user.sp_points += winnings
-        db.add(transaction)
-        db.add(user)
-        
+    await ledger.bulk_credit(db, [
+        (player.user_id, game.wager_amount * 2, f"Won game {game.id}") for player in winning_players
+    ], TransactionType.WAGER_WIN)
+    
+    await leaderboard.record_results(db, [(p.user_id, p.team == winner_team) for p in game.players], game.completed_at)
+    # Winners net their opponent's wager, losers lose their own
+    await player_stats.record_game(db, game.type, [
+        (p.user_id, p.team == winner_team, game.wager_amount if p.team == winner_team else -game.wager_amount)
+        for p in game.players
+    ])
+    await counters.increment(db, counters.COMPLETED_GAMES)
+    await versions.bump(db, versions.GAMES)
     await db.commit()
     
     # Reload game
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Optional
+from datetime import datetime
+
+from database import get_db
+from models import User
+from auth import Principal, get_current_user
+from services import leaderboard
+from services.leaderboard import leaderboards, ALL_TIME, UnknownSeason
+from services.query_budget import query_budget
+
+router = APIRouter(
+    prefix="/leaderboard",
+    tags=["leaderboard"]
+)
+
+BOARD_PATTERN = "^(sp|wins|win_rate)$"
+SEASON_PATTERN = r"^(all|\d{4}-\d{2})$"
+
+
+def _season(board: str, season: Optional[str]) -> str:
+    """SP is a balance, so it only has an all-time board; the others default to this month."""
+    if board == "sp":
+        if season not in (None, ALL_TIME):
+            raise HTTPException(status_code=400, detail="The SP leaderboard has no seasons")
+        return ALL_TIME
+    return season or leaderboard.season_of(datetime.utcnow())
+
+
+async def _standings(db: AsyncSession, season: str):
+    try:
+        return await leaderboards.season(db, season)
+    except UnknownSeason:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Only all time and the last {leaderboard.LEADERBOARD_SEASONS} monthly seasons are available",
+        )
+
+
+@router.get("/{board}")
+@query_budget(2)
+async def get_leaderboard(
+    board: str = Path(..., pattern=BOARD_PATTERN),
+    season: Optional[str] = Query(None, pattern=SEASON_PATTERN),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Top players by SP balance, wins or win rate"""
+    season = _season(board, season)
+    standings = await _standings(db, season)
+    page = standings.boards[board].page(offset, limit)
+
+    names = {}
+    if page:
+        result = await db.execute(select(User.id, User.display_name).where(User.id.in_([user_id for _, user_id, _ in page])))
+        names = dict(result.all())
+
+    entries = []
+    for rank, user_id, score in page:
+        sp_points, wins, games = standings.stats[user_id]
+        entries.append({
+            "rank": rank,
+            "user_id": str(user_id),
+            "display_name": names.get(user_id),
+            "score": score,
+            "wins": wins,
+            "games": games,
+        })
+    return {"board": board, "season": season, "total": len(standings.boards[board]), "entries": entries}
+
+
+@router.get("/{board}/me")
+@query_budget(2)
+async def get_my_rank(
+    board: str = Path(..., pattern=BOARD_PATTERN),
+    season: Optional[str] = Query(None, pattern=SEASON_PATTERN),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """The current user's rank and score, or a null rank if they aren't on this board"""
+    season = _season(board, season)
+    standings = await _standings(db, season)
+    ranked = standings.boards[board].rank(current_user.id)
+    rank, score = ranked if ranked is not None else (None, None)
+    return {"board": board, "season": season, "total": len(standings.boards[board]), "rank": rank, "score": score}
@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import update
 from sqlalchemy.orm import selectinload
 import uuid
+import httpx
+from datetime import datetime
 
 from database import get_db
 from models import Match, Registration, User
 from schemas import MatchSubmit, Match as MatchSchema
-from auth import get_current_user
-from services.riot_api import verify_match, get_match_winner
+from auth import Principal, get_current_user
+from services.riot_api import verify_match, get_match_winner, RiotAPIError, RiotUnavailable
 from services.email_service import send_email
+from services import versions, player_stats
+from services.query_budget import query_budget
 
 router = APIRouter(
     prefix="/matches",
@@ -17,7 +22,8 @@ router = APIRouter(
 )
 
 @router.post("/{match_id}/submit", response_model=MatchSchema)
-async def submit_match_result(match_id: uuid.UUID, submit_data: MatchSubmit, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+@query_budget(13)
+async def submit_match_result(match_id: uuid.UUID, submit_data: MatchSubmit, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     result = await db.execute(
         select(Match)
         .where(Match.id == match_id)
@@ -50,22 +56,53 @@ async def submit_match_result(match_id: uuid.UUID, submit_data: MatchSubmit, db:
     # logic: verify_match(riot_match_id, champion_name)
     # In a real scenario, we'd check both players.
     
-    is_valid = await verify_match(submit_data.riot_match_id, user_reg.champion)
+    # The Riot calls can wait on rate limits and retries for seconds: end the read
+    # transaction first (committing keeps the loaded rows) so no connection or lock is held meanwhile
+    await db.commit()
+    
+    try:
+        is_valid = await verify_match(submit_data.riot_match_id, user_reg.champion)
+    except RiotUnavailable:
+        raise HTTPException(status_code=503, detail="Riot API is rate limiting requests, try again shortly")
     
     if not is_valid:
         raise HTTPException(status_code=400, detail="Match verification failed. Ensure you played the correct champion and the match ID is valid.")
         
-    # Determine winner
-    # Mock logic: get_match_winner returns 'player1' or 'player2'
-    winner_role = await get_match_winner(submit_data.riot_match_id, user_reg.champion, opponent_reg.champion if opponent_reg else "")
+    # Determine winner: 'player1' / 'player2' are the match's own slots, not submitter and opponent
+    try:
+        winner_role = await get_match_winner(
+            submit_data.riot_match_id,
+            match.player1.champion if match.player1 else "",
+            match.player2.champion if match.player2 else "",
+        )
+    except RiotUnavailable:
+        raise HTTPException(status_code=503, detail="Riot API is rate limiting requests, try again shortly")
+    except (RiotAPIError, httpx.HTTPError):
+        raise HTTPException(status_code=502, detail="Could not fetch the match from the Riot API")
     
-    winner_reg = match.player1 if winner_role == 'player1' else match.player2
+    winner_reg = {"player1": match.player1, "player2": match.player2}.get(winner_role)
+    if winner_reg is None:
+        raise HTTPException(status_code=400, detail="Could not determine the winner: neither registered champion won this match")
     
-    match.riot_match_id = submit_data.riot_match_id
-    match.winner_registration_id = winner_reg.id
-    match.verified = True
+    # Conditional on NOT verified, so only one of several concurrent submissions counts the result
+    counted = await db.execute(
+        update(Match)
+        .where(Match.id == match.id, Match.verified.isnot(True))
+        .values(
+            riot_match_id=submit_data.riot_match_id,
+            winner_registration_id=winner_reg.id,
+            verified=True,
+            verified_at=datetime.utcnow(),
+        )
+        .returning(Match.id)
+        .execution_options(synchronize_session=False)
+    )
+    if counted.first() is None:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Match already verified")
     
-    db.add(match)
+    await player_stats.record_match(db, match.round, winner_reg, opponent_reg if winner_reg is user_reg else user_reg)
+    await versions.bump(db, versions.tournament(match.tournament_id))
     await db.commit()
     await db.refresh(match)
     
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import tuple_
 from database import get_db
 from models import User, Transaction, TransactionType, StoreItem, Redemption
-from schemas import Transaction as TransactionSchema, StoreItem as StoreItemSchema
-from auth import get_current_user
-from typing import List
+from serializers import ORJSONResponse
+from schemas import Transaction as TransactionSchema, TransactionPage, StoreItem as StoreItemSchema
+from auth import Principal, get_current_user
+from services import ledger, counters, versions, cache
+from services.idempotency import idempotency_slot, save_response
+from services.pagination import encode_cursor, decode_cursor
+from services.query_budget import query_budget
+from services.export import stream_rows, encode_rows, EXPORT_MEDIA_TYPES
+from typing import List, Optional
+from datetime import datetime
 import uuid
 
 router = APIRouter(
@@ -14,38 +23,122 @@ router = APIRouter(
 )
 
 @router.post("/buy-sp", response_model=TransactionSchema)
-async def buy_sp(amount: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+@query_budget(12)
+async def buy_sp(amount: int, idempotency=Depends(idempotency_slot), current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
     
     # Mock payment processing
     # In a real app, we would integrate Stripe/PayPal here
     
-    # Create transaction
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=amount,
-        type=TransactionType.DEPOSIT,
-        description=f"Purchased {amount} SP"
-    )
-    
-    # Update user balance
-    current_user.sp_points += amount
+    # Record deposit and update user balance
+    transaction = await ledger.credit(db, current_user.id, amount, TransactionType.DEPOSIT, f"Purchased {amount} SP")
     
-    db.add(transaction)
-    db.add(current_user)
+    # Stored in the same transaction as the credit, so a retry can't buy twice
+    await save_response(db, idempotency, TransactionSchema, transaction)
     await db.commit()
-    await db.refresh(transaction)
     
     return transaction
 
+@router.get("/balance")
+@query_budget(3)
+async def get_balance(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return {"balance": await ledger.get_balance(db, current_user.id)}
+
+def _statement_owner(user_id: Optional[uuid.UUID], current_user: Principal) -> uuid.UUID:
+    """Users read their own history; admins and moderators may read anyone's"""
+    if user_id is None or user_id == current_user.id:
+        return current_user.id
+    if current_user.role not in ['admin', 'moderator']:
+        raise HTTPException(status_code=403, detail="Not allowed to view other users' transactions")
+    return user_id
+
+def _filter_transactions(query, owner_id: uuid.UUID, type: Optional[TransactionType], since: Optional[datetime], until: Optional[datetime]):
+    query = query.where(Transaction.user_id == owner_id)
+    if type is not None:
+        query = query.where(Transaction.type == type)
+    if since is not None:
+        query = query.where(Transaction.created_at >= since)
+    if until is not None:
+        query = query.where(Transaction.created_at < until)
+    return query
+
+@router.get("/transactions", response_model=TransactionPage)
+@query_budget(2)
+async def list_transactions(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    type: Optional[TransactionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[uuid.UUID] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Transaction history, newest first, keyset-paginated on (created_at, id)"""
+    owner_id = _statement_owner(user_id, current_user)
+    query = _filter_transactions(select(Transaction), owner_id, type, since, until)
+    
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        try:
+            key = (datetime.fromisoformat(created_at), uuid.UUID(last_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(Transaction.created_at, Transaction.id) < tuple_(*key))
+    
+    result = await db.execute(
+        query.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit + 1)
+    )
+    transactions = result.scalars().all()
+    
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = encode_cursor(transactions[-1].created_at.isoformat(), transactions[-1].id)
+    
+    return {"items": transactions, "next_cursor": next_cursor}
+
+@router.get("/transactions/export")
+@query_budget(3)
+async def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    type: Optional[TransactionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[uuid.UUID] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    """Stream a full statement as CSV or NDJSON, oldest first, in constant memory"""
+    owner_id = _statement_owner(user_id, current_user)
+    columns = ["id", "created_at", "type", "amount", "description"]
+    query = _filter_transactions(
+        select(Transaction.id, Transaction.created_at, Transaction.type, Transaction.amount, Transaction.description),
+        owner_id, type, since, until
+    ).order_by(Transaction.created_at, Transaction.id)
+    
+    return StreamingResponse(
+        encode_rows(stream_rows(query), columns, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="statement-{owner_id}.{format}"'}
+    )
+
 @router.get("/items", response_model=List[StoreItemSchema])
-async def get_store_items(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(StoreItem))
-    return result.scalars().all()
+@query_budget(2)
+async def get_store_items(request: Request, db: AsyncSession = Depends(get_db)):
+    etag = await versions.etag(db, versions.STORE_ITEMS)
+    if versions.is_fresh(request, etag):
+        return versions.not_modified(etag)
+    
+    async def load():
+        result = await db.execute(select(StoreItem))
+        return [StoreItemSchema.model_validate(item).model_dump() for item in result.scalars()]
+    
+    return versions.tag(ORJSONResponse(await cache.store_items.get_or_load(etag, load)), etag)
 
 @router.post("/redeem/{item_id}", response_model=TransactionSchema)
-async def redeem_item(item_id: uuid.UUID, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+@query_budget(15)
+async def redeem_item(item_id: uuid.UUID, idempotency=Depends(idempotency_slot), current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Get item
     result = await db.execute(select(StoreItem).where(StoreItem.id == item_id))
     item = result.scalars().first()
@@ -53,17 +146,12 @@ async def redeem_item(item_id: uuid.UUID, current_user: User = Depends(get_curre
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    if current_user.sp_points < item.sp_cost:
+    # Debit only if the balance covers the cost
+    try:
+        transaction = await ledger.debit(db, current_user.id, item.sp_cost, TransactionType.PURCHASE, f"Redeemed {item.name}")
+    except ledger.InsufficientFunds:
         raise HTTPException(status_code=400, detail="Insufficient SP points")
     
-    # Create transaction
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=-item.sp_cost,
-        type=TransactionType.PURCHASE,
-        description=f"Redeemed {item.name}"
-    )
-    
     # Create redemption record for admin tracking
     redemption = Redemption(
         user_id=current_user.id,
@@ -72,19 +160,16 @@ async def redeem_item(item_id: uuid.UUID, current_user: User = Depends(get_curre
         fulfilled=False
     )
     
-    # Update user balance
-    current_user.sp_points -= item.sp_cost
-    
-    db.add(transaction)
     db.add(redemption)
-    db.add(current_user)
+    await counters.increment(db, counters.PENDING_REDEMPTIONS)
+    await save_response(db, idempotency, TransactionSchema, transaction)
     await db.commit()
-    await db.refresh(transaction)
     
     return transaction
 
 # Initialize store items (helper endpoint for MVP)
 @router.post("/init-items")
+@query_budget(6)
 async def init_store_items(db: AsyncSession = Depends(get_db)):
     # Check if items exist
     result = await db.execute(select(StoreItem))
@@ -98,5 +183,6 @@ async def init_store_items(db: AsyncSession = Depends(get_db)):
     ]
     
     db.add_all(items)
+    await versions.bump(db, versions.STORE_ITEMS)
     await db.commit()
     return {"message": "Store items initialized"}
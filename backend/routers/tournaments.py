@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -8,8 +8,12 @@ import uuid
 from database import get_db
 from models import Tournament, User, Registration, Match
 from schemas import TournamentCreate, Tournament as TournamentSchema, RegistrationCreate, Registration as RegistrationSchema, Match as MatchSchema
-from auth import get_current_user
+from auth import Principal, get_current_user
 from services.bracket_generator import generate_bracket
+from services import versions, cache, player_stats
+from services.query_budget import query_budget
+import serializers
+from serializers import ORJSONResponse
 
 router = APIRouter(
     prefix="/tournaments",
@@ -17,44 +21,56 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=TournamentSchema)
-async def create_tournament(tournament: TournamentCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+@query_budget(4)
+async def create_tournament(tournament: TournamentCreate, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     # In a real app, check if user is admin. For MVP, anyone can create.
     new_tournament = Tournament(**tournament.dict(), created_by=current_user.id)
     db.add(new_tournament)
+    await versions.bump(db, versions.TOURNAMENTS)
     await db.commit()
     await db.refresh(new_tournament)
     return new_tournament
 
 @router.get("/")
-async def list_tournaments(db: AsyncSession = Depends(get_db)):
+@query_budget(2)
+async def list_tournaments(request: Request, db: AsyncSession = Depends(get_db)):
     from sqlalchemy import func
     
-    result = await db.execute(select(Tournament))
-    tournaments = result.scalars().all()
+    etag = await versions.etag(db, versions.TOURNAMENTS)
+    if versions.is_fresh(request, etag):
+        return versions.not_modified(etag)
     
-    tournaments_with_count = []
-    for tournament in tournaments:
-        # Count registrations
-        count_result = await db.execute(
-            select(func.count(Registration.id)).where(Registration.tournament_id == tournament.id)
+    async def load():
+        # Registration counts come from one grouped subquery rather than a query per tournament
+        counts = (
+            select(Registration.tournament_id, func.count(Registration.id).label("registration_count"))
+            .group_by(Registration.tournament_id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(Tournament, func.coalesce(counts.c.registration_count, 0))
+            .outerjoin(counts, counts.c.tournament_id == Tournament.id)
         )
-        registration_count = count_result.scalar()
         
-        tournaments_with_count.append({
-            "id": str(tournament.id),
-            "name": tournament.name,
-            "role": tournament.role,
-            "max_players": tournament.max_players,
-            "registration_open": tournament.registration_open,
-            "created_by": str(tournament.created_by),
-            "created_at": tournament.created_at.isoformat(),
-            "registration_count": registration_count,
-            "spots_available": tournament.max_players - registration_count
-        })
+        tournaments_with_count = []
+        for tournament, registration_count in result.all():
+            tournaments_with_count.append({
+                "id": str(tournament.id),
+                "name": tournament.name,
+                "role": tournament.role,
+                "max_players": tournament.max_players,
+                "registration_open": tournament.registration_open,
+                "created_by": str(tournament.created_by),
+                "created_at": tournament.created_at.isoformat(),
+                "registration_count": registration_count,
+                "spots_available": tournament.max_players - registration_count
+            })
+        return tournaments_with_count
     
-    return tournaments_with_count
+    return versions.tag(ORJSONResponse(await cache.tournaments.get_or_load(etag, load)), etag)
 
 @router.get("/{tournament_id}", response_model=TournamentSchema)
+@query_budget(1)
 async def get_tournament(tournament_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Tournament).where(Tournament.id == tournament_id))
     tournament = result.scalars().first()
@@ -63,7 +79,8 @@ async def get_tournament(tournament_id: uuid.UUID, db: AsyncSession = Depends(ge
     return tournament
 
 @router.post("/{tournament_id}/register", response_model=RegistrationSchema)
-async def register_player(tournament_id: uuid.UUID, registration: RegistrationCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+@query_budget(9)
+async def register_player(tournament_id: uuid.UUID, registration: RegistrationCreate, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     # Check if tournament exists
     result = await db.execute(select(Tournament).where(Tournament.id == tournament_id))
     tournament = result.scalars().first()
@@ -79,18 +96,21 @@ async def register_player(tournament_id: uuid.UUID, registration: RegistrationCr
     if existing_reg:
         raise HTTPException(status_code=400, detail="Already registered")
 
+    # The caller is a Principal; the response includes their public profile, so load the User once here
     new_reg = Registration(
         tournament_id=tournament_id,
-        user_id=current_user.id,
+        user=await db.get(User, current_user.id),
         champion=registration.champion
     )
     db.add(new_reg)
+    await player_stats.record_registration(db, current_user.id, registration.champion)
+    await versions.bump(db, versions.TOURNAMENTS)
     await db.commit()
-    await db.refresh(new_reg)
     return new_reg
 
 @router.post("/{tournament_id}/generate-bracket")
-async def generate_bracket_route(tournament_id: uuid.UUID, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+@query_budget(9)
+async def generate_bracket_route(tournament_id: uuid.UUID, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     # Fetch registrations
     result = await db.execute(select(Registration).where(Registration.tournament_id == tournament_id).options(selectinload(Registration.user)))
     registrations = result.scalars().all()
@@ -143,19 +163,32 @@ async def generate_bracket_route(tournament_id: uuid.UUID, db: AsyncSession = De
     tournament = result.scalars().first()
     tournament.registration_open = False
     
+    await versions.bump(db, versions.TOURNAMENTS, versions.tournament(tournament_id))
     await db.commit()
     
     return {"message": "Bracket generated", "matches": len(created_matches)}
 
+# player1, player2 and winner each selectinload registrations then users: three of each shape, whatever the bracket size
 @router.get("/{tournament_id}/matches", response_model=List[MatchSchema])
-async def get_tournament_matches(tournament_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Match)
-        .where(Match.tournament_id == tournament_id)
-        .options(
-            selectinload(Match.player1).selectinload(Registration.user),
-            selectinload(Match.player2).selectinload(Registration.user),
-            selectinload(Match.winner).selectinload(Registration.user)
+@query_budget(8, repeats=3)
+async def get_tournament_matches(tournament_id: uuid.UUID, request: Request, db: AsyncSession = Depends(get_db)):
+    etag = await versions.etag(db, versions.tournament(tournament_id), versions.USERS)
+    if versions.is_fresh(request, etag):
+        return versions.not_modified(etag)
+    
+    async def load():
+        result = await db.execute(
+            select(Match)
+            .where(Match.tournament_id == tournament_id)
+            .options(
+                selectinload(Match.player1).selectinload(Registration.user),
+                selectinload(Match.player2).selectinload(Registration.user),
+                selectinload(Match.winner).selectinload(Registration.user)
+            )
         )
-    )
-    return result.scalars().all()
+        # Serialized directly, skipping per-object response_model validation
+        return serializers.matches(result.scalars())
+    
+    # The tag only carries version numbers, so the key also names the tournament
+    matches = await cache.brackets.get_or_load(f"{tournament_id}:{etag}", load)
+    return versions.tag(ORJSONResponse(matches), etag)
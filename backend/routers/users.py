@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+import uuid
+
+from database import get_db
+from models import User, PlayerStats
+from services import player_stats
+from services.query_budget import query_budget
+
+router = APIRouter(
+    prefix="/users",
+    tags=["users"]
+)
+
+@router.get("/{user_id}/stats")
+@query_budget(2)
+async def get_player_stats(user_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    """A player's record: games by type, tournament results, net SP won and favourite champions"""
+    stats = await db.get(PlayerStats, user_id)
+    # Players get a row with their first settled game or registration
+    if stats is None and await db.get(User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return player_stats.profile(user_id, stats)
@@ -22,6 +22,18 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class PublicUser(BaseModel):
+    """Another player as shown in lobbies and brackets: no email or balance"""
+    id: UUID
+    display_name: str
+    role: str
+    is_verified: bool
+    riot_summoner_name: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class TournamentBase(BaseModel):
     name: str
     role: RoleEnum
@@ -50,7 +62,7 @@ class Registration(RegistrationBase):
     tournament_id: UUID
     user_id: UUID
     created_at: datetime
-    user: Optional[User] = None
+    user: Optional[PublicUser] = None
 
     class Config:
         from_attributes = True
@@ -96,6 +108,10 @@ class Transaction(TransactionBase):
     class Config:
         from_attributes = True
 
+class TransactionPage(BaseModel):
+    items: List[Transaction]
+    next_cursor: Optional[str] = None
+
 class StoreItemBase(BaseModel):
     name: str
     sp_cost: int
@@ -122,7 +138,7 @@ class GamePlayer(GamePlayerBase):
     game_id: UUID
     user_id: UUID
     joined_at: datetime
-    user: Optional[User] = None
+    user: Optional[PublicUser] = None
 
     class Config:
         from_attributes = True
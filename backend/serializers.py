@@ -0,0 +1,129 @@
+"""
+Plain-dict serializers for the large list responses.
+
+They produce the same JSON as the matching schemas in schemas.py, but read
+loaded ORM objects directly instead of validating every nested model, and
+leave UUIDs, datetimes and enums for orjson to encode natively. Use them
+only with rows whose relationships are already eagerly loaded, and return
+them in an ORJSONResponse from this module.
+"""
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+import orjson
+from fastapi import responses
+
+from models import User, GamePlayer, CustomGame, Registration, Match
+
+
+def _default(value: Any) -> str:
+    # asyncpg returns its own uuid.UUID subclass, which orjson only encodes through default
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(responses.ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def public_user(user: Optional[User]) -> Optional[Dict[str, Any]]:
+    """schemas.PublicUser: other players never see an email or balance."""
+    if user is None:
+        return None
+    return {
+        "id": user.id,
+        "display_name": user.display_name,
+        "role": user.role,
+        "is_verified": user.is_verified,
+        "riot_summoner_name": user.riot_summoner_name,
+        "created_at": user.created_at,
+    }
+
+
+def game_player(player: GamePlayer) -> Dict[str, Any]:
+    return {
+        "team": player.team,
+        "id": player.id,
+        "game_id": player.game_id,
+        "user_id": player.user_id,
+        "joined_at": player.joined_at,
+        "user": public_user(player.user),
+    }
+
+
+def custom_game(game: CustomGame) -> Dict[str, Any]:
+    return {
+        "type": game.type,
+        "wager_amount": game.wager_amount,
+        "id": game.id,
+        "status": game.status,
+        "creator_id": game.creator_id,
+        "winner_team": game.winner_team,
+        "created_at": game.created_at,
+        "players": [game_player(player) for player in game.players],
+    }
+
+
+def custom_games(games: Iterable[CustomGame]) -> List[Dict[str, Any]]:
+    return [custom_game(game) for game in games]
+
+
+def registration(registration: Optional[Registration]) -> Optional[Dict[str, Any]]:
+    if registration is None:
+        return None
+    return {
+        "champion": registration.champion,
+        "id": registration.id,
+        "tournament_id": registration.tournament_id,
+        "user_id": registration.user_id,
+        "created_at": registration.created_at,
+        "user": public_user(registration.user),
+    }
+
+
+def match(match: Match) -> Dict[str, Any]:
+    return {
+        "round": match.round,
+        "player1_registration_id": match.player1_registration_id,
+        "player2_registration_id": match.player2_registration_id,
+        "id": match.id,
+        "tournament_id": match.tournament_id,
+        "winner_registration_id": match.winner_registration_id,
+        "riot_match_id": match.riot_match_id,
+        "verified": match.verified,
+        "created_at": match.created_at,
+        "player1": registration(match.player1),
+        "player2": registration(match.player2),
+        "winner": registration(match.winner),
+    }
+
+
+def matches(matches: Iterable[Match]) -> List[Dict[str, Any]]:
+    return [match(m) for m in matches]
+
+
+def admin_game(game: CustomGame) -> Dict[str, Any]:
+    """Admin panel game row: players with just the user's id, name and email."""
+    return {
+        "id": game.id,
+        "type": game.type,
+        "wager_amount": game.wager_amount,
+        "status": game.status,
+        "winner_team": game.winner_team,
+        "created_at": game.created_at,
+        "players": [{
+            "user_id": p.user_id,
+            "team": p.team,
+            "user": {
+                "id": p.user.id,
+                "display_name": p.user.display_name,
+                "email": p.user.email
+            } if p.user else None
+        } for p in game.players]
+    }
+
+
+def admin_games(games: Iterable[CustomGame]) -> List[Dict[str, Any]]:
+    return [admin_game(game) for game in games]
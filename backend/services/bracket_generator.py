@@ -1,8 +1,11 @@
 import os
 import json
+import logging
 import httpx
 from typing import List, Dict, Any
 
+logger = logging.getLogger(__name__)
+
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 LLM_API_URL = os.getenv("LLM_API_URL", "https://api.openai.com/v1/chat/completions") # Default to OpenAI for example
 
@@ -44,7 +47,7 @@ Here is the player list:
 
     # Mock response if no API key is present
     if not LLM_API_KEY:
-        print("WARNING: No LLM_API_KEY found. using mock response.")
+        logger.warning("No LLM_API_KEY found, using a random bracket")
         pairs = []
         ids = [p['id'] for p in players]
         import random
@@ -67,7 +70,7 @@ Here is the player list:
             content = data['choices'][0]['message']['content']
             return json.loads(content)
         except Exception as e:
-            print(f"Error calling LLM: {e}")
+            logger.warning("LLM bracket generation failed, falling back to random pairing: %s", e)
             # Fallback to random pairing on error
             pairs = []
             ids = [p['id'] for p in players]
@@ -0,0 +1,294 @@
+"""
+Two-tier cache shared by the routers.
+
+Each namespace keeps a bounded LRU with TTL in process, in front of an
+optional Redis tier (CACHE_REDIS_URL) that every worker shares.
+Invalidations delete from both tiers and are broadcast on a pub/sub
+channel, so every worker evicts its local copy too. Concurrent misses for
+one key share a single load. A load that overlaps an invalidation of its
+namespace is returned but not stored, so it can't put back what was just
+evicted.
+
+Namespaces keyed by a resource version (see services.versions) need no
+invalidation at all: a write moves readers on to a new key. Explicit
+invalidation is for entries keyed by identity, like user principals.
+
+Without Redis, MemoryBus stands in for pub/sub, so several Cache
+instances in one process (e.g. simulated workers in a test) still
+invalidate each other. Invalidations then never reach other worker
+processes, so namespaces that must not serve stale entries after an
+invalidation (shared_only) bypass the cache entirely without Redis.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+_MISSING = object()
+
+
+class LocalTier:
+    """Per-namespace LRU of (expires_at, value), oldest entries evicted first."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.namespaces: Dict[str, "OrderedDict[str, tuple]"] = {}
+
+    def get(self, namespace: str, key: str) -> Any:
+        entries = self.namespaces.get(namespace)
+        entry = entries.get(key) if entries else None
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del entries[key]
+            return _MISSING
+        entries.move_to_end(key)
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        entries = self.namespaces.setdefault(namespace, OrderedDict())
+        entries[key] = (time.monotonic() + ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def delete(self, namespace: str, key: Optional[str] = None):
+        if key is None:
+            self.namespaces.pop(namespace, None)
+        elif namespace in self.namespaces:
+            self.namespaces[namespace].pop(key, None)
+
+    def size(self, namespace: str) -> int:
+        return len(self.namespaces.get(namespace, ()))
+
+
+class RedisTier:
+    """Shared tier. Values are stored as orjson, so UUIDs and datetimes come back as strings."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get(self, namespace: str, key: str) -> Any:
+        value = await self.redis.get(f"cache:{namespace}:{key}")
+        return _MISSING if value is None else orjson.loads(value)
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float):
+        # default=str for asyncpg's uuid.UUID subclass, which orjson doesn't encode natively
+        await self.redis.set(f"cache:{namespace}:{key}", orjson.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    async def delete(self, namespace: str, key: Optional[str] = None):
+        if key is not None:
+            await self.redis.delete(f"cache:{namespace}:{key}")
+            return
+        async for name in self.redis.scan_iter(match=f"cache:{namespace}:*", count=500):
+            await self.redis.delete(name)
+
+
+class MemoryBus:
+    """In-process stand-in for pub/sub: delivers to every subscribed Cache."""
+
+    def __init__(self):
+        self.handlers = []
+
+    async def start(self, handler: Callable[[Dict[str, Any]], None]):
+        self.handlers.append(handler)
+
+    async def publish(self, message: Dict[str, Any]):
+        for handler in list(self.handlers):
+            handler(message)
+
+    async def stop(self):
+        self.handlers.clear()
+
+
+class RedisBus:
+    def __init__(self, redis):
+        self.redis = redis
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Callable[[Dict[str, Any]], None]):
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        self.task = asyncio.create_task(self._listen(pubsub, handler))
+
+    async def _listen(self, pubsub, handler):
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    handler(orjson.loads(message["data"]))
+        finally:
+            await pubsub.close()
+
+    async def publish(self, message: Dict[str, Any]):
+        await self.redis.publish(INVALIDATION_CHANNEL, orjson.dumps(message))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+class Namespace:
+    def __init__(self, cache: "Cache", name: str, ttl: float, shared_only: bool = False):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.shared_only = shared_only
+        self.generation = 0
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"local_hits": 0, "shared_hits": 0, "coalesced": 0, "misses": 0, "invalidations": 0}
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value for key, calling loader (once, however many callers wait) on a miss."""
+        key = str(key)
+        if self.shared_only and not self.cache.cross_worker:
+            self.stats["misses"] += 1
+            return await loader()
+
+        value = self.cache.local.get(self.name, key)
+        if value is not _MISSING:
+            self.stats["local_hits"] += 1
+            return value
+
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        generation = self.generation
+        try:
+            value = await self._shared_get(key)
+            if value is not _MISSING:
+                self.stats["shared_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                value = await loader()
+                if generation == self.generation:
+                    await self._shared_set(key, value)
+            if generation == self.generation:
+                self.cache.local.set(self.name, key, value, self.ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception with no other waiters is not logged
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(key, None)
+
+    async def invalidate(self, key: Optional[Any] = None):
+        """Evict key (or the whole namespace) from every tier and every worker."""
+        key = None if key is None else str(key)
+        self.evict_local(key)
+        if self.cache.shared is not None:
+            try:
+                await self.cache.shared.delete(self.name, key)
+            except Exception:
+                logger.exception("Shared cache delete failed for %s:%s", self.name, key)
+        await self.cache.publish({"namespace": self.name, "key": key})
+
+    def evict_local(self, key: Optional[str]):
+        self.generation += 1
+        self.stats["invalidations"] += 1
+        self.cache.local.delete(self.name, key)
+
+    async def _shared_get(self, key: str) -> Any:
+        if self.cache.shared is None:
+            return _MISSING
+        try:
+            return await self.cache.shared.get(self.name, key)
+        except Exception:
+            # The shared tier is an optimization; fall back to loading
+            logger.exception("Shared cache read failed for %s:%s", self.name, key)
+            return _MISSING
+
+    async def _shared_set(self, key: str, value: Any):
+        if self.cache.shared is None:
+            return
+        try:
+            await self.cache.shared.set(self.name, key, value, self.ttl)
+        except Exception:
+            logger.exception("Shared cache write failed for %s:%s", self.name, key)
+
+    def metrics(self) -> Dict[str, Any]:
+        hits = self.stats["local_hits"] + self.stats["shared_hits"] + self.stats["coalesced"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "local_entries": self.cache.local.size(self.name),
+        }
+
+
+class Cache:
+    def __init__(self, local: LocalTier, shared=None, bus=None):
+        self.local = local
+        self.shared = shared
+        self.bus = bus if bus is not None else MemoryBus()
+        # Whether invalidations reach other worker processes
+        self.cross_worker = bus is not None
+        # Identifies this worker's own broadcasts, which it has already applied
+        self.origin = uuid.uuid4().hex
+        self.namespaces: Dict[str, Namespace] = {}
+
+    def namespace(self, name: str, ttl: float, shared_only: bool = False) -> Namespace:
+        if name not in self.namespaces:
+            self.namespaces[name] = Namespace(self, name, ttl, shared_only)
+        return self.namespaces[name]
+
+    async def start(self):
+        await self.bus.start(self._on_invalidation)
+
+    async def stop(self):
+        await self.bus.stop()
+
+    async def publish(self, message: Dict[str, Any]):
+        try:
+            await self.bus.publish({**message, "origin": self.origin})
+        except Exception:
+            # Other workers fall back on the TTL
+            logger.exception("Cache invalidation broadcast failed")
+
+    def _on_invalidation(self, message: Dict[str, Any]):
+        if message.get("origin") == self.origin:
+            return
+        namespace = self.namespaces.get(message["namespace"])
+        if namespace is not None:
+            namespace.evict_local(message.get("key"))
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: namespace.metrics() for name, namespace in self.namespaces.items()}
+
+
+def _create_cache() -> Cache:
+    if CACHE_REDIS_URL:
+        import redis.asyncio as redis
+        client = redis.from_url(CACHE_REDIS_URL)
+        return Cache(LocalTier(CACHE_MAX_ENTRIES), RedisTier(client), RedisBus(client))
+    return Cache(LocalTier(CACHE_MAX_ENTRIES))
+
+
+cache = _create_cache()
+
+# Version-keyed response bodies, see services.versions
+store_items = cache.namespace("store_items", ttl=300)
+tournaments = cache.namespace("tournaments", ttl=60)
+lobby = cache.namespace("lobby", ttl=30)
+brackets = cache.namespace("brackets", ttl=60)
+# Authenticated users by JWT subject, invalidated when role or verification changes. Only
+# cached with Redis: a demoted or deleted admin must lose access on every worker at once
+principals = cache.namespace("principals", ttl=60, shared_only=True)
@@ -0,0 +1,143 @@
+"""
+Response compression: brotli when the client accepts it and the brotli
+package is installed, otherwise gzip.
+
+Bodies under COMPRESSION_MIN_SIZE, non-text media types and responses that
+are already encoded pass through untouched. Streaming responses (exports)
+are compressed chunk by chunk with a flush after each one, so they still
+arrive progressively and are never buffered whole.
+"""
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # Higher levels cost far more CPU for a few percent
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+
+
+def _accepted(accept_encoding: str) -> set:
+    codings = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        codings.add(coding.strip())
+    return codings
+
+
+class _Encoder:
+    def __init__(self, coding: str):
+        self.coding = coding
+        if coding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.coding == "br":
+            return self.compressor.process(data) + self.compressor.flush()
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.coding == "br":
+            return self.compressor.process(data) + self.compressor.finish()
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = _accepted(dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1"))
+        coding = "br" if brotli is not None and "br" in accept else "gzip" if "gzip" in accept else None
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = start["headers"]
+                if not self._compressible(start["status"], headers) or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                encoder = _Encoder(coding)
+                if more_body:
+                    start["headers"] = self._encoded_headers(headers, coding, None)
+                    await send(start)
+                    await send({"type": "http.response.body", "body": encoder.chunk(body), "more_body": True})
+                else:
+                    compressed = encoder.finish(body)
+                    start["headers"] = self._encoded_headers(headers, coding, len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                return
+
+            data = encoder.chunk(body) if more_body else encoder.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _compressible(status: int, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if status < 200 or status in (204, 304):
+            return False
+        content_type = b""
+        for name, value in headers:
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+        return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+    @staticmethod
+    def _encoded_headers(headers: List[Tuple[bytes, bytes]], coding: str, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        encoded = []
+        vary = None
+        for name, value in headers:
+            lower = name.lower()
+            if lower == b"content-length":
+                continue
+            if lower == b"etag" and value.endswith(b'"'):
+                # A strong tag names exact bytes, so each encoding gets its own
+                value = value[:-1] + f"-{coding}\"".encode()
+            if lower == b"vary":
+                vary = value
+                continue
+            encoded.append((name, value))
+        encoded.append((b"content-encoding", coding.encode()))
+        encoded.append((b"vary", b"Accept-Encoding" if vary is None else vary + b", Accept-Encoding"))
+        if length is not None:
+            encoded.append((b"content-length", str(length).encode()))
+        return encoded
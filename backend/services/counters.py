@@ -0,0 +1,93 @@
+"""
+Incrementally maintained platform counters for the admin dashboard.
+
+Writers bump counters in the same transaction as the change they count, so
+reading the dashboard is a single small query instead of scanning tables.
+Each counter is spread over COUNTER_SHARDS rows and each transaction picks
+one random shard, so concurrent wagers don't all queue on one row lock.
+Increments are summed on the session and written at commit in one upsert
+(see services/deferred.py), so however many entries a transaction posts,
+it locks each counter row once, in sorted order.
+"""
+import random
+from typing import Dict
+
+from sqlalchemy import select, func, delete, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import PlatformCounter, User, CustomGame, GameStatus, Redemption
+from services import deferred
+
+COUNTER_SHARDS = 8
+
+USERS = "users"
+GAMES = "games"
+COMPLETED_GAMES = "completed_games"
+PENDING_REDEMPTIONS = "pending_redemptions"
+SP_IN_CIRCULATION = "sp_in_circulation"
+
+PENDING_KEY = "platform_counter_deltas"
+
+
+async def increment(db: AsyncSession, name: str, delta: int = 1):
+    """Add delta to a counter when db's transaction commits."""
+    if not delta:
+        return
+    deltas = deferred.pending(db, PENDING_KEY, dict)
+    deltas[name] = deltas.get(name, 0) + delta
+
+
+def _apply(session: Session, deltas: Dict[str, int]):
+    shard = random.randrange(COUNTER_SHARDS)
+    rows = [{"name": name, "shard": shard, "value": delta} for name, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    stmt = insert(PlatformCounter).values(rows)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[PlatformCounter.name, PlatformCounter.shard],
+        set_={"value": PlatformCounter.value + stmt.excluded.value},
+    ))
+
+
+deferred.register(PENDING_KEY, 0, _apply)
+
+
+async def read_all(db: AsyncSession) -> Dict[str, int]:
+    result = await db.execute(
+        select(PlatformCounter.name, func.sum(PlatformCounter.value)).group_by(PlatformCounter.name)
+    )
+    return {name: int(value) for name, value in result.all()}
+
+
+async def reconcile(db: AsyncSession) -> Dict[str, int]:
+    """
+    Recompute every counter from the base tables with SQL aggregates. The
+    counters table is locked first, so writers that commit afterwards wait
+    and then apply their increments on top of the recomputed values.
+    """
+    # The recount already includes this transaction's own changes
+    db.info.pop(PENDING_KEY, None)
+    await db.execute(text("LOCK TABLE platform_counters IN EXCLUSIVE MODE"))
+
+    users, sp_total = (await db.execute(
+        select(func.count(User.id).filter(User.role != 'deleted'), func.coalesce(func.sum(User.sp_points), 0))
+    )).one()
+    games, completed_games = (await db.execute(
+        select(func.count(CustomGame.id), func.count(CustomGame.id).filter(CustomGame.status == GameStatus.COMPLETED))
+    )).one()
+    pending = await db.scalar(select(func.count(Redemption.id)).where(Redemption.fulfilled == False))
+
+    values = {
+        USERS: users,
+        GAMES: games,
+        COMPLETED_GAMES: completed_games,
+        PENDING_REDEMPTIONS: pending,
+        SP_IN_CIRCULATION: sp_total,
+    }
+    await db.execute(delete(PlatformCounter))
+    await db.execute(insert(PlatformCounter), [
+        {"name": name, "shard": 0, "value": value} for name, value in values.items()
+    ])
+    return values
@@ -0,0 +1,52 @@
+"""
+Writes to shared hot rows, deferred to commit time.
+
+Platform counters and resource versions are a handful of rows that nearly
+every write transaction touches. Upserting them as code paths reach them
+would hold their locks for the rest of each transaction, taken in whatever
+order that path happens to visit them, so two transactions could lock the
+same rows in opposite orders and deadlock. Instead, writers accumulate
+their changes on the session (db.info) and the appliers registered here
+run just before the session commits: each one issues a single statement
+with its rows in sorted order, and the appliers themselves always run in
+the same order. The locks are then taken last, in one global order, and
+held only for the commit. A rollback discards whatever was accumulated.
+"""
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# (order, key, apply); apply(session, state) runs with the state accumulated under key
+_appliers: List[Tuple[int, str, Callable[[Session, Any], None]]] = []
+
+
+def register(key: str, order: int, apply: Callable[[Session, Any], None]):
+    """Run apply with the state stored under key before each commit that has some."""
+    _appliers.append((order, key, apply))
+    _appliers.sort(key=lambda applier: (applier[0], applier[1]))
+
+
+def pending(db, key: str, factory: Callable[[], Any]) -> Any:
+    """The state accumulated under key in db's current transaction, created with factory."""
+    info: Dict[str, Any] = db.info
+    state = info.get(key)
+    if state is None:
+        state = info[key] = factory()
+    return state
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_pending(session: Session):
+    for _, key, apply in _appliers:
+        state = session.info.pop(key, None)
+        if state:
+            apply(session, state)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction):
+    # Rolled back or closed without committing: nothing accumulated may leak into the next transaction
+    if transaction.parent is None:
+        for _, key, _ in _appliers:
+            session.info.pop(key, None)
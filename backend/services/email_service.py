@@ -1,11 +1,282 @@
 import os
+import json
+import time
+import random
+import asyncio
+import logging
+import smtplib
+import datetime
+from collections import deque
+from email.message import EmailMessage
+from collections import defaultdict
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Without SMTP_HOST, mail is written to the log instead of being sent, and never counts as delivered
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+EMAIL_FROM = os.getenv("EMAIL_FROM", "CashClash <no-reply@cashclash.com>")
+
+EMAIL_CONNECTIONS = int(os.getenv("EMAIL_CONNECTIONS", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_BATCH_LINGER = float(os.getenv("EMAIL_BATCH_LINGER", "0.05"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_DELAY = float(os.getenv("EMAIL_RETRY_BASE_DELAY", "1.0"))
+EMAIL_DEAD_LETTER_PATH = os.getenv("EMAIL_DEAD_LETTER_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".email_dead_letter.jsonl"))
+
+# Reconnect instead of reusing a connection that has been idle this long
+SMTP_IDLE_TIMEOUT = 30.0
+
+
+class OutboundEmail:
+    """
+    One message. kind and key identify what it is about (e.g. "redemption"
+    and the redemption id) for the delivery hook registered for that kind.
+    """
+
+    def __init__(self, to_email: str, subject: str, body: str, kind: Optional[str] = None, key: Optional[str] = None):
+        self.to_email = to_email
+        self.subject = subject
+        self.body = body
+        self.kind = kind
+        self.key = key
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+
+    def to_message(self) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = EMAIL_FROM
+        message["To"] = self.to_email
+        message["Subject"] = self.subject
+        message.set_content(self.body)
+        return message
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "to": self.to_email,
+            "subject": self.subject,
+            "body": self.body,
+            "kind": self.kind,
+            "key": self.key,
+            "attempts": self.attempts,
+            "error": self.last_error,
+        }
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class SMTPConnection:
+    """A persistent SMTP session owned by one worker; all calls run in a thread."""
+
+    def __init__(self):
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def _connect(self):
+        self.smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            self.smtp.starttls()
+        if SMTP_USERNAME:
+            self.smtp.login(SMTP_USERNAME, SMTP_PASSWORD or "")
+
+    def _ensure_connected(self):
+        if self.smtp is not None and time.monotonic() - self.last_used > SMTP_IDLE_TIMEOUT:
+            try:
+                self.smtp.noop()
+            except smtplib.SMTPException:
+                self.close()
+        if self.smtp is None:
+            self._connect()
+
+    def send_batch(self, batch: List[OutboundEmail]) -> List[Optional[Exception]]:
+        """Send every message over this session. Returns one error (or None) per message."""
+        results: List[Optional[Exception]] = []
+        for email in batch:
+            try:
+                self._ensure_connected()
+                self.smtp.send_message(email.to_message())
+                results.append(None)
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                # Connection is gone: drop it so the next message reconnects
+                self.close()
+                results.append(e)
+            except smtplib.SMTPException as e:
+                results.append(e)
+        self.last_used = time.monotonic()
+        return results
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+
+class EmailQueue:
+    """
+    Outbound mail queue. Callers enqueue and return immediately; a fixed set of
+    workers, each holding one reused SMTP connection, drain the queue in
+    batches. Transient failures are retried with exponential backoff and
+    messages that run out of attempts go to the dead-letter store.
+
+    Callers that need to record delivery register a hook per message kind;
+    after each batch it is called once with the keys the SMTP server
+    accepted, so it can update its own rows in one short transaction.
+    """
+
+    def __init__(self, connections: int, batch_size: int, linger: float, max_attempts: int, dead_letter_path: Optional[str]):
+        self.connections = connections
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self.dead_letters: Deque[Dict[str, object]] = deque(maxlen=1000)
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.retries: set = set()
+        self.delivery_hooks: Dict[str, Callable[[List[str]], Awaitable[None]]] = {}
+        self.stats = {"sent": 0, "logged": 0, "retried": 0, "dead_lettered": 0, "batches": 0, "hook_failures": 0}
+
+    def on_delivered(self, kind: str, hook: Callable[[List[str]], Awaitable[None]]):
+        """Call hook(keys) with the keys of delivered messages of this kind, once per batch."""
+        self.delivery_hooks[kind] = hook
+
+    def start(self):
+        if self.workers:
+            return
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.connections)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush what is queued (within timeout) and close the SMTP connections."""
+        if not self.workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Email queue stopped with %d messages pending", self.queue.qsize())
+        for task in list(self.retries) + self.workers:
+            task.cancel()
+        await asyncio.gather(*self.retries, *self.workers, return_exceptions=True)
+        self.workers = []
+        self.retries = set()
+
+    def enqueue(self, email: OutboundEmail):
+        self.start()
+        self.queue.put_nowait(email)
+
+    async def _next_batch(self) -> List[OutboundEmail]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        connection = SMTPConnection() if SMTP_HOST else None
+        try:
+            while True:
+                batch = await self._next_batch()
+                try:
+                    if connection is None:
+                        for email in batch:
+                            logger.info("Email (no SMTP_HOST configured) to=%s subject=%r body=%r", email.to_email, email.subject, email.body)
+                        # Logged, not sent: no retries, and delivery hooks are not told about it
+                        self.stats["logged"] += len(batch)
+                        continue
+                    results = await asyncio.to_thread(connection.send_batch, batch)
+                    self.stats["batches"] += 1
+                    delivered = []
+                    for email, error in zip(batch, results):
+                        if error is None:
+                            self.stats["sent"] += 1
+                            delivered.append(email)
+                        else:
+                            await self._failed(email, error)
+                    await self._run_hooks(delivered)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+        finally:
+            if connection is not None:
+                await asyncio.to_thread(connection.close)
+
+    async def _run_hooks(self, delivered: List[OutboundEmail]):
+        keys: Dict[str, List[str]] = defaultdict(list)
+        for email in delivered:
+            if email.kind in self.delivery_hooks and email.key is not None:
+                keys[email.kind].append(email.key)
+        for kind, batch_keys in keys.items():
+            try:
+                await self.delivery_hooks[kind](batch_keys)
+            except Exception:
+                # The mail went out; only the caller's record of it is missing
+                self.stats["hook_failures"] += 1
+                logger.exception("Delivery hook for %s failed for %d sent messages", kind, len(batch_keys))
+
+    async def _failed(self, email: OutboundEmail, error: Exception):
+        email.attempts += 1
+        email.last_error = repr(error)
+        if _is_permanent(error) or email.attempts >= self.max_attempts:
+            await self._dead_letter(email)
+            return
+
+        self.stats["retried"] += 1
+        delay = EMAIL_RETRY_BASE_DELAY * (2 ** (email.attempts - 1)) * (0.5 + random.random())
+        task = asyncio.create_task(self._requeue_later(email, delay))
+        self.retries.add(task)
+        task.add_done_callback(self.retries.discard)
+
+    async def _requeue_later(self, email: OutboundEmail, delay: float):
+        await asyncio.sleep(delay)
+        self.queue.put_nowait(email)
+
+    async def _dead_letter(self, email: OutboundEmail):
+        self.stats["dead_lettered"] += 1
+        entry = {**email.to_dict(), "failed_at": datetime.datetime.utcnow().isoformat()}
+        self.dead_letters.append(entry)
+        logger.error("Email to %s dead-lettered after %d attempts: %s", email.to_email, email.attempts, email.last_error)
+        if self.dead_letter_path:
+            try:
+                await asyncio.to_thread(self._append_dead_letter, entry)
+            except OSError as e:
+                logger.error("Could not write email dead-letter store: %s", e)
+
+    def _append_dead_letter(self, entry: Dict[str, object]):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def metrics(self) -> Dict[str, object]:
+        return {**self.stats, "queued": self.queue.qsize() if self.queue else 0}
+
+
+email_queue = EmailQueue(
+    EMAIL_CONNECTIONS,
+    EMAIL_BATCH_SIZE,
+    EMAIL_BATCH_LINGER,
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_DEAD_LETTER_PATH,
+)
 
-# Placeholder for email service
-# In production, use smtplib or a service like SendGrid
 
 async def send_email(to_email: str, subject: str, body: str):
-    print(f"--- Sending Email ---")
-    print(f"To: {to_email}")
-    print(f"Subject: {subject}")
-    print(f"Body: {body}")
-    print(f"---------------------")
+    """Queue an email for background delivery and return immediately."""
+    email_queue.enqueue(OutboundEmail(to_email, subject, body))
@@ -0,0 +1,193 @@
+import csv
+import io
+import json
+import datetime
+import enum
+import uuid
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+
+from database import async_session
+from models import User, Transaction, CustomGame, GamePlayer, Redemption
+from services.rollups import SETTLE_LAG
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "columnar": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Exportable tables: (columns, watermark column for incremental exports).
+# Credentials are never exported.
+EXPORT_TABLES = {
+    "users": (
+        [User.id, User.email, User.display_name, User.sp_points, User.role,
+         User.riot_summoner_name, User.is_verified, User.google_id, User.created_at],
+        User.created_at,
+    ),
+    "transactions": (
+        [Transaction.id, Transaction.seq, Transaction.user_id, Transaction.amount,
+         Transaction.type, Transaction.description, Transaction.created_at],
+        Transaction.created_at,
+    ),
+    "custom_games": (
+        [CustomGame.id, CustomGame.type, CustomGame.wager_amount, CustomGame.status, CustomGame.creator_id,
+         CustomGame.winner_team, CustomGame.created_at, CustomGame.completed_at],
+        CustomGame.created_at,
+    ),
+    "game_players": (
+        [GamePlayer.id, GamePlayer.game_id, GamePlayer.user_id, GamePlayer.team, GamePlayer.joined_at],
+        GamePlayer.joined_at,
+    ),
+    "redemptions": (
+        [Redemption.id, Redemption.user_id, Redemption.item_id, Redemption.email_sent,
+         Redemption.fulfilled, Redemption.created_at],
+        Redemption.created_at,
+    ),
+}
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+async def stream_rows(stmt: Select, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Any]]:
+    """
+    Iterate the rows of stmt through a server-side cursor, batch_size rows at
+    a time. Uses its own session, since a streaming response outlives the
+    request's database session.
+    """
+    async with async_session() as session:
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            for row in partition:
+                yield row
+
+
+async def encode_rows(rows: AsyncIterator[Sequence[Any]], columns: List[str], fmt: str, chunk_rows: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+    """Encode rows as CSV (with a header line) or NDJSON, yielding one chunk per chunk_rows rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(columns)
+
+    pending = 0
+    async for row in rows:
+        if writer is not None:
+            writer.writerow([_plain(v) for v in row])
+        else:
+            buffer.write(json.dumps({c: _plain(v) for c, v in zip(columns, row)}))
+            buffer.write("\n")
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def settled_until(until: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """
+    Upper bound for an export: until, but never later than SETTLE_LAG ago.
+    Watermark values are stamped before their transaction commits, so a
+    row can appear after a later-stamped one was already exported; rows
+    that young are left for the next incremental export instead.
+    """
+    settled = datetime.datetime.utcnow() - SETTLE_LAG
+    return settled if until is None else min(until, settled)
+
+
+def table_export(table: str, since: Optional[datetime.datetime], until: datetime.datetime) -> Tuple[Select, List[str]]:
+    """
+    Column-only query over rows whose watermark column is in [since, until).
+    Rows are not ordered, so the database never has to sort a whole table.
+    With until from settled_until(), passing the previous export's until as
+    the next since gives incremental exports that skip no rows whose
+    transaction commits within SETTLE_LAG of its timestamp.
+    """
+    columns, watermark = EXPORT_TABLES[table]
+    query = select(*columns).where(watermark < until)
+    if since is not None:
+        query = query.where(watermark >= since)
+    return query, [column.key for column in columns]
+
+
+async def _batches(rows: AsyncIterator[Sequence[Any]], size: int) -> AsyncIterator[List[Sequence[Any]]]:
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def encode_columnar(rows: AsyncIterator[Sequence[Any]], columns: List[str], batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+    """One NDJSON line per batch of rows, holding one array per column."""
+    async for batch in _batches(rows, batch_size):
+        data = {name: [_plain(row[i]) for row in batch] for i, name in enumerate(columns)}
+        yield json.dumps({"rows": len(batch), "columns": data}) + "\n"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every row group."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def encode_parquet(rows: AsyncIterator[Sequence[Any]], columns: List[str], batch_size: int = EXPORT_BATCH_SIZE * 50) -> AsyncIterator[bytes]:
+    """Parquet file streamed one row group at a time. Requires pyarrow."""
+    sink = _ChunkSink()
+    writer = None
+    async for batch in _batches(rows, batch_size):
+        data = {name: [_plain(row[i]) for row in batch] for i, name in enumerate(columns)}
+        table = pyarrow.table(data)
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def encode_export(rows: AsyncIterator[Sequence[Any]], columns: List[str], fmt: str):
+    if fmt == "columnar":
+        return encode_columnar(rows, columns)
+    if fmt == "parquet":
+        return encode_parquet(rows, columns)
+    return encode_rows(rows, columns, fmt)
@@ -0,0 +1,256 @@
+"""
+Idempotency-Key support for endpoints that move SP.
+
+The first request with a given key runs normally and its response body is
+stored; duplicates get the stored response back without running the
+endpoint again. A duplicate that arrives while the first request is still
+running waits for it instead of racing it.
+
+The stored response is an idempotency_records row that the endpoint adds
+with save_response before it commits, so it commits or rolls back together
+with the ledger entries: once a charge is committed its response is too,
+and a retry can never charge twice. If two requests with the same key do
+run at once, the second one's insert conflicts and its whole transaction
+fails with a 409.
+
+Requests that are still running are tracked in a pluggable backend: an
+in-process, bounded TTL store by default, or Redis (IDEMPOTENCY_REDIS_URL)
+so that duplicates on other workers wait too. Records older than
+IDEMPOTENCY_TTL are pruned by a scheduler job.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import datetime
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import jwt
+from fastapi import Depends, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import SECRET_KEY, ALGORITHM
+from database import get_db, async_session
+from models import IdempotencyRecord
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+IDEMPOTENCY_REDIS_URL = os.getenv("IDEMPOTENCY_REDIS_URL")
+IDEMPOTENCY_PRUNE_INTERVAL = float(os.getenv("IDEMPOTENCY_PRUNE_INTERVAL", "3600"))
+
+# How long a request may hold a key before duplicates stop waiting for it
+PENDING_TTL = 60
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+
+class IdempotentReplay(Exception):
+    """Raised by the dependency to answer a duplicate with the stored response."""
+
+    def __init__(self, record: Dict[str, Any]):
+        self.record = record
+
+
+class MemoryBackend:
+    """Process-local store bounded to max_entries, oldest entries evicted first."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.entries:
+            key, (expires_at, _) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.max_entries:
+                break
+            del self.entries[key]
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        return record
+
+    async def reserve(self, key: str, record: Dict[str, Any], ttl: int) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, record, ttl)
+        return True
+
+    async def set(self, key: str, record: Dict[str, Any], ttl: int):
+        self.entries.pop(key, None)
+        self.entries[key] = (time.monotonic() + ttl, record)
+        self._evict()
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+
+class RedisBackend:
+    """Shared store so a duplicate that lands on another worker waits for the first request."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = await self.redis.get(f"idempotency:{key}")
+        return json.loads(value) if value else None
+
+    async def reserve(self, key: str, record: Dict[str, Any], ttl: int) -> bool:
+        return bool(await self.redis.set(f"idempotency:{key}", json.dumps(record), ex=ttl, nx=True))
+
+    async def set(self, key: str, record: Dict[str, Any], ttl: int):
+        await self.redis.set(f"idempotency:{key}", json.dumps(record), ex=ttl)
+
+    async def delete(self, key: str):
+        await self.redis.delete(f"idempotency:{key}")
+
+
+class IdempotencySlot:
+    """Reservation held by the request that will produce the stored response."""
+
+    def __init__(self, store: "IdempotencyStore", key: str, fingerprint: str):
+        self.store = store
+        self.key = key
+        self.fingerprint = fingerprint
+
+
+class IdempotencyStore:
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+    async def begin(self, db: AsyncSession, key: str, fingerprint: str) -> IdempotencySlot:
+        """
+        Reserve key for this request and return a slot, or raise IdempotentReplay
+        with the stored response if the key was already used.
+        """
+        while True:
+            pending = self.inflight.get(key)
+            if pending is not None:
+                # Same worker is already running this key: wait for it
+                await asyncio.shield(pending)
+                continue
+
+            reservation = await self.backend.get(key)
+            if reservation is not None:
+                if reservation["fingerprint"] != fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+                # Another worker holds it: poll until it finishes or its reservation expires
+                await asyncio.sleep(0.05)
+                continue
+
+            if await self.backend.reserve(key, {"fingerprint": fingerprint}, PENDING_TTL):
+                self.inflight[key] = asyncio.get_running_loop().create_future()
+                slot = IdempotencySlot(self, key, fingerprint)
+                break
+
+        # Checked after reserving, so a request that committed just before is seen
+        try:
+            stored = await db.get(IdempotencyRecord, key)
+        except BaseException:
+            await self.release(slot)
+            raise
+        if stored is None:
+            return slot
+        await self.release(slot)
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        raise IdempotentReplay({"status_code": stored.status_code, "body": stored.body})
+
+    async def release(self, slot: IdempotencySlot):
+        """Drop the reservation; the stored response, if any, is already in the database."""
+        await self.backend.delete(slot.key)
+        future = self.inflight.pop(slot.key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+
+def _create_store() -> IdempotencyStore:
+    if IDEMPOTENCY_REDIS_URL:
+        return IdempotencyStore(RedisBackend(IDEMPOTENCY_REDIS_URL), IDEMPOTENCY_TTL)
+    return IdempotencyStore(MemoryBackend(IDEMPOTENCY_MAX_KEYS), IDEMPOTENCY_TTL)
+
+
+idempotency_store = _create_store()
+
+
+async def idempotency_slot(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Dependency for endpoints that honour Idempotency-Key. Keys are scoped to
+    the caller taken from the JWT, so duplicates are answered with one
+    primary-key lookup, before the user lookup. db is the endpoint's own
+    session (FastAPI caches get_db per request).
+    """
+    if not idempotency_key:
+        yield None
+        return
+
+    try:
+        subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials", headers={"WWW-Authenticate": "Bearer"})
+
+    key = f"{subject}:{idempotency_key}"
+    fingerprint = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}".encode()).hexdigest()
+
+    slot = await idempotency_store.begin(db, key, fingerprint)
+    try:
+        yield slot
+    finally:
+        await idempotency_store.release(slot)
+
+
+async def save_response(db: AsyncSession, slot: Optional[IdempotencySlot], response_model, result, status_code: int = 200):
+    """
+    Add the endpoint's result for replay to the request's transaction and hand
+    it back unchanged. Call it before committing, with everything the response
+    shows already flushed.
+    """
+    if slot is None:
+        return result
+    await db.flush()
+    body = jsonable_encoder(response_model.model_validate(result, from_attributes=True))
+    db.add(IdempotencyRecord(key=slot.key, fingerprint=slot.fingerprint, status_code=status_code, body=body))
+    try:
+        await db.flush()
+    except IntegrityError:
+        # A concurrent request with this key got there first; this one's effects roll back
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key was processed concurrently")
+    return result
+
+
+async def prune(ttl: int = IDEMPOTENCY_TTL) -> int:
+    """Delete stored responses older than ttl seconds. Returns how many were deleted."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl)
+    async with async_session() as session:
+        result = await session.execute(delete(IdempotencyRecord).where(IdempotencyRecord.created_at < cutoff))
+        await session.commit()
+    return result.rowcount
+
+
+async def replay_handler(request: Request, exc: IdempotentReplay):
+    return JSONResponse(
+        status_code=exc.record["status_code"],
+        content=exc.record["body"],
+        headers={"Idempotent-Replayed": "true"},
+    )
@@ -0,0 +1,402 @@
+"""
+SP, wins and win-rate leaderboards.
+
+Scores are materialized in leaderboard_entries, one row per user and
+season ('YYYY-MM', plus 'all' for all time). The ledger writes the
+all-time SP balance in the same transaction as every balance change, and
+settlement adds wins and games played. Nothing on the read path scans
+users, transactions or game_players.
+
+Each worker keeps the boards it serves in memory as indexable skiplists
+(RankedSet), so top-N pages and rank lookups are O(log n). A season is
+loaded on first use and then followed by updated_at, re-reading a
+SYNC_OVERLAP window so that rows committed late by slower transactions are
+not missed. Applying a row twice is harmless. Only all time and the last
+LEADERBOARD_SEASONS months are served, so the boards a worker holds stay
+bounded; older seasons are dropped as the months roll over.
+"""
+import gc
+import os
+import uuid
+import random
+import asyncio
+import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session
+from models import LeaderboardEntry, User, CustomGame, GamePlayer, GameStatus
+
+ALL_TIME = "all"
+BOARDS = ("sp", "wins", "win_rate")
+# Players need this many settled games in the season to get a win rate
+WIN_RATE_MIN_GAMES = int(os.getenv("LEADERBOARD_WIN_RATE_MIN_GAMES", "5"))
+SYNC_INTERVAL = datetime.timedelta(seconds=float(os.getenv("LEADERBOARD_SYNC_INTERVAL", "1")))
+SYNC_OVERLAP = datetime.timedelta(seconds=30)
+# Monthly seasons served, counting the current one
+LEADERBOARD_SEASONS = int(os.getenv("LEADERBOARD_SEASONS", "12"))
+
+MAX_LEVEL = 24  # Plenty for 2**24 entries per board
+# Rows per upsert: six parameters each keeps a statement under asyncpg's 32767 parameter limit
+WRITE_CHUNK_SIZE = 5000
+
+
+def season_of(moment: datetime.datetime) -> str:
+    return moment.strftime("%Y-%m")
+
+
+def served_seasons(now: datetime.datetime) -> List[str]:
+    """All time and the last LEADERBOARD_SEASONS monthly seasons, newest first."""
+    months = now.year * 12 + now.month - 1
+    return [ALL_TIME] + [
+        f"{month // 12:04d}-{month % 12 + 1:02d}" for month in range(months, months - LEADERBOARD_SEASONS, -1)
+    ]
+
+
+class UnknownSeason(ValueError):
+    """A season outside the ones served: malformed, in the future or too old."""
+
+
+# ============= RANKED SET =============
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * levels
+        # Bottom-level steps from this node to next[level]
+        self.width = [1] * levels
+
+
+class RankedSet:
+    """
+    Sorted set with O(log n) insert, remove, rank and index access: a
+    skiplist whose links also record how many entries they skip.
+    """
+
+    def __init__(self):
+        self.tail = _Node(None, MAX_LEVEL)
+        self.head = _Node(None, MAX_LEVEL)
+        self.head.next = [self.tail] * MAX_LEVEL
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def _levels() -> int:
+        # Geometric with p=1/2: one plus the trailing zero bits of a random word
+        bits = random.getrandbits(MAX_LEVEL) | 1 << (MAX_LEVEL - 1)
+        return (bits & -bits).bit_length()
+
+    def load(self, keys: Iterable):
+        """Fill an empty set from keys already in order, in O(n)."""
+        if self.size:
+            raise ValueError("load() needs an empty set")
+        last = [self.head] * MAX_LEVEL
+        last_position = [0] * MAX_LEVEL
+        position = 0
+        for position, key in enumerate(keys, start=1):
+            node = _Node(key, self._levels())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(MAX_LEVEL):
+            last[level].next[level] = self.tail
+            last[level].width[level] = position + 1 - last_position[level]
+        self.size = position
+
+    def _predecessors(self, key) -> Tuple[List[_Node], List[int]]:
+        chain = [self.head] * MAX_LEVEL
+        steps = [0] * MAX_LEVEL
+        node = self.head
+        for level in reversed(range(MAX_LEVEL)):
+            while node.next[level] is not self.tail and node.next[level].key < key:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        return chain, steps
+
+    def add(self, key):
+        chain, steps = self._predecessors(key)
+        levels = self._levels()
+        node = _Node(key, levels)
+        skipped = 0
+        for level in range(levels):
+            previous = chain[level]
+            node.next[level] = previous.next[level]
+            previous.next[level] = node
+            node.width[level] = previous.width[level] - skipped
+            previous.width[level] = skipped + 1
+            skipped += steps[level]
+        for level in range(levels, MAX_LEVEL):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain, _ = self._predecessors(key)
+        node = chain[0].next[0]
+        if node is self.tail or node.key != key:
+            raise KeyError(key)
+        levels = len(node.next)
+        for level in range(levels):
+            previous = chain[level]
+            previous.width[level] += node.width[level] - 1
+            previous.next[level] = node.next[level]
+        for level in range(levels, MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def count_less(self, key) -> int:
+        """Number of entries that sort before key."""
+        count = 0
+        node = self.head
+        for level in reversed(range(MAX_LEVEL)):
+            while node.next[level] is not self.tail and node.next[level].key < key:
+                count += node.width[level]
+                node = node.next[level]
+        return count
+
+    def iter_from(self, index: int) -> Iterator:
+        """Keys in order, starting at the index-th (0-based)."""
+        if index >= self.size:
+            return
+        node = self.head
+        remaining = index + 1
+        for level in reversed(range(MAX_LEVEL)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        while node is not self.tail:
+            yield node.key
+            node = node.next[0]
+
+
+class Board:
+    """One ranking: highest score first, ties in user id order. Keys are (-score, user_id)."""
+
+    def __init__(self):
+        self.keys: Dict[uuid.UUID, tuple] = {}
+        self.ranked = RankedSet()
+
+    def load(self, scores: Iterable[Tuple[uuid.UUID, float]]):
+        """Fill an empty board in one pass instead of one insert per user."""
+        keys = sorted((-score, user_id) for user_id, score in scores)
+        self.keys = {key[1]: key for key in keys}
+        self.ranked.load(keys)
+
+    def update(self, user_id: uuid.UUID, score: Optional[float]):
+        """Set a user's score, or take them off the board with None."""
+        old = self.keys.pop(user_id, None)
+        if old is not None:
+            self.ranked.remove(old)
+        if score is not None:
+            key = (-score, user_id)
+            self.keys[user_id] = key
+            self.ranked.add(key)
+
+    def rank(self, user_id: uuid.UUID) -> Optional[Tuple[int, float]]:
+        """1-based competition rank (tied scores share a rank) and score."""
+        key = self.keys.get(user_id)
+        if key is None:
+            return None
+        return self.ranked.count_less((key[0],)) + 1, -key[0]
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, uuid.UUID, float]]:
+        entries = []
+        rank = None
+        previous = None
+        for position, key in enumerate(self.ranked.iter_from(offset), start=offset):
+            if len(entries) == limit:
+                break
+            if rank is None:
+                rank = self.ranked.count_less((key[0],)) + 1
+            elif key[0] != previous:
+                rank = position + 1
+            previous = key[0]
+            entries.append((rank, key[1], -key[0]))
+        return entries
+
+    def __len__(self) -> int:
+        return len(self.ranked)
+
+
+# ============= IN-MEMORY BOARDS =============
+
+class Season:
+    def __init__(self, name: str):
+        self.name = name
+        self.boards = {board: Board() for board in BOARDS}
+        # user_id -> (sp_points, wins, games)
+        self.stats: Dict[uuid.UUID, Tuple[Optional[int], int, int]] = {}
+        self.synced_at: Optional[datetime.datetime] = None
+        self.checked_at: Optional[datetime.datetime] = None
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def scores(sp_points: Optional[int], wins: int, games: int) -> Dict[str, Optional[float]]:
+        return {
+            "sp": sp_points,
+            "wins": wins if games else None,
+            "win_rate": wins / games if games >= WIN_RATE_MIN_GAMES else None,
+        }
+
+    def load(self, rows: Iterable[Tuple[uuid.UUID, Optional[int], int, int]]):
+        self.stats = {user_id: (sp_points, wins, games) for user_id, sp_points, wins, games in rows}
+        for board in BOARDS:
+            self.boards[board].load(
+                (user_id, score) for user_id, score in
+                ((user_id, self.scores(*stats)[board]) for user_id, stats in self.stats.items())
+                if score is not None
+            )
+
+    def apply(self, user_id: uuid.UUID, sp_points: Optional[int], wins: int, games: int):
+        self.stats[user_id] = (sp_points, wins, games)
+        for board, score in self.scores(sp_points, wins, games).items():
+            self.boards[board].update(user_id, score)
+
+    async def refresh(self, db: AsyncSession):
+        """Load the season on first use, then apply rows changed since the last sync."""
+        now = datetime.datetime.utcnow()
+        if self.checked_at is not None and now - self.checked_at < SYNC_INTERVAL:
+            return
+        async with self.lock:
+            if self.checked_at is not None and now - self.checked_at < SYNC_INTERVAL:
+                return
+            query = select(
+                LeaderboardEntry.user_id, LeaderboardEntry.sp_points, LeaderboardEntry.wins, LeaderboardEntry.games
+            ).where(LeaderboardEntry.season == self.name)
+            if self.synced_at is None:
+                rows = (await db.execute(query)).all()
+                # Millions of long-lived nodes; collecting mid-build only rescans them
+                gc.disable()
+                try:
+                    self.load(rows)
+                finally:
+                    gc.enable()
+            else:
+                query = query.where(LeaderboardEntry.updated_at > self.synced_at - SYNC_OVERLAP)
+                for row in (await db.execute(query)).all():
+                    self.apply(*row)
+            self.synced_at = self.checked_at = now
+
+
+class Leaderboards:
+    def __init__(self):
+        self.seasons: Dict[str, Season] = {}
+
+    async def season(self, db: AsyncSession, name: str) -> Season:
+        season = self.seasons.get(name)
+        if season is None:
+            served = served_seasons(datetime.datetime.utcnow())
+            if name not in served:
+                raise UnknownSeason(name)
+            # A new month may have pushed the oldest season out of range
+            for stale in [held for held in self.seasons if held not in served]:
+                del self.seasons[stale]
+            season = self.seasons[name] = Season(name)
+        await season.refresh(db)
+        return season
+
+    async def warm(self):
+        """Load the all-time and current season boards before serving, instead of on the first request."""
+        async with async_session() as session:
+            for name in (ALL_TIME, season_of(datetime.datetime.utcnow())):
+                await self.season(session, name)
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        return {name: {board: len(b) for board, b in season.boards.items()} for name, season in self.seasons.items()}
+
+
+leaderboards = Leaderboards()
+
+
+# ============= WRITERS =============
+
+async def record_balances(db: AsyncSession, balances: Iterable[Tuple[uuid.UUID, int]]):
+    """Store users' new SP balances. Called by the ledger with each balance change."""
+    now = datetime.datetime.utcnow()
+    # Sorted so concurrent batches lock rows in the same order
+    rows = [
+        {"season": ALL_TIME, "user_id": user_id, "sp_points": balance, "wins": 0, "games": 0, "updated_at": now}
+        for user_id, balance in sorted(balances, key=lambda item: str(item[0]))
+    ]
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        stmt = insert(LeaderboardEntry).values(rows[start:start + WRITE_CHUNK_SIZE])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[LeaderboardEntry.season, LeaderboardEntry.user_id],
+            set_={"sp_points": stmt.excluded.sp_points, "updated_at": stmt.excluded.updated_at},
+        ))
+
+
+async def record_results(db: AsyncSession, results: Iterable[Tuple[uuid.UUID, bool]], settled_at: datetime.datetime):
+    """Count one settled game per (user_id, won) in its season and all time."""
+    totals: Dict[uuid.UUID, List[int]] = {}
+    for user_id, won in results:
+        total = totals.setdefault(user_id, [0, 0])
+        total[0] += int(won)
+        total[1] += 1
+    if not totals:
+        return
+    now = datetime.datetime.utcnow()
+    rows = [
+        {"season": season, "user_id": user_id, "sp_points": None, "wins": wins, "games": games, "updated_at": now}
+        for season in (ALL_TIME, season_of(settled_at))
+        for user_id, (wins, games) in sorted(totals.items(), key=lambda item: str(item[0]))
+    ]
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        stmt = insert(LeaderboardEntry).values(rows[start:start + WRITE_CHUNK_SIZE])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[LeaderboardEntry.season, LeaderboardEntry.user_id],
+            set_={
+                "wins": LeaderboardEntry.wins + stmt.excluded.wins,
+                "games": LeaderboardEntry.games + stmt.excluded.games,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ))
+
+
+async def rebuild(db: AsyncSession) -> int:
+    """
+    Recompute every entry from users and completed games, e.g. for a database
+    that predates the leaderboard. Touches every row, so workers pick it all up.
+    """
+    now = datetime.datetime.utcnow()
+    await db.execute(update(LeaderboardEntry).values(sp_points=None, wins=0, games=0, updated_at=now))
+
+    columns = ["season", "user_id", "sp_points", "wins", "games", "updated_at"]
+    balances = insert(LeaderboardEntry).from_select(
+        columns,
+        select(literal(ALL_TIME), User.id, User.sp_points, literal(0), literal(0), literal(now)),
+    )
+    await db.execute(balances.on_conflict_do_update(
+        index_elements=[LeaderboardEntry.season, LeaderboardEntry.user_id],
+        set_={"sp_points": balances.excluded.sp_points},
+    ))
+
+    won = func.count().filter(GamePlayer.team == CustomGame.winner_team)
+    settled = (
+        select(GamePlayer.user_id, func.to_char(CustomGame.completed_at, "YYYY-MM").label("season"), won.label("wins"), func.count().label("games"))
+        .join(CustomGame, CustomGame.id == GamePlayer.game_id)
+        .where(CustomGame.status == GameStatus.COMPLETED, CustomGame.completed_at.isnot(None), GamePlayer.user_id.isnot(None))
+        .group_by(GamePlayer.user_id, "season")
+        .subquery()
+    )
+    for season_column, group_by in ((settled.c.season, (settled.c.user_id, settled.c.season)), (literal(ALL_TIME), (settled.c.user_id,))):
+        results = insert(LeaderboardEntry).from_select(
+            columns,
+            select(season_column, settled.c.user_id, literal(None), func.sum(settled.c.wins), func.sum(settled.c.games), literal(now))
+            .group_by(*group_by),
+        )
+        await db.execute(results.on_conflict_do_update(
+            index_elements=[LeaderboardEntry.season, LeaderboardEntry.user_id],
+            set_={"wins": results.excluded.wins, "games": results.excluded.games},
+        ))
+
+    return await db.scalar(select(func.count()).select_from(LeaderboardEntry))
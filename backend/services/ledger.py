@@ -0,0 +1,312 @@
+"""
+SP ledger.
+
+The transactions table is the append-only source of truth for SP. Every
+balance change goes through this module, which appends the ledger entry and
+moves users.sp_points (the balance projection) in the same transaction with
+a single conditional UPDATE. That UPDATE is also the per-user lock: ledger
+writes for one user are serialized, so debits can never overdraw and the
+projection cannot drift from the ledger through these paths.
+
+Ledger balance reads are the user's latest balance snapshot plus the ledger
+entries appended after it. A snapshot is taken once SNAPSHOT_INTERVAL entries
+have piled up, so the tail (and the read) stays bounded however much a
+user wagers.
+"""
+import os
+import uuid
+import logging
+import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, func, values, column, literal, any_, Integer, insert as sql_insert
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import User, Transaction, TransactionType, BalanceSnapshot
+from services import counters, leaderboard
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_INTERVAL = int(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "32"))
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+class AccountNotFound(Exception):
+    pass
+
+
+async def credit(db: AsyncSession, user_id: uuid.UUID, amount: int, type: TransactionType, description: Optional[str] = None) -> Transaction:
+    """Add amount SP to a user's balance."""
+    if amount < 0:
+        raise ValueError("Credit amount must not be negative")
+    return await _post(db, user_id, amount, type, description)
+
+
+async def debit(db: AsyncSession, user_id: uuid.UUID, amount: int, type: TransactionType, description: Optional[str] = None) -> Transaction:
+    """Remove amount SP from a user's balance. Raises InsufficientFunds if the balance is too low."""
+    if amount < 0:
+        raise ValueError("Debit amount must not be negative")
+    return await _post(db, user_id, -amount, type, description)
+
+
+async def adjust(db: AsyncSession, user_id: uuid.UUID, delta: int, description: Optional[str] = None) -> Transaction:
+    """Manual correction by delta SP (admin tools). Cannot take the balance below zero."""
+    return await _post(db, user_id, delta, TransactionType.ADJUSTMENT, description)
+
+
+async def bulk_adjust(db: AsyncSession, criteria, delta: int, type: TransactionType, description: Optional[str] = None) -> List[Tuple[uuid.UUID, int]]:
+    """
+    Move every user matching criteria by delta SP with one UPDATE and record
+    the entries with one multi-row INSERT. With a negative delta, users who
+    cannot cover it are left out. Returns (user_id, new balance) per user moved.
+    """
+    stmt = (
+        update(User)
+        .where(criteria)
+        .values(sp_points=User.sp_points + delta, ledger_tail=User.ledger_tail + 1)
+        .returning(User.id, User.sp_points, User.ledger_tail)
+        .execution_options(synchronize_session=False)
+    )
+    if delta < 0:
+        stmt = stmt.where(User.sp_points >= -delta)
+    rows = (await db.execute(stmt)).all()
+    moved = [(user_id, balance) for user_id, balance, _ in rows]
+    if not moved:
+        return moved
+
+    await db.execute(sql_insert(Transaction), [
+        {"user_id": user_id, "amount": delta, "type": type, "description": description}
+        for user_id, _ in moved
+    ])
+    await _snapshot_many(db, [user_id for user_id, _, tail in rows if tail >= SNAPSHOT_INTERVAL])
+    await counters.increment(db, counters.SP_IN_CIRCULATION, delta * len(moved))
+    await leaderboard.record_balances(db, moved)
+    for user_id, balance in moved:
+        _sync_loaded_user(db, user_id, balance)
+    return moved
+
+
+async def bulk_credit(db: AsyncSession, credits: Iterable[Tuple[uuid.UUID, int, Optional[str]]], type: TransactionType) -> Dict[uuid.UUID, int]:
+    """
+    Post many (user_id, amount, description) credits with one UPDATE ... FROM
+    VALUES over the per-user totals and one multi-row INSERT of the entries,
+    so settling a 5v5 costs the same statements as a 1v1. Users that no
+    longer exist are skipped. Returns the new balance per user credited.
+    """
+    credits = list(credits)
+    if any(amount < 0 for _, amount, _ in credits):
+        raise ValueError("Credit amount must not be negative")
+    totals: Dict[uuid.UUID, List[int]] = defaultdict(lambda: [0, 0])
+    for user_id, amount, _ in credits:
+        totals[user_id][0] += amount
+        totals[user_id][1] += 1
+    if not totals:
+        return {}
+
+    rows = values(
+        column("user_id", UUID(as_uuid=True)), column("amount", Integer), column("entries", Integer),
+        name="credits",
+    ).data([(user_id, amount, entries) for user_id, (amount, entries) in totals.items()])
+    result = await db.execute(
+        update(User)
+        .where(User.id == rows.c.user_id)
+        .values(sp_points=User.sp_points + rows.c.amount, ledger_tail=User.ledger_tail + rows.c.entries)
+        .returning(User.id, User.sp_points, User.ledger_tail)
+        .execution_options(synchronize_session=False)
+    )
+    updated = result.all()
+    balances = {user_id: balance for user_id, balance, _ in updated}
+    if not balances:
+        return balances
+
+    entries = [
+        {"user_id": user_id, "amount": amount, "type": type, "description": description}
+        for user_id, amount, description in credits if user_id in balances
+    ]
+    await db.execute(sql_insert(Transaction), entries)
+    await _snapshot_many(db, [user_id for user_id, _, tail in updated if tail >= SNAPSHOT_INTERVAL])
+    await counters.increment(db, counters.SP_IN_CIRCULATION, sum(entry["amount"] for entry in entries))
+    await leaderboard.record_balances(db, balances.items())
+    for user_id, balance in balances.items():
+        _sync_loaded_user(db, user_id, balance)
+    return balances
+
+
+async def open_account(db: AsyncSession, user: User) -> Optional[Transaction]:
+    """Record the starting balance of a newly created user in the ledger."""
+    await db.flush()
+    await leaderboard.record_balances(db, [(user.id, user.sp_points or 0)])
+    if not user.sp_points:
+        return None
+    transaction = Transaction(
+        user_id=user.id,
+        amount=user.sp_points,
+        type=TransactionType.DEPOSIT,
+        description="Opening balance"
+    )
+    db.add(transaction)
+    await counters.increment(db, counters.SP_IN_CIRCULATION, user.sp_points)
+    return transaction
+
+
+async def backfill_opening_balances(conn: AsyncConnection) -> int:
+    """
+    One-off upgrade of a database whose balances predate the ledger. Posts
+    the difference between each user's sp_points and the sum of their
+    existing entries as an opening entry, so the ledger accounts for every
+    balance, and counts each user's entries into ledger_tail so snapshots
+    start with their next change. Returns the number of entries posted.
+    """
+    totals = (
+        select(Transaction.user_id, func.sum(Transaction.amount).label("total"))
+        .group_by(Transaction.user_id)
+        .subquery()
+    )
+    result = await conn.execute(
+        select(User.id, func.coalesce(User.sp_points, 0) - func.coalesce(totals.c.total, 0))
+        .outerjoin(totals, totals.c.user_id == User.id)
+    )
+    entries = [
+        {
+            "user_id": user_id,
+            "amount": gap,
+            "type": TransactionType.DEPOSIT if gap > 0 else TransactionType.ADJUSTMENT,
+            "description": "Opening balance",
+        }
+        for user_id, gap in result.all() if gap
+    ]
+    if entries:
+        await conn.execute(sql_insert(Transaction), entries)
+
+    counts = select(Transaction.user_id, func.count().label("entries")).group_by(Transaction.user_id).subquery()
+    await conn.execute(update(User).where(User.id == counts.c.user_id).values(ledger_tail=counts.c.entries))
+    return len(entries)
+
+
+async def _post(db: AsyncSession, user_id: uuid.UUID, delta: int, type: TransactionType, description: Optional[str]) -> Transaction:
+    stmt = (
+        update(User)
+        .where(User.id == user_id)
+        .values(sp_points=User.sp_points + delta, ledger_tail=User.ledger_tail + 1)
+        .returning(User.sp_points, User.ledger_tail)
+        .execution_options(synchronize_session=False)
+    )
+    if delta < 0:
+        stmt = stmt.where(User.sp_points >= -delta)
+
+    row = (await db.execute(stmt)).first()
+    if row is None:
+        if await db.scalar(select(User.id).where(User.id == user_id)) is None:
+            raise AccountNotFound(str(user_id))
+        raise InsufficientFunds(str(user_id))
+
+    balance, tail = row
+    _sync_loaded_user(db, user_id, balance)
+
+    transaction = Transaction(user_id=user_id, amount=delta, type=type, description=description)
+    db.add(transaction)
+    await counters.increment(db, counters.SP_IN_CIRCULATION, delta)
+    await leaderboard.record_balances(db, [(user_id, balance)])
+
+    if tail >= SNAPSHOT_INTERVAL:
+        await db.flush()
+        await _snapshot(db, user_id, balance)
+
+    return transaction
+
+
+def _sync_loaded_user(db: AsyncSession, user_id: uuid.UUID, balance: int):
+    """Keep an already loaded User in the session in step with the UPDATE."""
+    user = db.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        set_committed_value(user, "sp_points", balance)
+
+
+async def _snapshot(db: AsyncSession, user_id: uuid.UUID, projected_balance: int):
+    """
+    Roll the ledger tail into the user's snapshot. Must run while the user row
+    is locked by _post, so no other entry for this user can commit meanwhile.
+    """
+    snapshot = await db.execute(
+        select(BalanceSnapshot.balance, BalanceSnapshot.last_seq).where(BalanceSnapshot.user_id == user_id)
+    )
+    base, last_seq = snapshot.first() or (0, 0)
+
+    tail_sum, tail_seq = (await db.execute(
+        select(func.coalesce(func.sum(Transaction.amount), 0), func.max(Transaction.seq))
+        .where(Transaction.user_id == user_id, Transaction.seq > last_seq)
+    )).one()
+    if tail_seq is None:
+        return
+
+    balance = base + tail_sum
+    if balance != projected_balance:
+        logger.warning("Ledger balance %s of user %s differs from sp_points %s", balance, user_id, projected_balance)
+
+    await db.execute(
+        insert(BalanceSnapshot)
+        .values(user_id=user_id, balance=balance, last_seq=tail_seq, updated_at=datetime.datetime.utcnow())
+        .on_conflict_do_update(
+            index_elements=[BalanceSnapshot.user_id],
+            set_={"balance": balance, "last_seq": tail_seq, "updated_at": datetime.datetime.utcnow()},
+        )
+    )
+    await db.execute(
+        update(User).where(User.id == user_id).values(ledger_tail=0).execution_options(synchronize_session=False)
+    )
+
+
+async def _snapshot_many(db: AsyncSession, user_ids: List[uuid.UUID]):
+    """
+    Set-based _snapshot for the bulk paths: roll every given user's ledger
+    tail into their snapshot with one upsert and reset their ledger_tail with
+    one UPDATE. The user rows must already be locked by the bulk UPDATE.
+    """
+    if not user_ids:
+        return
+    now = datetime.datetime.utcnow()
+    # One array parameter rather than one per id, so any number of users stays under asyncpg's 32767 limit
+    ids = any_(literal(list(user_ids), ARRAY(UUID(as_uuid=True))))
+    tails = (
+        select(
+            Transaction.user_id,
+            (func.coalesce(BalanceSnapshot.balance, 0) + func.sum(Transaction.amount)).label("balance"),
+            func.max(Transaction.seq).label("last_seq"),
+        )
+        .outerjoin(BalanceSnapshot, BalanceSnapshot.user_id == Transaction.user_id)
+        .where(Transaction.user_id == ids, Transaction.seq > func.coalesce(BalanceSnapshot.last_seq, 0))
+        .group_by(Transaction.user_id, BalanceSnapshot.balance)
+        .subquery()
+    )
+    stmt = insert(BalanceSnapshot).from_select(
+        ["user_id", "balance", "last_seq", "updated_at"],
+        select(tails.c.user_id, tails.c.balance, tails.c.last_seq, literal(now)),
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[BalanceSnapshot.user_id],
+        set_={"balance": stmt.excluded.balance, "last_seq": stmt.excluded.last_seq, "updated_at": stmt.excluded.updated_at},
+    ))
+    await db.execute(
+        update(User).where(User.id == ids).values(ledger_tail=0).execution_options(synchronize_session=False)
+    )
+
+
+async def get_balance(db: AsyncSession, user_id: uuid.UUID) -> int:
+    """Ledger balance: latest snapshot plus the (bounded) tail after it."""
+    snapshot = await db.execute(
+        select(BalanceSnapshot.balance, BalanceSnapshot.last_seq).where(BalanceSnapshot.user_id == user_id)
+    )
+    base, last_seq = snapshot.first() or (0, 0)
+    tail_sum = await db.scalar(
+        select(func.coalesce(func.sum(Transaction.amount), 0))
+        .where(Transaction.user_id == user_id, Transaction.seq > last_seq)
+    )
+    return base + tail_sum
@@ -0,0 +1,162 @@
+"""
+Champion x champion win/loss matrix from verified tournament matches.
+
+The matrix is one row in champion_matchup_matrices. Champions get an index
+when they first appear, and the counts are a dense row-major array('I') of
+wins, so champion i's losses to j are just cell [j][i]. A refresh locks the
+row, which also serializes concurrent refreshes from several workers. It
+folds in only the matches verified since the watermark (as in
+services/rollups.py, anything younger than SETTLE_LAG waits for the next
+run) and writes the array back. That costs a few milliseconds for a
+roster-sized matrix.
+
+rebuild() starts from an empty matrix and replays every verified match,
+including matches verified before verified_at was recorded.
+"""
+import os
+import array
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from database import async_session
+from models import ChampionMatchupMatrix, Match, Registration
+from services.rollups import SETTLE_LAG, lock_watermark
+
+MATCHUP_INTERVAL = float(os.getenv("MATCHUP_INTERVAL", "60"))
+MATRIX = "tournament_matches"
+WATERMARK = "champion_matchups"
+
+
+class Matrix:
+    """Decoded matrix: champion names and their n x n win counts."""
+
+    def __init__(self, champions: List[str], wins: bytes):
+        self.champions = list(champions)
+        self.index = {name: i for i, name in enumerate(self.champions)}
+        self.wins = array.array("I")
+        self.wins.frombytes(wins)
+        if len(self.wins) != len(self.champions) ** 2:
+            raise ValueError("Matchup matrix size doesn't match its champions")
+
+    def _slot(self, champion: str) -> int:
+        i = self.index.get(champion)
+        if i is not None:
+            return i
+        # Grow to (n+1) x (n+1): copy each row and append a zero column, then a zero row
+        n = len(self.champions)
+        grown = array.array("I")
+        for row in range(n):
+            grown.extend(self.wins[row * n:(row + 1) * n])
+            grown.append(0)
+        grown.extend([0] * (n + 1))
+        self.wins = grown
+        self.champions.append(champion)
+        self.index[champion] = n
+        return n
+
+    def record(self, winner: str, loser: str):
+        i = self._slot(winner)
+        j = self._slot(loser)
+        self.wins[i * len(self.champions) + j] += 1
+
+    def row(self, champion: str) -> List[Dict[str, Any]]:
+        """Record of one champion against every opponent it has met."""
+        n = len(self.champions)
+        i = self.index[champion]
+        opponents = []
+        for j, opponent in enumerate(self.champions):
+            wins, losses = self.wins[i * n + j], self.wins[j * n + i]
+            if wins or losses:
+                opponents.append({
+                    "opponent": opponent,
+                    "wins": wins,
+                    "losses": losses,
+                    "win_rate": wins / (wins + losses),
+                })
+        return opponents
+
+    def grid(self) -> List[List[int]]:
+        n = len(self.champions)
+        return [self.wins[i * n:(i + 1) * n].tolist() for i in range(n)]
+
+
+def _champion(name: Optional[str]) -> Optional[str]:
+    name = (name or "").strip()
+    return name or None
+
+
+async def _lock_matrix(db: AsyncSession) -> ChampionMatchupMatrix:
+    await db.execute(insert(ChampionMatchupMatrix).values(name=MATRIX, champions=[], wins=b"").on_conflict_do_nothing())
+    result = await db.execute(select(ChampionMatchupMatrix).where(ChampionMatchupMatrix.name == MATRIX).with_for_update())
+    return result.scalars().one()
+
+
+async def _results(db: AsyncSession, since: Optional[datetime.datetime], until: datetime.datetime) -> List[Tuple[str, str]]:
+    """(winner champion, loser champion) of matches verified in (since, until]; all of them if since is None."""
+    winner = aliased(Registration)
+    loser = aliased(Registration)
+    query = (
+        select(winner.champion, loser.champion)
+        .select_from(Match)
+        .join(winner, winner.id == Match.winner_registration_id)
+        .join(loser, and_(
+            loser.id.in_([Match.player1_registration_id, Match.player2_registration_id]),
+            loser.id != Match.winner_registration_id,
+        ))
+        .where(Match.verified.is_(True))
+    )
+    if since is None:
+        query = query.where((Match.verified_at <= until) | Match.verified_at.is_(None))
+    else:
+        query = query.where(Match.verified_at > since, Match.verified_at <= until)
+    result = await db.execute(query)
+    return [(w, l) for w, l in ((_champion(w), _champion(l)) for w, l in result.all()) if w and l]
+
+
+async def _fold(db: AsyncSession, rebuild: bool) -> int:
+    row = await _lock_matrix(db)
+    mark = await lock_watermark(db, WATERMARK)
+    cutoff = datetime.datetime.utcnow() - SETTLE_LAG
+
+    matrix = Matrix([], b"") if rebuild else Matrix(row.champions, row.wins)
+    results = await _results(db, None if rebuild else mark.timestamp, cutoff)
+    for winner, loser in results:
+        matrix.record(winner, loser)
+
+    if results or rebuild:
+        row.champions = matrix.champions
+        row.wins = matrix.wins.tobytes()
+        row.matches = len(results) if rebuild else row.matches + len(results)
+        row.version += 1
+        row.updated_at = datetime.datetime.utcnow()
+    mark.timestamp = cutoff
+    return len(results)
+
+
+async def refresh() -> int:
+    """Fold in matches verified since the last run. Returns how many were added."""
+    async with async_session() as session:
+        added = await _fold(session, rebuild=False)
+        await session.commit()
+    return added
+
+
+async def rebuild() -> int:
+    """Replace the matrix with one replayed from every verified match. Returns how many were counted."""
+    async with async_session() as session:
+        counted = await _fold(session, rebuild=True)
+        await session.commit()
+    return counted
+
+
+async def read(db: AsyncSession) -> Tuple[Optional[ChampionMatchupMatrix], Matrix]:
+    """The stored row (None before the first refresh) and its decoded matrix."""
+    row = await db.get(ChampionMatchupMatrix, MATRIX)
+    if row is None:
+        return None, Matrix([], b"")
+    return row, Matrix(row.champions, row.wins)
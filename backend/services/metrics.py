@@ -0,0 +1,225 @@
+"""
+Request and database instrumentation exposed in Prometheus text format.
+
+MetricsMiddleware times every request by route template, and SQLAlchemy
+cursor events attribute each statement and its duration to the request
+running it through a context variable. Everything is plain in-process
+counters and bucket arrays, cheap enough to leave on in production.
+"""
+import time
+import bisect
+import contextvars
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class RequestStats:
+    """Database work done on behalf of one request."""
+    __slots__ = ("statements", "db_seconds", "statement_log")
+
+    def __init__(self, record_statements: bool = False):
+        self.statements = 0
+        self.db_seconds = 0.0
+        # Statement texts, only collected when something (e.g. query budgets) needs them
+        self.statement_log: Optional[List[str]] = [] if record_statements else None
+
+
+current_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request_stats", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, labels: Tuple[str, ...], value: float):
+        self.values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+requests_total = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+request_duration = Histogram("http_request_duration_seconds", "HTTP request latency", LATENCY_BUCKETS, ("method", "route"))
+request_statements = Histogram("http_request_db_statements", "Database statements issued per request", STATEMENT_BUCKETS, ("method", "route"))
+request_db_time = Histogram("http_request_db_seconds", "Time spent in the database per request", LATENCY_BUCKETS, ("method", "route"))
+requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+db_statements_total = Counter("db_statements_total", "Database statements issued, inside or outside requests")
+
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]):
+    """Add a callable producing extra exposition lines at scrape time."""
+    _collectors.append(collector)
+
+
+def stats_collector(prefix: str, stats: Callable[[], Dict[str, object]]) -> Callable[[], List[str]]:
+    """Expose the numeric values of a service's metrics() dict as gauges."""
+    def collect() -> List[str]:
+        lines = []
+        for key, value in stats().items():
+            if isinstance(value, (int, float)):
+                lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {float(value)}"]
+        return lines
+    return collect
+
+
+def labeled_stats_collector(prefix: str, label: str, stats: Callable[[], Dict[str, Dict[str, object]]]) -> Callable[[], List[str]]:
+    """Like stats_collector, for a metrics() dict keyed by a label value (e.g. cache namespace)."""
+    def collect() -> List[str]:
+        families: Dict[str, List[str]] = {}
+        for label_value, values in stats().items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    families.setdefault(key, []).append(f'{prefix}_{key}{{{label}="{label_value}"}} {float(value)}')
+        lines = []
+        for key, samples in families.items():
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.extend(samples)
+        return lines
+    return collect
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in (requests_total, request_duration, request_statements, request_db_time, requests_in_flight, db_statements_total):
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+def install_db_hooks(engine):
+    """Attribute statement counts and time to the current request, and export pool gauges."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_statements_total.inc()
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            if stats.statement_log is not None:
+                stats.statement_log.append(statement)
+
+    def pool_metrics() -> List[str]:
+        pool = sync_engine.pool
+        gauges = {
+            "db_pool_size": getattr(pool, "size", lambda: 0)(),
+            "db_pool_checked_out": getattr(pool, "checkedout", lambda: 0)(),
+            "db_pool_overflow": getattr(pool, "overflow", lambda: 0)(),
+            "db_pool_checked_in": getattr(pool, "checkedin", lambda: 0)(),
+        }
+        lines = []
+        for name, value in gauges.items():
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return lines
+
+    register_collector(pool_metrics)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so it adds no per-request task or body buffering."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight.inc(amount=-1)
+            current_request_stats.reset(token)
+
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"))
+            requests_total.inc(labels + (status,))
+            request_duration.observe(labels, elapsed)
+            request_statements.observe(labels, stats.statements)
+            request_db_time.observe(labels, stats.db_seconds)
@@ -0,0 +1,22 @@
+import json
+import base64
+from typing import Any, List
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque keyset cursor holding the sort key of the last row of a page."""
+    raw = json.dumps([str(v) for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,219 @@
+"""
+Per-user profile statistics (player_stats).
+
+Settlement code calls the record_* functions in the same transaction as
+the change they count. Each call locks the affected users' rows, in user
+id order so concurrent settlements can't deadlock, and rewrites the JSON
+aggregates. The statement count is the same for a 1v1 and a 5v5.
+
+rebuild() recomputes every row from game_players, custom_games,
+transactions, registrations and matches, for backfills
+(rebuild_player_stats.py). It works through users in keyset-paged chunks
+and commits each one. Run it while settlement is quiet; it replaces rows
+wholesale.
+"""
+import uuid
+import datetime
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import (
+    User, PlayerStats, CustomGame, GamePlayer, GameStatus, GameType,
+    Registration, Match, Transaction, TransactionType,
+)
+
+REBUILD_CHUNK_SIZE = 5000
+FAVOURITE_CHAMPIONS = 3
+
+
+def _add(aggregate: Dict[str, Any], path: Tuple[str, ...], delta: int) -> Dict[str, Any]:
+    """Copy of aggregate with delta added at path, so the JSON column is marked changed."""
+    aggregate = dict(aggregate or {})
+    if len(path) == 1:
+        aggregate[path[0]] = aggregate.get(path[0], 0) + delta
+    else:
+        aggregate[path[0]] = _add(aggregate.get(path[0]), path[1:], delta)
+    return aggregate
+
+
+async def _lock(db: AsyncSession, user_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, PlayerStats]:
+    ids = sorted({user_id for user_id in user_ids if user_id is not None}, key=str)
+    if not ids:
+        return {}
+    await db.execute(insert(PlayerStats).values([{"user_id": user_id} for user_id in ids]).on_conflict_do_nothing())
+    result = await db.execute(
+        select(PlayerStats).where(PlayerStats.user_id.in_(ids)).order_by(PlayerStats.user_id).with_for_update()
+    )
+    return {stats.user_id: stats for stats in result.scalars()}
+
+
+async def record_game(db: AsyncSession, game_type: GameType, results: Iterable[Tuple[uuid.UUID, bool, int]]):
+    """Count a settled custom game: (user_id, won, SP won net of the wager) per player."""
+    results = list(results)
+    rows = await _lock(db, (user_id for user_id, _, _ in results))
+    now = datetime.datetime.utcnow()
+    for user_id, won, sp_delta in results:
+        stats = rows.get(user_id)
+        if stats is None:
+            continue
+        games = _add(stats.games, (game_type.value, "played"), 1)
+        stats.games = _add(games, (game_type.value, "wins" if won else "losses"), 1)
+        stats.net_sp_won += sp_delta
+        stats.updated_at = now
+
+
+async def record_registration(db: AsyncSession, user_id: uuid.UUID, champion: Optional[str]):
+    rows = await _lock(db, [user_id])
+    stats = rows.get(user_id)
+    if stats is None:
+        return
+    stats.tournaments = _add(stats.tournaments, ("entered",), 1)
+    if champion:
+        stats.champions = _add(stats.champions, (champion, "picks"), 1)
+    stats.updated_at = datetime.datetime.utcnow()
+
+
+async def record_match(db: AsyncSession, round: int, winner: Registration, loser: Optional[Registration]):
+    """Count a verified tournament match. loser is None for a bye."""
+    rows = await _lock(db, [winner.user_id, loser.user_id if loser else None])
+    now = datetime.datetime.utcnow()
+    for registration, won in ((winner, True), (loser, False)):
+        stats = rows.get(registration.user_id) if registration else None
+        if stats is None:
+            continue
+        tournaments = _add(stats.tournaments, ("matches_won" if won else "matches_lost",), 1)
+        tournaments["best_round"] = max(tournaments.get("best_round", 0), round or 0)
+        stats.tournaments = tournaments
+        if won and registration.champion:
+            stats.champions = _add(stats.champions, (registration.champion, "wins"), 1)
+        stats.updated_at = now
+
+
+def profile(user_id: uuid.UUID, stats: Optional[PlayerStats]) -> Dict[str, Any]:
+    """API shape of a player's stats; all zeros for a player without a row yet."""
+    games = stats.games if stats else {}
+    tournaments = stats.tournaments if stats else {}
+    champions = stats.champions if stats else {}
+
+    by_type = {}
+    for game_type in GameType:
+        counts = games.get(game_type.value, {})
+        by_type[game_type.value] = {key: counts.get(key, 0) for key in ("played", "wins", "losses")}
+    total = {key: sum(counts[key] for counts in by_type.values()) for key in ("played", "wins", "losses")}
+
+    favourites = sorted(
+        champions.items(),
+        key=lambda item: (-item[1].get("picks", 0), -item[1].get("wins", 0), item[0]),
+    )[:FAVOURITE_CHAMPIONS]
+    won, lost = tournaments.get("matches_won", 0), tournaments.get("matches_lost", 0)
+
+    return {
+        "user_id": str(user_id),
+        "games": {**by_type, "total": total},
+        "tournaments": {
+            "entered": tournaments.get("entered", 0),
+            "matches_played": won + lost,
+            "matches_won": won,
+            "matches_lost": lost,
+            "best_round": tournaments.get("best_round", 0),
+        },
+        "net_sp_won": stats.net_sp_won if stats else 0,
+        "favourite_champions": [
+            {"champion": name, "picks": counts.get("picks", 0), "wins": counts.get("wins", 0)}
+            for name, counts in favourites
+        ],
+        "updated_at": stats.updated_at if stats else None,
+    }
+
+
+# ============= REBUILD =============
+
+async def _rebuild_batch(db: AsyncSession, user_ids: List[uuid.UUID]) -> int:
+    """Recompute the rows of the given players. The caller commits."""
+    rows: Dict[uuid.UUID, Dict[str, Any]] = defaultdict(lambda: {"games": {}, "tournaments": {}, "champions": {}, "net_sp_won": 0})
+
+    won = GamePlayer.team == CustomGame.winner_team
+    settled = await db.execute(
+        select(
+            GamePlayer.user_id, CustomGame.type, func.count(),
+            func.count().filter(won), func.coalesce(func.sum(CustomGame.wager_amount), 0),
+        )
+        .join(CustomGame, CustomGame.id == GamePlayer.game_id)
+        .where(CustomGame.status == GameStatus.COMPLETED, GamePlayer.user_id.in_(user_ids))
+        .group_by(GamePlayer.user_id, CustomGame.type)
+    )
+    for user_id, game_type, played, wins, wagered in settled.all():
+        rows[user_id]["games"][game_type.value] = {"played": played, "wins": wins, "losses": played - wins}
+        rows[user_id]["net_sp_won"] -= wagered
+
+    winnings = await db.execute(
+        select(Transaction.user_id, func.sum(Transaction.amount))
+        .where(Transaction.type == TransactionType.WAGER_WIN, Transaction.user_id.in_(user_ids))
+        .group_by(Transaction.user_id)
+    )
+    for user_id, amount in winnings.all():
+        rows[user_id]["net_sp_won"] += amount
+
+    registrations = await db.execute(
+        select(Registration.user_id, Registration.champion, func.count())
+        .where(Registration.user_id.in_(user_ids))
+        .group_by(Registration.user_id, Registration.champion)
+    )
+    for user_id, champion, picks in registrations.all():
+        tournaments = rows[user_id]["tournaments"]
+        tournaments["entered"] = tournaments.get("entered", 0) + picks
+        if champion:
+            rows[user_id]["champions"].setdefault(champion, {"picks": 0, "wins": 0})["picks"] += picks
+
+    played = await db.execute(
+        select(
+            Registration.user_id, Registration.champion,
+            func.count().filter(Match.winner_registration_id == Registration.id),
+            func.count().filter(Match.winner_registration_id != Registration.id),
+            func.max(Match.round),
+        )
+        .join(Match, or_(Match.player1_registration_id == Registration.id, Match.player2_registration_id == Registration.id))
+        .where(Match.verified.is_(True), Match.winner_registration_id.isnot(None), Registration.user_id.in_(user_ids))
+        .group_by(Registration.user_id, Registration.champion)
+    )
+    for user_id, champion, wins, losses, best_round in played.all():
+        tournaments = rows[user_id]["tournaments"]
+        tournaments["matches_won"] = tournaments.get("matches_won", 0) + wins
+        tournaments["matches_lost"] = tournaments.get("matches_lost", 0) + losses
+        tournaments["best_round"] = max(tournaments.get("best_round", 0), best_round or 0)
+        if champion and wins:
+            rows[user_id]["champions"].setdefault(champion, {"picks": 0, "wins": 0})["wins"] += wins
+
+    if not rows:
+        return 0
+    now = datetime.datetime.utcnow()
+    stmt = insert(PlayerStats).values([{"user_id": user_id, **row, "updated_at": now} for user_id, row in rows.items()])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[PlayerStats.user_id],
+        set_={column: stmt.excluded[column] for column in ("games", "tournaments", "champions", "net_sp_won", "updated_at")},
+    ))
+    return len(rows)
+
+
+async def rebuild(db: AsyncSession, chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+    """
+    Recompute every player's row from the source tables, chunk_size users at
+    a time in user id order, committing after each chunk so no transaction
+    holds locks or memory for the whole table. Returns the number of rows written.
+    """
+    written = 0
+    after: Optional[uuid.UUID] = None
+    while True:
+        page = select(User.id).order_by(User.id).limit(chunk_size)
+        if after is not None:
+            page = page.where(User.id > after)
+        user_ids = list((await db.execute(page)).scalars())
+        if not user_ids:
+            return written
+        written += await _rebuild_batch(db, user_ids)
+        await db.commit()
+        after = user_ids[-1]
@@ -0,0 +1,148 @@
+"""
+Per-endpoint query budgets and N+1 detection.
+
+Endpoints declare how many statements a request may issue with
+@query_budget(n) and how often one statement shape may repeat. When
+QUERY_BUDGET_MODE is "warn" or "raise", QueryBudgetMiddleware records the
+statements each request issues (through the hooks in services.metrics)
+and checks them against the route's budget. Repeated shapes, e.g. the
+same SELECT with different ids, are reported as likely N+1 loops.
+
+Tests can run code directly under a budget:
+
+    with count_queries(budget=3) as stats:
+        await list_games(db=session)
+"""
+import os
+import re
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+from services.metrics import RequestStats, current_request_stats
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_MODES = ("off", "warn", "raise")
+QUERY_BUDGET_REPEATS = int(os.getenv("QUERY_BUDGET_REPEATS", "2"))
+
+_mode = os.getenv("QUERY_BUDGET_MODE", "off")
+if _mode not in QUERY_BUDGET_MODES:
+    raise ValueError(f"QUERY_BUDGET_MODE must be one of {', '.join(QUERY_BUDGET_MODES)}")
+
+# Quoted strings, numbers and bind parameters (asyncpg $n, pyformat, qmark)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|%\(\w+\)s|\b\d+(?:\.\d+)?\b|\?")
+# Expanded IN lists and multi-row VALUES, so their length doesn't change the shape
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(statements: int, repeats: int = QUERY_BUDGET_REPEATS) -> Callable:
+    """
+    Declare the most statements a request to this endpoint may issue, and
+    the most times any one statement shape may appear among them.
+    """
+    def decorate(endpoint):
+        endpoint.__query_budget__ = (statements, repeats)
+        return endpoint
+    return decorate
+
+
+def statement_shape(statement: str) -> str:
+    """Statement text with literals, parameters and list lengths normalized away."""
+    shape = _LITERALS.sub("?", statement)
+    shape = _LISTS.sub("(?)", shape)
+    return " ".join(shape.split())
+
+
+def repeated_statements(statements: List[str], repeats: int) -> List[Tuple[str, int]]:
+    """Statement shapes issued more than `repeats` times, most frequent first."""
+    counts = Counter(statement_shape(statement) for statement in statements)
+    return [(shape, count) for shape, count in counts.most_common() if count > repeats]
+
+
+def check(name: str, stats: RequestStats, budget: Optional[Tuple[int, int]], mode: Optional[str] = None):
+    """Warn about or raise on a budget overrun or repeated statement shape."""
+    mode = mode or _mode
+    statements, repeats = budget if budget is not None else (None, QUERY_BUDGET_REPEATS)
+    problems = []
+    if budget is None:
+        problems.append("no query budget declared")
+    elif stats.statements > statements:
+        problems.append(f"{stats.statements} statements, budget is {statements}")
+    for shape, count in repeated_statements(stats.statement_log or [], repeats):
+        problems.append(f"possible N+1, issued {count} times: {shape[:200]}")
+    if not problems:
+        return
+
+    message = f"{name}: " + "; ".join(problems)
+    if mode == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def get_mode() -> str:
+    return _mode
+
+
+@contextmanager
+def budget_mode(mode: str):
+    """Temporarily switch enforcement, e.g. to "raise" for a test module."""
+    global _mode
+    if mode not in QUERY_BUDGET_MODES:
+        raise ValueError(f"mode must be one of {', '.join(QUERY_BUDGET_MODES)}")
+    previous, _mode = _mode, mode
+    try:
+        yield
+    finally:
+        _mode = previous
+
+
+@contextmanager
+def count_queries(budget: Optional[int] = None, repeats: int = QUERY_BUDGET_REPEATS, name: str = "block"):
+    """
+    Record the statements issued inside the block. With a budget, raise
+    QueryBudgetExceeded on leaving the block if it was exceeded.
+    """
+    stats = RequestStats(record_statements=True)
+    token = current_request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_request_stats.reset(token)
+    if budget is not None:
+        check(name, stats, (budget, repeats), mode="raise")
+
+
+class QueryBudgetMiddleware:
+    """Check each request against its route's budget. Add it inside MetricsMiddleware."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        stats = current_request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = current_request_stats.set(stats)
+        stats.statement_log = []
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if token is not None:
+                current_request_stats.reset(token)
+
+        route = scope.get("route")
+        endpoint = getattr(route, "endpoint", None)
+        if endpoint is None:
+            return
+        check(f"{scope['method']} {route.path}", stats, getattr(endpoint, "__query_budget__", None))
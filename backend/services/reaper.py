@@ -0,0 +1,100 @@
+"""
+Expires custom games that never fill up, never get verified or are never
+resolved after a dispute.
+
+Wagers are deducted when a player joins, so a game stuck OPEN,
+IN_PROGRESS or DISPUTED holds its players' SP in escrow indefinitely. Each batch
+moves up to REAPER_BATCH_SIZE stale games to EXPIRED and refunds every
+player's wager with one set-based ledger credit, all in one transaction.
+Games locked by a concurrent join or verify are skipped (SKIP LOCKED) and
+picked up by a later run, so the reaper never waits on request traffic.
+Batches continue until none are left or REAPER_TIME_BUDGET is spent.
+"""
+import os
+import time
+import logging
+import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session
+from models import CustomGame, GamePlayer, GameStatus, TransactionType
+from services import ledger, versions
+
+logger = logging.getLogger(__name__)
+
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", "300"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "500"))
+REAPER_TIME_BUDGET = float(os.getenv("REAPER_TIME_BUDGET", "10"))
+# How long a game may wait for players (from creation), and then for a verdict (from starting)
+OPEN_TTL = datetime.timedelta(seconds=float(os.getenv("REAPER_OPEN_TTL", "7200")))
+IN_PROGRESS_TTL = datetime.timedelta(seconds=float(os.getenv("REAPER_IN_PROGRESS_TTL", "86400")))
+# Disputes get longer for a moderator to settle them, also from starting
+DISPUTED_TTL = datetime.timedelta(seconds=float(os.getenv("REAPER_DISPUTED_TTL", "604800")))
+# Games whose players' wagers are still held
+ESCROW_STATUSES = (GameStatus.OPEN, GameStatus.IN_PROGRESS, GameStatus.DISPUTED)
+
+
+async def refund_wagers(db: AsyncSession, wagers: Dict, reason: str) -> List[Tuple]:
+    """
+    Credit every player of the given games (game id -> wager) their wager
+    back with one set-based ledger post. Returns the credits posted.
+    """
+    players = await db.execute(
+        select(GamePlayer.game_id, GamePlayer.user_id).where(GamePlayer.game_id.in_(list(wagers)))
+    )
+    credits = [
+        (user_id, wagers[game_id], f"{reason} {game_id}")
+        for game_id, user_id in players.all() if wagers[game_id] and user_id is not None
+    ]
+    await ledger.bulk_credit(db, credits, TransactionType.REFUND)
+    return credits
+
+
+async def expire_batch(db: AsyncSession, now: datetime.datetime, limit: int = REAPER_BATCH_SIZE) -> Dict[str, int]:
+    """Expire up to limit stale games and refund their players. The caller commits."""
+    stale = (
+        select(CustomGame.id)
+        .where(
+            ((CustomGame.status == GameStatus.OPEN) & (CustomGame.created_at < now - OPEN_TTL))
+            | ((CustomGame.status == GameStatus.IN_PROGRESS) & (CustomGame.started_at < now - IN_PROGRESS_TTL))
+            | ((CustomGame.status == GameStatus.DISPUTED) & (CustomGame.started_at < now - DISPUTED_TTL))
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(CustomGame)
+        .where(CustomGame.id.in_(stale))
+        .values(status=GameStatus.EXPIRED)
+        .returning(CustomGame.id, CustomGame.wager_amount)
+        .execution_options(synchronize_session=False)
+    )
+    wagers = dict(result.all())
+    if not wagers:
+        return {"expired": 0, "refunds": 0, "refunded_sp": 0}
+
+    credits = await refund_wagers(db, wagers, "Refund for expired game")
+    await versions.bump(db, versions.GAMES)
+    return {"expired": len(wagers), "refunds": len(credits), "refunded_sp": sum(amount for _, amount, _ in credits)}
+
+
+async def reap(time_budget: float = REAPER_TIME_BUDGET) -> Dict[str, int]:
+    """Expire stale games batch by batch, one transaction each, until done or out of time."""
+    deadline = time.monotonic() + time_budget
+    totals = {"expired": 0, "refunds": 0, "refunded_sp": 0, "batches": 0}
+    async with async_session() as session:
+        while True:
+            batch = await expire_batch(session, datetime.datetime.utcnow())
+            await session.commit()
+            totals["batches"] += 1
+            for key, value in batch.items():
+                totals[key] += value
+            if batch["expired"] < REAPER_BATCH_SIZE or time.monotonic() >= deadline:
+                break
+    if totals["expired"]:
+        logger.info("Expired %s stale games, refunded %s SP", totals["expired"], totals["refunded_sp"])
+    return totals
@@ -0,0 +1,121 @@
+"""
+Balance-vs-ledger reconciliation.
+
+Walks users in primary-key ranges and, for each range, compares
+users.sp_points with the sum of that user's ledger entries in one grouped
+query. Ranges are checked concurrently on up to `concurrency` connections.
+Every statement is a plain read (no row locks) over one bounded range, so
+the job can run against a live database. Drifting users are streamed to
+the report as they are found instead of being collected in memory.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, func
+
+from database import async_session
+from models import User, Transaction
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "10000"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
+
+
+async def _next_boundary(session, after, size: int):
+    """Last user id of the next range of `size` users after `after`."""
+    ids = select(User.id).order_by(User.id).limit(size)
+    if after is not None:
+        ids = ids.where(User.id > after)
+    ids = ids.subquery()
+    return await session.scalar(select(func.max(ids.c.id)))
+
+
+async def _check_range(lower, upper) -> List[Dict[str, Any]]:
+    """Users in (lower, upper] whose sp_points differ from their ledger sum."""
+    ledger = select(Transaction.user_id, func.sum(Transaction.amount).label("total")).where(Transaction.user_id <= upper)
+    users = select(User.id, User.email, User.sp_points).where(User.id <= upper)
+    if lower is not None:
+        ledger = ledger.where(Transaction.user_id > lower)
+        users = users.where(User.id > lower)
+    ledger = ledger.group_by(Transaction.user_id).subquery()
+    users = users.subquery()
+
+    balance = func.coalesce(users.c.sp_points, 0)
+    total = func.coalesce(ledger.c.total, 0)
+    query = (
+        select(users.c.id, users.c.email, balance, total)
+        .outerjoin(ledger, ledger.c.user_id == users.c.id)
+        .where(balance != total)
+    )
+    async with async_session() as session:
+        result = await session.execute(query)
+        return [{
+            "user_id": str(user_id),
+            "email": email,
+            "sp_points": sp_points,
+            "ledger_balance": int(ledger_balance),
+            "drift": sp_points - int(ledger_balance),
+        } for user_id, email, sp_points, ledger_balance in result.all()]
+
+
+async def reconcile(report_path: Optional[str] = None, chunk_size: int = RECONCILE_CHUNK_SIZE, concurrency: int = RECONCILE_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Check every user and return a summary. Drifting users are written to
+    report_path as JSON lines when given.
+    """
+    started = time.monotonic()
+    ranges: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    report = open(report_path, "w", encoding="utf-8") if report_path else None
+    checked_ranges = drifting_users = total_drift = 0
+
+    async def produce():
+        async with async_session() as session:
+            lower = None
+            while True:
+                upper = await _next_boundary(session, lower, chunk_size)
+                # Don't keep a transaction open while waiting on the consumers
+                await session.commit()
+                if upper is None:
+                    break
+                await ranges.put((lower, upper))
+                lower = upper
+        for _ in range(concurrency):
+            await ranges.put(None)
+
+    async def consume():
+        nonlocal checked_ranges, drifting_users, total_drift
+        while True:
+            bounds = await ranges.get()
+            if bounds is None:
+                return
+            for drift in await _check_range(*bounds):
+                drifting_users += 1
+                total_drift += drift["drift"]
+                if report is not None:
+                    report.write(json.dumps(drift) + "\n")
+            checked_ranges += 1
+
+    try:
+        await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+    finally:
+        if report is not None:
+            report.close()
+
+    summary = {
+        "finished_at": datetime.datetime.utcnow().isoformat(),
+        "seconds": round(time.monotonic() - started, 2),
+        "ranges": checked_ranges,
+        "chunk_size": chunk_size,
+        "drifting_users": drifting_users,
+        "total_drift": total_drift,
+        "report": report_path,
+    }
+    if drifting_users:
+        logger.warning("Reconciliation found %d users whose balance differs from the ledger", drifting_users)
+    return summary
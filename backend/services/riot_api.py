@@ -1,32 +1,350 @@
-import random
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RIOT_API_KEY = os.getenv("RIOT_API_KEY")
+RIOT_CACHE_DIR = os.getenv("RIOT_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".riot_cache"))
+RIOT_CACHE_SIZE = int(os.getenv("RIOT_CACHE_SIZE", "1024"))
+RIOT_MAX_CONNECTIONS = int(os.getenv("RIOT_MAX_CONNECTIONS", "20"))
+
+# Riot development keys: 20 requests / 1s and 100 requests / 2min.
+# Production keys override these through env, e.g. "500:10,30000:600".
+RIOT_RATE_LIMITS = os.getenv("RIOT_RATE_LIMITS", "20:1,100:120")
+
+# Platform prefix of a match id (e.g. "EUW1_6543210") -> Match-V5 routing region
+PLATFORM_TO_REGION = {
+    "NA1": "americas", "BR1": "americas", "LA1": "americas", "LA2": "americas",
+    "EUW1": "europe", "EUN1": "europe", "TR1": "europe", "RU": "europe", "ME1": "europe",
+    "KR": "asia", "JP1": "asia",
+    "OC1": "sea", "PH2": "sea", "SG2": "sea", "TH2": "sea", "TW2": "sea", "VN2": "sea",
+}
+DEFAULT_REGION = "europe"
+
+
+class RiotAPIError(Exception):
+    pass
+
+
+class RiotUnavailable(RiotAPIError):
+    """Riot kept rate limiting us; worth retrying later."""
+
+
+def _parse_rate_limits(spec: str) -> List[Tuple[int, float]]:
+    limits = []
+    for part in spec.split(","):
+        count, seconds = part.strip().split(":")
+        limits.append((int(count), float(seconds)))
+    return limits
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at capacity / period tokens per second."""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.tokens = 0.0
+
+
+class RegionScheduler:
+    """
+    Schedules requests for one routing region so that every configured
+    window (per-second, per-two-minutes, ...) is respected at once.
+    """
+
+    def __init__(self, limits: List[Tuple[int, float]]):
+        self.buckets = [TokenBucket(count, period) for count, period in limits]
+        self.lock = asyncio.Lock()
+        self.blocked_until = 0.0
+
+    async def acquire(self) -> float:
+        """Wait for a slot in every bucket. Returns the time spent waiting."""
+        waited = 0.0
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                delay = max([self.blocked_until - now] + [b.delay(now) for b in self.buckets])
+                if delay <= 0:
+                    for bucket in self.buckets:
+                        bucket.take()
+                    return waited
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def back_off(self, retry_after: float):
+        """Called on a 429: stop issuing requests for retry_after seconds."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        for bucket in self.buckets:
+            bucket.drain(now)
+
+
+class MatchCache:
+    """
+    Cache for finished match payloads. Finished matches never change, so
+    entries are never invalidated: a bounded in-memory LRU sits in front of
+    a directory of JSON files that survives restarts.
+    """
+
+    def __init__(self, max_entries: int, directory: Optional[str]):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, match_id: str) -> str:
+        safe = "".join(c for c in match_id if c.isalnum() or c in "_-")
+        return os.path.join(self.directory, f"{safe}.json")
+
+    def get_memory(self, match_id: str) -> Optional[Dict[str, Any]]:
+        payload = self.entries.get(match_id)
+        if payload is not None:
+            self.entries.move_to_end(match_id)
+        return payload
+
+    def _put_memory(self, match_id: str, payload: Dict[str, Any]):
+        self.entries[match_id] = payload
+        self.entries.move_to_end(match_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _read_disk(self, match_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(match_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_disk(self, match_id: str, payload: Dict[str, Any]):
+        path = self._path(match_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+    async def get_disk(self, match_id: str) -> Optional[Dict[str, Any]]:
+        if not self.directory:
+            return None
+        payload = await asyncio.to_thread(self._read_disk, match_id)
+        if payload is not None:
+            self._put_memory(match_id, payload)
+        return payload
+
+    async def put(self, match_id: str, payload: Dict[str, Any]):
+        self._put_memory(match_id, payload)
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write_disk, match_id, payload)
+            except OSError as e:
+                logger.warning("Could not persist match %s to disk cache: %s", match_id, e)
+
+
+class RiotClient:
+    """
+    Shared Match-V5 client: one pooled httpx connection pool, one rate-limit
+    scheduler per routing region, single-flight fetches per match id and a
+    two-tier cache for finished matches.
+    """
+
+    def __init__(self, api_key: Optional[str], rate_limits: List[Tuple[int, float]], cache: MatchCache):
+        self.api_key = api_key
+        self.rate_limits = rate_limits
+        self.cache = cache
+        self.schedulers: Dict[str, RegionScheduler] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "requests": 0,
+            "rate_limited": 0,
+            "rate_limit_wait_seconds": 0.0,
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"X-Riot-Token": self.api_key or ""},
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=RIOT_MAX_CONNECTIONS,
+                    max_keepalive_connections=RIOT_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _scheduler(self, region: str) -> RegionScheduler:
+        scheduler = self.schedulers.get(region)
+        if scheduler is None:
+            scheduler = self.schedulers[region] = RegionScheduler(self.rate_limits)
+        return scheduler
+
+    @staticmethod
+    def region_for(match_id: str) -> str:
+        platform = match_id.split("_", 1)[0].upper()
+        return PLATFORM_TO_REGION.get(platform, DEFAULT_REGION)
+
+    async def get_match(self, match_id: str) -> Dict[str, Any]:
+        """Return the Match-V5 payload for match_id, from cache when possible."""
+        payload = self.cache.get_memory(match_id)
+        if payload is not None:
+            self.stats["memory_hits"] += 1
+            return payload
+
+        # Concurrent callers for the same match share one fetch
+        pending = self.inflight.get(match_id)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[match_id] = future
+        try:
+            payload = await self.cache.get_disk(match_id)
+            if payload is not None:
+                self.stats["disk_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                payload = await self._fetch(match_id)
+                if _is_finished(payload):
+                    await self.cache.put(match_id, payload)
+            future.set_result(payload)
+            return payload
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception with no other waiters is not logged
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(match_id, None)
+
+    async def _fetch(self, match_id: str, attempts: int = 3) -> Dict[str, Any]:
+        region = self.region_for(match_id)
+        scheduler = self._scheduler(region)
+        url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
+
+        for _ in range(attempts):
+            self.stats["rate_limit_wait_seconds"] += await scheduler.acquire()
+            self.stats["requests"] += 1
+            response = await self.client.get(url)
+
+            if response.status_code == 429:
+                self.stats["rate_limited"] += 1
+                scheduler.back_off(float(response.headers.get("Retry-After", "1")))
+                continue
+            if response.status_code == 404:
+                raise RiotAPIError(f"Match {match_id} not found")
+            response.raise_for_status()
+            return response.json()
+
+        raise RiotUnavailable(f"Rate limited while fetching match {match_id}")
+
+    def metrics(self) -> Dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["coalesced"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "cached_in_memory": len(self.cache.entries),
+        }
+
+
+def _is_finished(payload: Dict[str, Any]) -> bool:
+    info = payload.get("info") or {}
+    return bool(info.get("gameEndTimestamp") or info.get("endOfGameResult"))
+
+
+def _participant(payload: Dict[str, Any], champion: str) -> Optional[Dict[str, Any]]:
+    wanted = champion.replace(" ", "").replace("'", "").lower()
+    for participant in (payload.get("info") or {}).get("participants", []):
+        name = str(participant.get("championName", "")).replace(" ", "").replace("'", "").lower()
+        if name == wanted:
+            return participant
+    return None
+
+
+riot_client = RiotClient(
+    RIOT_API_KEY,
+    _parse_rate_limits(RIOT_RATE_LIMITS),
+    MatchCache(RIOT_CACHE_SIZE, RIOT_CACHE_DIR),
+)
+
 
 async def verify_match(riot_match_id: str, player_champion: str) -> bool:
     """
-    Mocks the Riot API verification.
-    In a real app, this would call GET /lol/match/v5/matches/{matchId}
-    and check if the participant played the correct champion and won.
-    """
-    print(f"Verifying match {riot_match_id} for champion {player_champion}...")
-    
-    # Simulate API call latency
-    import asyncio
-    await asyncio.sleep(1)
-    
-    # Mock logic: If match ID starts with "WIN", return True. Else False.
-    if riot_match_id.upper().startswith("WIN"):
-        return True
-    
-    # Randomly fail for other IDs to simulate loss or wrong champion
-    return False
+    Checks GET /lol/match/v5/matches/{matchId} to confirm the match is
+    finished and a participant played the registered champion.
+    Raises RiotUnavailable when Riot keeps rate limiting us.
+    """
+    # Mock logic if no API key is present: match IDs starting with "WIN" are valid
+    if not RIOT_API_KEY:
+        logger.info("No RIOT_API_KEY found, mocking verification of %s for %s", riot_match_id, player_champion)
+        return riot_match_id.upper().startswith("WIN")
+
+    try:
+        payload = await riot_client.get_match(riot_match_id)
+    except RiotUnavailable:
+        # Not a verdict on the match; let the caller ask the player to retry
+        raise
+    except (RiotAPIError, httpx.HTTPError) as e:
+        logger.warning("Riot API verification of %s failed: %s", riot_match_id, e)
+        return False
+
+    return _is_finished(payload) and _participant(payload, player_champion) is not None
+
 
 async def get_match_winner(riot_match_id: str, player1_champ: str, player2_champ: str) -> str:
     """
-    Returns 'player1' or 'player2' based on who won.
+    Returns 'player1' or 'player2' based on whose champion won, or
+    'undetermined' if neither champion is a winning participant.
+    Served from the same cached payload verify_match fetched. Raises
+    RiotAPIError (RiotUnavailable when rate limited) or httpx.HTTPError.
     """
-    # Mock logic
-    if riot_match_id.upper().endswith("P1"):
+    if not RIOT_API_KEY:
+        # Mock logic
+        if riot_match_id.upper().endswith("P2"):
+            return "player2"
         return "player1"
-    elif riot_match_id.upper().endswith("P2"):
-        return "player2"
-    
-    return "player1" # Default
+
+    payload = await riot_client.get_match(riot_match_id)
+    for role, champion in (("player1", player1_champ), ("player2", player2_champ)):
+        participant = _participant(payload, champion) if champion else None
+        if participant is not None and participant.get("win"):
+            return role
+    return "undetermined"
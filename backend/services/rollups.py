@@ -0,0 +1,162 @@
+"""
+Hourly and daily rollups of SP flow and custom game activity.
+
+A refresh only reads source rows past each rollup's watermark: ledger
+entries by seq, and games by created_at / completed_at. It adds their
+aggregates onto the rollup rows and advances the watermark in the same
+transaction. The watermark row is locked while that happens, so
+concurrent refreshes from several workers never count a row twice.
+Rows younger than SETTLE_LAG are left for the next run, so that
+transactions still in flight when the watermark moves are not skipped.
+"""
+import os
+import logging
+import datetime
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session
+from models import (
+    Transaction, TransactionType, CustomGame,
+    SpFlowRollup, GameActivityRollup, RollupWatermark,
+)
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "60"))
+ROLLUP_BATCH_SIZE = 50000
+SETTLE_LAG = datetime.timedelta(seconds=30)
+
+GRANULARITIES = ("hour", "day")
+
+SP_FLOW_METRICS = {
+    TransactionType.DEPOSIT: "deposited",
+    TransactionType.WAGER_LOSS: "wagered",
+    TransactionType.WAGER_WIN: "paid_out",
+    TransactionType.PURCHASE: "redeemed",
+    TransactionType.ADJUSTMENT: "adjusted",
+    TransactionType.WITHDRAWAL: "withdrawn",
+    TransactionType.REFUND: "refunded",
+}
+
+
+def _truncate(moment: datetime.datetime, granularity: str) -> datetime.datetime:
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if granularity == "day" else moment
+
+
+async def lock_watermark(db: AsyncSession, name: str) -> RollupWatermark:
+    await db.execute(insert(RollupWatermark).values(name=name).on_conflict_do_nothing())
+    result = await db.execute(select(RollupWatermark).where(RollupWatermark.name == name).with_for_update())
+    return result.scalars().one()
+
+
+async def refresh_sp_flow(db: AsyncSession) -> int:
+    """Fold new ledger entries into sp_flow_rollups. Returns the number of entries consumed."""
+    watermark = await lock_watermark(db, "sp_flow")
+    last_seq = watermark.position or 0
+    cutoff = datetime.datetime.utcnow() - SETTLE_LAG
+
+    batch = (
+        select(Transaction.seq)
+        .where(Transaction.seq > last_seq, Transaction.created_at < cutoff)
+        .order_by(Transaction.seq)
+        .limit(ROLLUP_BATCH_SIZE)
+        .subquery()
+    )
+    upper = await db.scalar(select(func.max(batch.c.seq)))
+    if upper is None:
+        return 0
+
+    hour = func.date_trunc("hour", Transaction.created_at)
+    result = await db.execute(
+        select(hour, Transaction.type, func.sum(func.abs(Transaction.amount)), func.count())
+        .where(Transaction.seq > last_seq, Transaction.seq <= upper)
+        .group_by(hour, Transaction.type)
+    )
+
+    totals: Dict[Tuple[str, datetime.datetime, str], list] = defaultdict(lambda: [0, 0])
+    consumed = 0
+    for bucket, type, amount, entries in result.all():
+        metric = SP_FLOW_METRICS.get(type)
+        consumed += entries
+        if metric is None:
+            continue
+        for granularity in GRANULARITIES:
+            total = totals[(granularity, _truncate(bucket, granularity), metric)]
+            total[0] += amount
+            total[1] += entries
+
+    if totals:
+        stmt = insert(SpFlowRollup).values([
+            {"granularity": g, "bucket": b, "metric": m, "amount": amount, "entries": entries}
+            for (g, b, m), (amount, entries) in totals.items()
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[SpFlowRollup.granularity, SpFlowRollup.bucket, SpFlowRollup.metric],
+            set_={
+                "amount": SpFlowRollup.amount + stmt.excluded.amount,
+                "entries": SpFlowRollup.entries + stmt.excluded.entries,
+            },
+        ))
+
+    watermark.position = upper
+    return consumed
+
+
+async def _game_buckets(db: AsyncSession, column, since, until):
+    hour = func.date_trunc("hour", column)
+    query = select(hour, CustomGame.type, func.count()).where(column <= until)
+    if since is not None:
+        query = query.where(column > since)
+    result = await db.execute(query.group_by(hour, CustomGame.type))
+    return result.all()
+
+
+async def refresh_game_activity(db: AsyncSession) -> int:
+    """Fold newly created and completed games into game_activity_rollups."""
+    created_mark = await lock_watermark(db, "games_created")
+    completed_mark = await lock_watermark(db, "games_completed")
+    cutoff = datetime.datetime.utcnow() - SETTLE_LAG
+
+    totals: Dict[Tuple, list] = defaultdict(lambda: [0, 0])
+    consumed = 0
+    for index, (column, mark) in enumerate(((CustomGame.created_at, created_mark), (CustomGame.completed_at, completed_mark))):
+        for bucket, game_type, count in await _game_buckets(db, column, mark.timestamp, cutoff):
+            consumed += count
+            for granularity in GRANULARITIES:
+                totals[(granularity, _truncate(bucket, granularity), game_type)][index] += count
+        mark.timestamp = cutoff
+
+    if totals:
+        stmt = insert(GameActivityRollup).values([
+            {"granularity": g, "bucket": b, "game_type": t, "created": created, "completed": completed}
+            for (g, b, t), (created, completed) in totals.items()
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[GameActivityRollup.granularity, GameActivityRollup.bucket, GameActivityRollup.game_type],
+            set_={
+                "created": GameActivityRollup.created + stmt.excluded.created,
+                "completed": GameActivityRollup.completed + stmt.excluded.completed,
+            },
+        ))
+    return consumed
+
+
+async def refresh_all() -> Dict[str, int]:
+    """Catch every rollup up with its source table, one transaction per rollup."""
+    consumed = {"transactions": 0, "games": 0}
+    async with async_session() as session:
+        while True:
+            count = await refresh_sp_flow(session)
+            await session.commit()
+            consumed["transactions"] += count
+            if count < ROLLUP_BATCH_SIZE:
+                break
+        consumed["games"] = await refresh_game_activity(session)
+        await session.commit()
+    return consumed
@@ -0,0 +1,135 @@
+"""
+In-app periodic job scheduler.
+
+Every worker runs the scheduler loop, but only the one holding a
+PostgreSQL session advisory lock runs jobs. The lock lives on a
+connection the leader keeps checked out, so it is released when that
+worker exits or its connection dies, and another worker takes over on
+its next tick. Jobs are async callables taking no arguments; a job's
+return value is kept as its last result in metrics().
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "5"))
+# Arbitrary but fixed: every worker must contend for the same key
+LEADER_LOCK_KEY = 0x43415348
+
+
+class Job:
+    def __init__(self, name: str, interval: float, fn: Callable[[], Awaitable[Any]]):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.next_run = 0.0
+        self.stats = {"runs": 0, "failures": 0, "last_duration_seconds": 0.0}
+        self.last_result: Any = None
+
+    async def run(self):
+        started = time.monotonic()
+        try:
+            self.last_result = await self.fn()
+        except Exception:
+            self.stats["failures"] += 1
+            logger.exception("Scheduled job %s failed", self.name)
+        finally:
+            self.stats["runs"] += 1
+            self.stats["last_duration_seconds"] = time.monotonic() - started
+            self.next_run = time.monotonic() + self.interval
+
+
+class Scheduler:
+    def __init__(self, tick: float = SCHEDULER_TICK):
+        self.tick = tick
+        self.jobs: List[Job] = []
+        self.connection = None
+        self.task: Optional[asyncio.Task] = None
+        self.elections = 0
+
+    def every(self, name: str, interval: float, fn: Callable[[], Awaitable[Any]]):
+        """Run fn every interval seconds on the leader."""
+        self.jobs.append(Job(name, interval, fn))
+
+    @property
+    def is_leader(self) -> bool:
+        return self.connection is not None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        await self._resign()
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._lead():
+                    for job in self.jobs:
+                        if job.next_run <= time.monotonic():
+                            await job.run()
+            except Exception:
+                logger.exception("Scheduler tick failed")
+                await self._resign()
+            await asyncio.sleep(self.tick)
+
+    async def _lead(self) -> bool:
+        """Whether this worker holds the leader lock, trying to take it if nobody does."""
+        if self.connection is not None:
+            try:
+                await self.connection.execute(text("SELECT 1"))
+                # End the probe's implicit transaction so the held connection is never idle in transaction
+                await self.connection.commit()
+                return True
+            except Exception:
+                logger.warning("Scheduler lost its leader connection")
+                await self._resign()
+
+        connection = await engine.connect()
+        try:
+            acquired = await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_LOCK_KEY})
+            # End the implicit transaction; the session-level lock outlives it
+            await connection.commit()
+        except BaseException:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self.connection = connection
+        self.elections += 1
+        logger.info("Scheduler elected leader")
+        return True
+
+    async def _resign(self):
+        connection, self.connection = self.connection, None
+        if connection is None:
+            return
+        try:
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LEADER_LOCK_KEY})
+            await connection.commit()
+        except Exception:
+            pass  # Closing the session releases it anyway
+        finally:
+            await connection.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        jobs = {job.name: {**job.stats, "last_result": job.last_result} for job in self.jobs}
+        return {"leader": self.is_leader, "elections": self.elections, "jobs": jobs}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,235 @@
+"""
+Structured logging that never writes from the event loop.
+
+setup_logging() puts a single QueueHandler on the root logger. A record is
+stamped with the current request id and its message is interpolated in the
+caller, then it goes onto a bounded queue with put_nowait, so logging costs
+a dict build and a deque append on the request path. A QueueListener thread
+formats the records (one JSON object per line by default, LOG_FORMAT=text
+for local development) and writes them to stdout. When the queue is full
+the record is dropped and counted rather than blocking the loop.
+
+Noisy loggers can be sampled with LOG_SAMPLE_RATES, e.g.
+"uvicorn.access=0.05,sqlalchemy.engine=0.01". Sampling is decided per
+request id, so a sampled request keeps all of its lines. Warnings and
+errors are never sampled out.
+
+RequestIdMiddleware takes the request id from an incoming X-Request-ID
+header, or makes one, and echoes it on the response.
+"""
+import os
+import sys
+import uuid
+import zlib
+import queue
+import random
+import atexit
+import logging
+import datetime
+import contextvars
+import logging.handlers
+from typing import Dict, Optional
+
+import orjson
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# SQL statement logging (was echo=True on the engine), routed through the queue like everything else
+SQL_ECHO = os.getenv("SQL_ECHO", "").lower() in ("1", "true", "yes")
+
+REQUEST_ID_HEADER = b"x-request-id"
+MAX_REQUEST_ID_LENGTH = 128
+
+current_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_request_id", default=None)
+
+# Attributes every LogRecord has; anything else came from extra= and goes into the JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "taskName"}
+
+_stats = {"dropped": 0, "sampled_out": 0}
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue: Optional[queue.Queue] = None
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.strip().partition("=")
+        if name and rate:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records below WARNING from the configured loggers (and their children)."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self.resolved.get(name)
+        if rate is None:
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self.resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            keep = zlib.crc32(f"{record.name}:{request_id}".encode()) / 0xFFFFFFFF < rate
+        else:
+            keep = random.random() < rate
+        if not keep:
+            _stats["sampled_out"] += 1
+        return keep
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Stamps the request id and hands the record to the listener thread without ever waiting."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Interpolate now, while the arguments still hold their current values; formatting
+        # (including any traceback) is left to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id.get()
+        return super().handle(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+def setup_logging():
+    """Route every logger through the queue. Safe to call more than once."""
+    global _listener, _queue
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _NonBlockingQueueHandler(_queue)
+    rates = _parse_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn installs its own stream handlers before importing the app; send its output through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    if SQL_ECHO:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out whatever is still queued and stop the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+def metrics() -> Dict[str, int]:
+    return {
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "dropped": _stats["dropped"],
+        "sampled_out": _stats["sampled_out"],
+    }
+
+
+def _request_id(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == REQUEST_ID_HEADER:
+            value = value.decode("latin-1").strip()
+            if value and len(value) <= MAX_REQUEST_ID_LENGTH and value.isprintable():
+                return value
+            break
+    return uuid.uuid4().hex
+
+
+class RequestIdMiddleware:
+    """Pure ASGI middleware that sets the request id for every log line written while handling the request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _request_id(scope)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_id.reset(token)
@@ -0,0 +1,109 @@
+"""
+Version counters behind the ETags of the polled read endpoints.
+
+Every write to a resource bumps its counter in the same transaction, so an
+ETag costs one small query instead of rendering and hashing the body.
+Like the platform counters, each version is spread over VERSION_SHARDS
+rows and only ever grows, so the sum changes with every committed write.
+Bumps are also written the same way, at commit with one shard per
+transaction and names in sorted order (see services/deferred.py).
+
+Read the version before the data it describes. A write that commits in
+between then pairs newer data with the older tag, which only costs the
+client one extra full response. The reverse order would hand out stale
+data under the newer tag.
+"""
+import random
+from typing import Dict
+
+from fastapi import Request, Response
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import ResourceVersion
+from services import deferred
+
+VERSION_SHARDS = 8
+# Bump when a tagged response changes shape, so old tags stop matching
+REPRESENTATION = 2
+CACHE_CONTROL = "no-cache"
+
+GAMES = "games"
+TOURNAMENTS = "tournaments"
+STORE_ITEMS = "store_items"
+# Public profile fields (name, role, verification) embedded in lobbies and brackets.
+# Balances are not embedded, so ledger posts don't bump it
+USERS = "users"
+
+PENDING_KEY = "resource_version_bumps"
+
+
+def tournament(tournament_id) -> str:
+    """Version name of one tournament's bracket."""
+    return f"tournament:{tournament_id}"
+
+
+async def bump(db: AsyncSession, *names: str):
+    """Bump each version once when db's transaction commits."""
+    if names:
+        deferred.pending(db, PENDING_KEY, set).update(names)
+
+
+def _apply(session: Session, names: set):
+    shard = random.randrange(VERSION_SHARDS)
+    stmt = insert(ResourceVersion).values([{"name": name, "shard": shard, "version": 1} for name in sorted(names)])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[ResourceVersion.name, ResourceVersion.shard],
+        set_={"version": ResourceVersion.version + 1},
+    ))
+
+
+deferred.register(PENDING_KEY, 1, _apply)
+
+
+async def read(db: AsyncSession, *names: str) -> Dict[str, int]:
+    result = await db.execute(
+        select(ResourceVersion.name, func.sum(ResourceVersion.version))
+        .where(ResourceVersion.name.in_(names))
+        .group_by(ResourceVersion.name)
+    )
+    return {name: int(version) for name, version in result.all()}
+
+
+async def etag(db: AsyncSession, *names: str) -> str:
+    """Strong ETag for a response built from the given resources."""
+    versions = await read(db, *names)
+    return f'"{REPRESENTATION}-' + "-".join(str(versions.get(name, 0)) for name in names) + '"'
+
+
+def _opaque(tag: str) -> str:
+    # CompressionMiddleware suffixes tags per encoding; they name the same version
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ("-gzip\"", "-br\""):
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already names this version."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(_opaque(tag) == etag for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def tag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -0,0 +1,230 @@
+"""
+One happy-path request per API endpoint through the app, with budgets
+enforced: a request that issues more statements than its route's
+@query_budget, or repeats one statement shape too often, fails the test.
+"""
+import re
+import uuid
+import datetime
+
+import pytest
+from sqlalchemy import select, update, func, insert
+
+from main import app
+from auth import get_password_hash
+from models import User, Tournament, Registration, Match, StoreItem, Redemption, GameType
+from services import matchups
+from routers import auth as auth_router
+from routers.admin import BULK_CHUNK_SIZE, BULK_MAX_CHUNKS
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture
+async def world(db, make_user, make_game):
+    """Users, games, a tournament with a match, a store item and a redemption to point the requests at."""
+    admin = await make_user(role="admin")
+    moderator = await make_user(role="moderator")
+    player = await make_user()
+    challenger = await make_user()
+    red, blue, latecomer = await make_user(), await make_user(), await make_user()
+    await db.execute(update(User).where(User.id == player.id).values(hashed_password=get_password_hash(PASSWORD)))
+
+    open_game = await make_game(GameType.ONE_VS_ONE, 50, [(player, 1)], moderator)
+    live_game = await make_game(GameType.ONE_VS_ONE, 50, [(red, 1), (blue, 2)], moderator)
+
+    tournament = Tournament(name="Mid Cup", role="mid", max_players=8, created_by=moderator.id)
+    db.add(tournament)
+    await db.flush()
+    red_entry = Registration(tournament_id=tournament.id, user_id=red.id, champion="Ahri")
+    blue_entry = Registration(tournament_id=tournament.id, user_id=blue.id, champion="Zed")
+    db.add_all([red_entry, blue_entry])
+    await db.flush()
+    match = Match(tournament_id=tournament.id, round=1, player1_registration_id=red_entry.id, player2_registration_id=blue_entry.id)
+    # Settled long enough ago to be in the champion matchup matrix
+    settled = Match(
+        tournament_id=tournament.id, round=1, player1_registration_id=red_entry.id, player2_registration_id=blue_entry.id,
+        winner_registration_id=red_entry.id, verified=True, verified_at=datetime.datetime.utcnow() - datetime.timedelta(days=1),
+    )
+    db.add(settled)
+    item = StoreItem(name="650 RP", sp_cost=5, description="League of Legends 650 RP Card", item_type="rp_card")
+    db.add_all([match, item])
+    await db.flush()
+    redemption = Redemption(user_id=player.id, item_id=item.id, email_sent=False, fulfilled=False)
+    db.add(redemption)
+    await db.commit()
+    await matchups.rebuild()
+
+    return {
+        "principals": {
+            "admin": admin, "moderator": moderator, "player": player,
+            "challenger": challenger, "red": red, "latecomer": latecomer,
+        },
+        "ids": {
+            "player": player.id, "challenger": challenger.id,
+            "open_game": open_game.id, "live_game": live_game.id,
+            "tournament": tournament.id, "match": match.id,
+            "item": item.id, "redemption": redemption.id,
+        },
+        "player_email": player.email,
+    }
+
+
+def _window():
+    now = datetime.datetime.utcnow()
+    return {"start": (now - datetime.timedelta(days=1)).isoformat(), "end": (now + datetime.timedelta(days=1)).isoformat()}
+
+
+# (caller, method, path, request arguments built from the world)
+CASES = [
+    (None, "GET", "/", None),
+
+    (None, "POST", "/auth/google-login", lambda w: {"json": {"token": "google-token"}}),
+    (None, "POST", "/auth/register", lambda w: {"json": {"email": "new@example.com", "password": PASSWORD, "display_name": "New"}}),
+    (None, "POST", "/auth/login", lambda w: {"json": {"email": w["player_email"], "password": PASSWORD}}),
+    ("player", "GET", "/auth/me", None),
+
+    ("moderator", "POST", "/tournaments/", lambda w: {"json": {"name": "Top Cup", "role": "top", "max_players": 8}}),
+    (None, "GET", "/tournaments/", None),
+    (None, "GET", "/tournaments/{tournament}", None),
+    ("latecomer", "POST", "/tournaments/{tournament}/register", lambda w: {"json": {"champion": "Lux"}}),
+    ("admin", "POST", "/tournaments/{tournament}/generate-bracket", None),
+    (None, "GET", "/tournaments/{tournament}/matches", None),
+
+    # Without RIOT_API_KEY, match ids starting with WIN verify and player1 wins
+    ("red", "POST", "/matches/{match}/submit", lambda w: {"json": {"riot_match_id": "WIN-1"}}),
+
+    ("player", "POST", "/store/buy-sp", lambda w: {"params": {"amount": 100}}),
+    ("player", "GET", "/store/balance", None),
+    ("player", "GET", "/store/transactions", None),
+    ("player", "GET", "/store/transactions/export", None),
+    (None, "GET", "/store/items", None),
+    ("player", "POST", "/store/redeem/{item}", None),
+    (None, "POST", "/store/init-items", None),
+
+    ("moderator", "POST", "/games/create", lambda w: {"json": {"type": "1v1", "wager_amount": 50}}),
+    (None, "GET", "/games/", None),
+    ("challenger", "POST", "/games/{open_game}/join", lambda w: {"params": {"team": 2}}),
+    ("moderator", "POST", "/games/{live_game}/verify", lambda w: {"params": {"winner_team": 1}}),
+
+    ("admin", "GET", "/admin/users", lambda w: {"params": {"q": "example.com"}}),
+    ("admin", "PATCH", "/admin/users/{player}", lambda w: {"json": {"sp_points": 500, "role": "moderator"}}),
+    ("admin", "POST", "/admin/users/bulk", lambda w: {"json": {"user_ids": [str(w["ids"]["player"])], "action": "sp_delta", "sp_delta": 5}}),
+    ("admin", "DELETE", "/admin/users/{challenger}", None),
+    ("moderator", "POST", "/admin/games", lambda w: {"json": {"type": "5v5", "wager_amount": 10}}),
+    ("admin", "GET", "/admin/games", None),
+    ("admin", "DELETE", "/admin/games/{open_game}", None),
+    ("moderator", "POST", "/admin/games/{live_game}/verify", lambda w: {"json": {"winner_team": 2}}),
+    ("admin", "GET", "/admin/redemptions", None),
+    ("admin", "POST", "/admin/redemptions/{redemption}/send-email", lambda w: {"json": {"redemption_id": str(w["ids"]["redemption"])}}),
+    ("admin", "GET", "/admin/email/dead-letters", None),
+    ("admin", "PATCH", "/admin/redemptions/{redemption}/fulfill", None),
+    ("admin", "POST", "/admin/redemptions/bulk/fulfill", lambda w: {"json": {"ids": [str(w["ids"]["redemption"])]}}),
+    ("admin", "POST", "/admin/redemptions/bulk/send-email", lambda w: {"json": {"filter": {"fulfilled": False}}}),
+    ("admin", "GET", "/admin/stats", lambda w: {"params": {"reconcile": True}}),
+    ("admin", "GET", "/admin/rollups/sp-flow", lambda w: {"params": _window()}),
+    ("admin", "GET", "/admin/rollups/games", lambda w: {"params": _window()}),
+    ("admin", "POST", "/admin/rollups/refresh", None),
+    ("admin", "POST", "/admin/matchups/rebuild", None),
+    ("admin", "POST", "/admin/games/expire", None),
+    ("admin", "GET", "/admin/scheduler", None),
+    ("admin", "GET", "/admin/export/transactions", None),
+    ("admin", "GET", "/admin/riot/metrics", None),
+    ("admin", "GET", "/admin/cache/metrics", None),
+
+    (None, "GET", "/leaderboard/wins", None),
+    ("player", "GET", "/leaderboard/sp/me", None),
+    (None, "GET", "/users/{player}/stats", None),
+    (None, "GET", "/champions/matchups", None),
+    (None, "GET", "/champions/Ahri/matchups", None),
+]
+
+
+def _routes():
+    """(method, path template) of every route, in the order the app matches them"""
+    return [(method.upper(), path) for path, operations in app.openapi()["paths"].items() for method in operations]
+
+
+def _template(method: str, path: str) -> str:
+    """The route a case's request lands on, e.g. /games/{open_game}/join -> /games/{game_id}/join"""
+    for route_method, template in _routes():
+        pattern = re.sub(r"\\\{[^}]+\\\}", "[^/]+", re.escape(template))
+        if route_method == method and re.fullmatch(pattern, path.format_map(_Placeholders())):
+            return template
+    return path
+
+
+class _Placeholders(dict):
+    def __missing__(self, key):
+        return str(uuid.UUID(int=0))
+
+
+def test_every_endpoint_has_a_case():
+    requested = {(method, _template(method, path)) for _, method, path, _ in CASES}
+    assert set(_routes()) - requested == set()
+
+
+@pytest.mark.parametrize("caller, method, path, arguments", CASES, ids=[f"{method} {path}" for _, method, path, _ in CASES])
+async def test_endpoint_within_budget(client, bearer, world, monkeypatch, caller, method, path, arguments):
+    monkeypatch.setattr(auth_router.id_token, "verify_oauth2_token", lambda token, request, audience: {
+        "sub": "google-subject", "email": "google@example.com", "name": "Google User",
+    })
+    headers = bearer(world["principals"][caller]) if caller else {}
+    response = await client.request(
+        method, path.format(**world["ids"]), headers=headers, **(arguments(world) if arguments else {}),
+    )
+    assert response.status_code < 300, response.text
+
+
+async def _bulk_users(db, count: int):
+    ids = [uuid.uuid4() for _ in range(count)]
+    await db.execute(insert(User), [
+        {"id": user_id, "email": f"{user_id.hex}@bulk.local", "display_name": "Bulk", "sp_points": 0, "role": "user", "is_verified": False}
+        for user_id in ids
+    ])
+    await db.commit()
+    return ids
+
+
+async def test_bulk_user_ids_over_several_chunks(db, client, bearer, make_user):
+    admin = await make_user(role="admin")
+    ids = await _bulk_users(db, BULK_CHUNK_SIZE + 200)
+    unknown = [uuid.uuid4() for _ in range(300)]
+
+    response = await client.post("/admin/users/bulk", headers=bearer(admin), json={
+        "user_ids": [str(user_id) for user_id in ids + unknown], "action": "sp_delta", "sp_delta": 3,
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["updated"] == len(ids)
+    assert response.json()["skipped"] == len(unknown)
+    credited = await db.scalar(
+        select(func.count()).select_from(User).where(User.email.like("%@bulk.local"), User.sp_points == 3)
+    )
+    assert credited == len(ids)
+
+
+async def test_bulk_filter_pages_over_several_chunks(db, client, bearer, make_user):
+    admin = await make_user(role="admin")
+    ids = await _bulk_users(db, 2 * BULK_CHUNK_SIZE + 1)
+
+    response = await client.post("/admin/users/bulk", headers=bearer(admin), json={
+        "filter": {"is_verified": False}, "action": "verify", "is_verified": True,
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["updated"] == len(ids)
+    assert await db.scalar(select(func.count()).select_from(User).where(User.is_verified.is_(False))) == 0
+
+
+async def test_bulk_user_ids_are_capped(client, bearer, make_user):
+    admin = await make_user(role="admin")
+
+    response = await client.post("/admin/users/bulk", headers=bearer(admin), json={
+        "user_ids": [str(uuid.uuid4()) for _ in range(BULK_MAX_CHUNKS * BULK_CHUNK_SIZE + 1)],
+        "action": "sp_delta", "sp_delta": 1,
+    })
+
+    assert response.status_code == 422
@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import select, func
+
+from models import CustomGame, GameStatus, GameType, Transaction, TransactionType
+from routers import games, admin
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def _settle(make_user, make_game, within_budget, game_type: GameType):
+    per_team = 1 if game_type == GameType.ONE_VS_ONE else 5
+    moderator = await make_user(role="moderator")
+    roster = [(await make_user(), team) for team in (1, 2) for _ in range(per_team)]
+    game = await make_game(game_type, 100, roster, moderator)
+    _, stats = await within_budget(games.verify_game, game_id=game.id, winner_team=1, current_user=moderator)
+    return game, stats
+
+
+async def test_verify_game_costs_the_same_for_1v1_and_5v5(db, make_user, make_game, within_budget):
+    _, one_vs_one = await _settle(make_user, make_game, within_budget, GameType.ONE_VS_ONE)
+    game, five_vs_five = await _settle(make_user, make_game, within_budget, GameType.FIVE_VS_FIVE)
+
+    assert one_vs_one.statements == five_vs_five.statements
+    credited = await db.scalar(
+        select(func.count()).select_from(Transaction)
+        .where(Transaction.type == TransactionType.WAGER_WIN, Transaction.description == f"Won game {game.id}")
+    )
+    assert credited == 5
+
+
+async def test_admin_verify_stays_within_budget(db, make_user, make_game, within_budget):
+    moderator = await make_user(role="moderator")
+    roster = [(await make_user(), team) for team in (1, 2) for _ in range(5)]
+    game = await make_game(GameType.FIVE_VS_FIVE, 50, roster, moderator)
+
+    result, _ = await within_budget(
+        admin.verify_game_winner,
+        game_id=str(game.id), verify_data=admin.GameVerify(winner_team=2), current_user=moderator,
+    )
+
+    assert result["winnings_per_winner"] == 100
+    status = await db.scalar(select(CustomGame.status).where(CustomGame.id == game.id))
+    assert status == GameStatus.COMPLETED
+
+
+async def test_join_that_fills_the_game_starts_it(db, make_user, make_game, within_budget):
+    creator = await make_user()
+    game = await make_game(GameType.ONE_VS_ONE, 100, [(creator, 1)], creator)
+    challenger = await make_user()
+
+    joined, _ = await within_budget(games.join_game, game_id=game.id, team=2, idempotency=None, current_user=challenger)
+
+    assert joined.status == GameStatus.IN_PROGRESS
+    assert joined.started_at is not None
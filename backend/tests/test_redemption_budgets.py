@@ -0,0 +1,30 @@
+import datetime
+
+import pytest
+
+from models import Redemption, StoreItem
+from routers import admin
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+async def test_list_redemptions_pages_within_budget(db, make_user, within_budget):
+    admin_user = await make_user(role="admin")
+    item = StoreItem(name="1380 RP", description="Riot Points", sp_cost=500, item_type="rp")
+    db.add(item)
+    await db.flush()
+    start = datetime.datetime.utcnow()
+    for n in range(25):
+        buyer = await make_user()
+        db.add(Redemption(user_id=buyer.id, item_id=item.id, fulfilled=n % 5 == 0, created_at=start + datetime.timedelta(seconds=n)))
+    await db.commit()
+
+    listing = dict(pending_only=False, status="pending", sort="oldest", limit=10, current_user=admin_user)
+    first, _ = await within_budget(admin.list_redemptions, cursor=None, **listing)
+    second, _ = await within_budget(admin.list_redemptions, cursor=first["next_cursor"], **listing)
+
+    pages = first["items"] + second["items"]
+    assert len(pages) == 20
+    assert all(not entry["fulfilled"] and entry["user"] and entry["item"]["name"] == "1380 RP" for entry in pages)
+    assert [entry["created_at"] for entry in pages] == sorted(entry["created_at"] for entry in pages)
+    assert second["next_cursor"] is None
@@ -14,6 +14,8 @@ function AdminPanel() {
     const [games, setGames] = useState([]);
     const [redemptions, setRedemptions] = useState([]);
     const [stats, setStats] = useState(null);
+    const [userSearch, setUserSearch] = useState('');
+    const [usersCursor, setUsersCursor] = useState(null);
 
     useEffect(() => {
         // Check if user is admin
@@ -28,14 +30,15 @@ function AdminPanel() {
         setLoading(true);
         try {
             const [usersRes, gamesRes, redemptionsRes, statsRes] = await Promise.all([
-                api.get('/admin/users'),
+                api.get('/admin/users', { params: { q: userSearch || undefined } }),
                 api.get('/admin/games'),
                 api.get('/admin/redemptions?pending_only=true'),
                 api.get('/admin/stats')
             ]);
-            setUsers(usersRes.data);
+            setUsers(usersRes.data.items);
+            setUsersCursor(usersRes.data.next_cursor);
             setGames(gamesRes.data);
-            setRedemptions(redemptionsRes.data);
+            setRedemptions(redemptionsRes.data.items);
             setStats(statsRes.data);
         } catch (error) {
             console.error("Failed to load admin data", error);
@@ -44,6 +47,16 @@ function AdminPanel() {
         }
     };
 
+    const loadMoreUsers = async () => {
+        try {
+            const res = await api.get('/admin/users', { params: { q: userSearch || undefined, cursor: usersCursor } });
+            setUsers([...users, ...res.data.items]);
+            setUsersCursor(res.data.next_cursor);
+        } catch (error) {
+            console.error("Failed to load more users", error);
+        }
+    };
+
     const promoteUser = async (userId, newRole) => {
         try {
             await api.patch(`/admin/users/${userId}`, { role: newRole });
@@ -96,7 +109,7 @@ function AdminPanel() {
             await api.post(`/admin/redemptions/${redemptionId}/send-email`, {
                 redemption_id: redemptionId
             });
-            alert("Email marked as sent");
+            alert("Email queued");
             loadData();
         } catch (error) {
             alert(error.response?.data?.detail || "Failed to mark email");
@@ -153,7 +166,7 @@ function AdminPanel() {
                         : 'text-gray-400 hover:text-white'
                         }`}
                 >
-                    Users ({users.length})
+                    Users ({stats?.total_users ?? users.length})
                 </button>
                 <button
                     onClick={() => setActiveTab('games')}
@@ -171,7 +184,7 @@ function AdminPanel() {
                         : 'text-gray-400 hover:text-white'
                         }`}
                 >
-                    Redemptions ({redemptions.length})
+                    Redemptions ({stats?.pending_redemptions ?? redemptions.length})
                 </button>
             </div>
 
@@ -179,6 +192,21 @@ function AdminPanel() {
             {activeTab === 'users' && (
                 <div className="glass-card p-6">
                     <h2 className="text-2xl font-bold mb-4">User Management</h2>
+                    <form
+                        onSubmit={(e) => { e.preventDefault(); loadData(); }}
+                        className="flex gap-2 mb-4"
+                    >
+                        <input
+                            type="text"
+                            value={userSearch}
+                            onChange={(e) => setUserSearch(e.target.value)}
+                            placeholder="Search by email or display name"
+                            className="flex-1 px-4 py-2 bg-white/5 border border-white/10 rounded-lg focus:outline-none focus:border-gold-400"
+                        />
+                        <button type="submit" className="px-4 py-2 bg-gold-500/20 text-gold-400 rounded-lg hover:bg-gold-500/30">
+                            Search
+                        </button>
+                    </form>
                     <div className="overflow-x-auto">
                         <table className="w-full">
                             <thead>
@@ -250,6 +278,14 @@ function AdminPanel() {
                             </tbody>
                         </table>
                     </div>
+                    {usersCursor && (
+                        <button
+                            onClick={loadMoreUsers}
+                            className="mt-4 px-4 py-2 bg-white/5 text-gray-300 rounded-lg hover:bg-white/10"
+                        >
+                            Load more
+                        </button>
+                    )}
                 </div>
             )}
 